@@ -0,0 +1,37 @@
+"""
+Compares the JSON DataEncoder with the struct-packed BinaryDataEncoder.
+
+    python benchmarks/codec.py [iterations]
+"""
+import sys
+import timeit
+
+from encoder.DataEncoder import Data, DataEncoder, BinaryDataEncoder
+
+
+def sample():
+    data = Data({})
+    data.set_position_theta(12.345678)
+    data.set_trigger_count(123456)
+    data.set_reference_theta([1.234567, 14.234567])
+    data.set_position_z(3.14159)
+    data.set_reference_z([0.5, 20.5])
+    return data
+
+
+def run(encoder, iterations):
+    data = sample()
+    raw = encoder.encode(data)
+
+    encode = timeit.timeit(lambda: encoder.encode(data), number=iterations)
+    decode = timeit.timeit(lambda: encoder.decode(raw), number=iterations)
+
+    print("{:<20} {:>6} bytes  encode {:>8.2f} us  decode {:>8.2f} us".format(
+        encoder.__class__.__name__, len(raw), encode / iterations * 1e6, decode / iterations * 1e6))
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    for encoder in [DataEncoder(), BinaryDataEncoder()]:
+        run(encoder, iterations)
@@ -0,0 +1,55 @@
+"""
+Bytes per sample and decode throughput of a stream of samples with DataEncoder,
+BinaryDataEncoder and the delta stream codec.
+
+    python benchmarks/delta_stream.py [samples] [rate]
+"""
+import sys
+import time
+
+from encoder.DataEncoder import Sample, DataEncoder, BinaryDataEncoder
+from encoder.delta import DeltaStreamEncoder, DeltaStreamDecoder
+
+
+def samples(count, rate):
+    start = time.time()
+    result = []
+    for i in range(count):
+        t = i / rate
+        # 1 deg/s and 0.1 mm/s in steps of the encoder resolution, 100 Hz trigger
+        theta = round((12.0 + t) * 2 ** 27 / 360.0) * 360.0 / 2 ** 27
+        z = round((3.0 + 0.1 * t) * 1e5) / 1e5
+        result.append(Sample(int(t * 100), theta, [1.234567, 14.234567], z, [0.5, 20.5], start + t, None,
+                             False, Sample.STATUS_OK, Sample.STATUS_OK))
+    return result
+
+
+def run(name, encode, decode, stream, reference=None):
+    frames = [encode(data) for data in stream]
+    size = sum(len(frame) for frame in frames)
+
+    start = time.time()
+    decoded = [decode(frame) for frame in frames]
+    elapsed = time.time() - start
+
+    error = max(max(abs(a.theta - b.theta), abs(a.z - b.z)) for a, b in zip(stream, decoded))
+
+    print("{:<20} {:>6.1f} bytes/sample  ratio {:>5.1f}  decode {:>9.0f} samples/s  max error {:.1e}".format(
+        name, size / float(len(stream)), (reference or size) / float(size), len(stream) / elapsed, error))
+
+    return size
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 10000.0
+
+    stream = samples(count, rate)
+
+    json = DataEncoder()
+    reference = run('DataEncoder', json.encode, json.decode, stream)
+
+    binary = BinaryDataEncoder()
+    run('BinaryDataEncoder', binary.encode, binary.decode, stream, reference)
+
+    run('DeltaStream', DeltaStreamEncoder().encode, DeltaStreamDecoder().decode, stream, reference)
@@ -0,0 +1,79 @@
+"""
+End-to-end throughput and latency of watchdog -> communication -> interface with a simulated
+encoder. For every transport the watchdog runs in its own thread while a client reads angles.
+
+    python benchmarks/end_to_end.py [seconds] [rate]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from encoder.DataEncoder import BinaryDataEncoder
+from encoder.File import File
+from encoder.History import History
+from encoder.SharedMemory import SharedMemory
+from encoder.Socket import SocketServer, SocketClient
+from encoder.Watchdog import PositionWatchdog
+from encoder.interface import EncoderInterface
+from encoder.simulation import SimulatedEncoderFactory
+
+
+def percentile(values, p):
+    if len(values) == 0:
+        return float('nan')
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def transports(directory):
+    path = os.path.join(directory, 'encoder')
+    yield 'file/json', File(path + '.json'), File(path + '.json')
+    yield 'file/binary', File(path + '.bin', BinaryDataEncoder()), File(path + '.bin', BinaryDataEncoder())
+    yield 'shm/binary', SharedMemory(path + '.shm', BinaryDataEncoder()), SharedMemory(path + '.shm', BinaryDataEncoder())
+    yield 'socket/binary', SocketServer(path + '.sock', BinaryDataEncoder()), SocketClient(path + '.sock', BinaryDataEncoder())
+
+
+def run(name, server, client, seconds, rate):
+    history = History(capacity=int(rate * seconds * 2) + 1)
+    watchdog = PositionWatchdog(server, SimulatedEncoderFactory(rate=rate), history, batch_size=64)
+    interface = EncoderInterface(client)
+
+    watchdog.start()
+
+    latencies = []
+    ages = []
+    errors = 0
+    end = time.time() + seconds
+    while time.time() < end:
+        start = time.time()
+        try:
+            data = interface.get_data()
+            interface.get_angle()
+        except (RuntimeError, IOError, OSError):
+            errors += 1
+            continue
+        now = time.time()
+        latencies.append(now - start)
+        ages.append(now - data.get_time())
+
+    watchdog.stop()
+    watchdog.join()
+    client.close()
+
+    latencies.sort()
+    ages.sort()
+
+    print("{:<14} published {:>8.0f}/s  reads {:>8.0f}/s  read p50 {:>7.1f} us  p99 {:>7.1f} us  "
+          "age p50 {:>7.1f} us  errors {}".format(
+              name, len(history) / seconds, len(latencies) / seconds,
+              percentile(latencies, 0.5) * 1e6, percentile(latencies, 0.99) * 1e6,
+              percentile(ages, 0.5) * 1e6, errors))
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 10000.0
+
+    directory = tempfile.mkdtemp()
+    for name, server, client in transports(directory):
+        run(name, server, client, seconds, rate)
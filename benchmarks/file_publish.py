@@ -0,0 +1,79 @@
+"""
+Contention between the watchdog writing the encoder file and clients reading it, for the
+locked truncate-and-write mode and the atomic rename mode.
+
+    python benchmarks/file_publish.py [readers] [seconds]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from encoder.DataEncoder import Sample, BinaryDataEncoder
+from encoder.File import File
+
+
+def percentile(values, p):
+    if len(values) == 0:
+        return float('nan')
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def write(comm, stop, ticks):
+    trigger = 0
+    while not stop.is_set():
+        trigger += 1
+        start = time.time()
+        comm.save(Sample(trigger, trigger * 1e-3, [1.0, 14.0], 2.0, [0.5, 20.5]))
+        ticks.append(time.time() - start)
+
+
+def read(comm, stop, latencies, errors):
+    while not stop.is_set():
+        start = time.time()
+        try:
+            comm.load()
+        except RuntimeError:
+            errors.append(1)
+            continue
+        latencies.append(time.time() - start)
+
+
+def run(atomic, readers, seconds):
+    path = os.path.join(tempfile.mkdtemp(), 'encoder.bin')
+    writer = File(path, BinaryDataEncoder(), atomic=atomic)
+    writer.save(Sample(0, 0.0))
+
+    stop = threading.Event()
+    ticks = []
+    latencies = []
+    errors = []
+
+    threads = [threading.Thread(target=write, args=(writer, stop, ticks))]
+    threads += [threading.Thread(target=read, args=(File(path, BinaryDataEncoder(), atomic=atomic), stop, latencies,
+                                                    errors)) for _ in range(readers)]
+
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    ticks.sort()
+    latencies.sort()
+
+    print("{:<8} ticks {:>7.0f}/s  tick p50 {:>7.1f} us  p99 {:>8.1f} us  reads {:>7.0f}/s  "
+          "read p50 {:>7.1f} us  p99 {:>8.1f} us  empty reads {}".format(
+              'atomic' if atomic else 'locked', len(ticks) / seconds,
+              percentile(ticks, 0.5) * 1e6, percentile(ticks, 0.99) * 1e6, len(latencies) / seconds,
+              percentile(latencies, 0.5) * 1e6, percentile(latencies, 0.99) * 1e6, len(errors)))
+
+
+if __name__ == '__main__':
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    run(False, readers, seconds)
+    run(True, readers, seconds)
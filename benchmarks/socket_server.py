@@ -0,0 +1,90 @@
+"""
+Throughput of the socket transport: a publisher feeds synthetic samples into a SocketServer
+while clients either stream every sample or issue request/response reads.
+
+    python benchmarks/socket_server.py [clients] [seconds]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from encoder.DataEncoder import Sample, BinaryDataEncoder
+from encoder.Socket import SocketServer, SocketClient
+
+
+def publish(server, stop, counter):
+    trigger = 0
+    while not stop.is_set():
+        trigger += 1
+        server.save(Sample(trigger, trigger * 1e-3, [1.0, 14.0], 2.0, [0.5, 20.5], time.time()))
+        counter[0] = trigger
+
+
+def stream(address, stop, counts, index):
+    client = SocketClient(address, BinaryDataEncoder())
+    for _ in client.stream():
+        counts[index] += 1
+        if stop.is_set():
+            break
+    client.close()
+
+
+def request(address, stop, counts, latencies, index):
+    client = SocketClient(address, BinaryDataEncoder())
+    while not stop.is_set():
+        start = time.time()
+        client.load()
+        latencies.append(time.time() - start)
+        counts[index] += 1
+    client.close()
+
+
+def run(mode, clients, seconds):
+    address = os.path.join(tempfile.mkdtemp(), 'encoder.sock')
+    server = SocketServer(address, BinaryDataEncoder())
+    server.start()
+    server.save(Sample(0, 0.0, [1.0, 14.0], 2.0, [0.5, 20.5], time.time()))
+
+    stop = threading.Event()
+    counts = [0] * clients
+    latencies = []
+    published = [0]
+
+    if mode == 'stream':
+        threads = [threading.Thread(target=stream, args=(address, stop, counts, i)) for i in range(clients)]
+    else:
+        threads = [threading.Thread(target=request, args=(address, stop, counts, latencies, i)) for i in range(clients)]
+
+    for thread in threads:
+        thread.start()
+
+    publisher = threading.Thread(target=publish, args=(server, stop, published))
+    publisher.start()
+
+    time.sleep(seconds)
+    stop.set()
+    publisher.join()
+    server.save(Sample(0, 0.0, None, None, None, time.time()))
+    for thread in threads:
+        thread.join()
+    server.close()
+
+    line = "{:<8} clients {:>3}  published {:>9.0f}/s  received {:>9.0f}/s".format(
+        mode, clients, published[0] / seconds, sum(counts) / seconds)
+
+    if latencies:
+        latencies.sort()
+        line += "  latency p50 {:.1f} us  p99 {:.1f} us".format(
+            latencies[len(latencies) // 2] * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6)
+
+    print(line)
+
+
+if __name__ == '__main__':
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    run('stream', clients, seconds)
+    run('request', clients, seconds)
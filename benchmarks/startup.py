@@ -0,0 +1,61 @@
+"""
+Import time and first-read latency of a client-only process. Every measurement runs in a fresh
+interpreter; the report also lists which heavy modules the client ended up importing.
+
+    python benchmarks/startup.py [runs]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from encoder.DataEncoder import Sample
+from encoder.File import File
+
+
+CLIENT = r'''
+import sys, time
+start = time.time()
+from encoder.factory import Factory
+from encoder.File import File
+imported = time.time()
+interface = Factory().get_interface(File(sys.argv[1]))
+data = interface.get_data()
+read = time.time()
+heavy = [m for m in ('numpy', 'heidenhain', 'encoder.Watchdog', 'encoder.heidenhain_encoder') if m in sys.modules]
+print('{} {} {}'.format(imported - start, read - imported, ','.join(heavy) or '-'))
+'''
+
+
+def percentile(values, p):
+    return sorted(values)[min(int(len(values) * p), len(values) - 1)]
+
+
+def measure(code, runs, *args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))] +
+                                        [p for p in sys.path if p])
+
+    results = []
+    for _ in range(runs):
+        start = time.time()
+        output = subprocess.check_output([sys.executable, '-c', code] + list(args), env=env)
+        results.append((time.time() - start, output.decode('utf-8').split()))
+    return results
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    path = os.path.join(tempfile.mkdtemp(), 'encoder.json')
+    File(path).save(Sample(1, 12.5, [1.0, 14.0], 3.0, [0.5, 20.5], time.time()))
+
+    baseline = [total for total, _ in measure('pass', runs)]
+    client = measure(CLIENT, runs, path)
+
+    print("interpreter        p50 {:>7.1f} ms".format(percentile(baseline, 0.5) * 1e3))
+    print("client process     p50 {:>7.1f} ms".format(percentile([total for total, _ in client], 0.5) * 1e3))
+    print("import factory     p50 {:>7.1f} ms".format(percentile([float(o[0]) for _, o in client], 0.5) * 1e3))
+    print("first read         p50 {:>7.1f} ms".format(percentile([float(o[1]) for _, o in client], 0.5) * 1e3))
+    print("heavy modules      {}".format(client[0][1][2]))
@@ -0,0 +1,66 @@
+"""
+Cost of the error paths: a watchdog publishing an unreferenced simulated encoder and clients
+asking for the angle with get_angle() (raises per call) and try_get_angle() (status code).
+
+    python benchmarks/unreferenced.py [seconds] [rate]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from encoder.DataEncoder import BinaryDataEncoder
+from encoder.SharedMemory import SharedMemory
+from encoder.Watchdog import PositionWatchdog
+from encoder.interface import EncoderInterface
+from encoder.metrics import METRICS
+from encoder.simulation import SimulatedEncoderFactory
+
+
+def raising(interface):
+    try:
+        interface.get_angle()
+    except RuntimeError:
+        pass
+
+
+def status(interface):
+    interface.try_get_angle()
+
+
+def measure(name, interface, read, seconds):
+    count = 0
+    end = time.time() + seconds
+    start = time.time()
+    while time.time() < end:
+        read(interface)
+        count += 1
+
+    elapsed = time.time() - start
+    print("{:<16} {:>9.0f} reads/s  {:>7.2f} us/read".format(name, count / elapsed, elapsed / count * 1e6))
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 10000.0
+
+    METRICS.enable()
+
+    path = os.path.join(tempfile.mkdtemp(), 'encoder.shm')
+    server = SharedMemory(path, BinaryDataEncoder())
+    client = SharedMemory(path, BinaryDataEncoder())
+
+    watchdog = PositionWatchdog(server, SimulatedEncoderFactory(rate=rate, referenced=False), batch_size=64)
+    watchdog.start()
+    time.sleep(0.1)
+
+    interface = EncoderInterface(client)
+    measure('get_angle', interface, raising, seconds)
+    measure('try_get_angle', interface, status, seconds)
+
+    watchdog.stop()
+    watchdog.join()
+
+    stats = METRICS.get_stats()
+    print("published {} samples, publish p50 {} s".format(
+        stats.get('samples_published', 0), stats.get('publish_seconds', {}).get('p50')))
@@ -1,6 +1,11 @@
 import json
+import struct
 import time
 
+from collections import namedtuple
+
+from encoder.metrics import METRICS
+
 
 class Data(object):
     KEY_TRIGGER_COUNT = 'trigger'
@@ -45,10 +50,7 @@ class Data(object):
         return self._dict[self.KEY_THETA_POSITION]
 
     def get_references_theta(self):
-        try:
-            return self._dict[self.KEY_THETA_REFERENCE]
-        except:
-            return None
+        return self._dict.get(self.KEY_THETA_REFERENCE)
 
     def has_reference_theta(self):
         return self.KEY_THETA_REFERENCE in self._dict
@@ -57,10 +59,7 @@ class Data(object):
         return self._dict[self.KEY_Z_POSITION]
 
     def get_references_z(self):
-        try:
-            return self._dict[self.KEY_Z_REFERENCE]
-        except:
-            return None
+        return self._dict.get(self.KEY_Z_REFERENCE)
 
     def has_reference_z(self):
         return self.KEY_Z_REFERENCE in self._dict
@@ -117,20 +116,302 @@ class ErrorData(Data):
         self._error()
 
 
+_SampleRecord = namedtuple('Sample', ['trigger', 'theta', 'theta_ref', 'z', 'z_ref', 'time', 'exception', 'error',
+                                      'theta_status', 'z_status', 'calibration'])
+_SampleRecord.__new__.__defaults__ = (None, None, None, None, None, None, None, False, None, None, None)
+
+
+class Sample(_SampleRecord):
+    """
+    Immutable, slotted counterpart of Data. Missing values are None.
+
+    theta_status/z_status carry one of the STATUS_* codes per axis; if they are not given they are
+    derived from the error flag and the references. calibration is the version of the calibration
+    the positions were computed with, see encoder.calibration_store.
+    """
+
+    __slots__ = ()
+
+    STATUS_OK = 0
+    STATUS_NO_REFERENCE = 1
+    STATUS_ERROR = 2
+    # only produced by client side checks
+    STATUS_STALE = 3
+    STATUS_INVALID_REFERENCE = 4
+
+    KEY_TRIGGER_COUNT = Data.KEY_TRIGGER_COUNT
+    KEY_THETA_POSITION = Data.KEY_THETA_POSITION
+    KEY_THETA_REFERENCE = Data.KEY_THETA_REFERENCE
+    KEY_Z_POSITION = Data.KEY_Z_POSITION
+    KEY_Z_REFERENCE = Data.KEY_Z_REFERENCE
+    KEY_ERROR = Data.KEY_ERROR
+    KEY_TIME = Data.KEY_TIME
+    KEY_EXCEPTION = Data.KEY_EXCEPTION
+    KEY_THETA_STATUS = 'theta_status'
+    KEY_Z_STATUS = 'z_status'
+    KEY_CALIBRATION = 'calibration'
+
+    @classmethod
+    def from_dict(cls, d):
+        if d.get(cls.KEY_ERROR, False):
+            cls = ErrorSample
+
+        return cls(d.get(cls.KEY_TRIGGER_COUNT), d.get(cls.KEY_THETA_POSITION), d.get(cls.KEY_THETA_REFERENCE),
+                   d.get(cls.KEY_Z_POSITION), d.get(cls.KEY_Z_REFERENCE), d.get(cls.KEY_TIME),
+                   d.get(cls.KEY_EXCEPTION), d.get(cls.KEY_ERROR, False), d.get(cls.KEY_THETA_STATUS),
+                   d.get(cls.KEY_Z_STATUS), d.get(cls.KEY_CALIBRATION))
+
+    def _status(self, status, reference):
+        if self.error:
+            return self.STATUS_ERROR
+        if not status is None:
+            return status
+        if reference is None:
+            return self.STATUS_NO_REFERENCE
+        return self.STATUS_OK
+
+    def get_status_theta(self):
+        return self._status(self.theta_status, self.theta_ref)
+
+    def get_status_z(self):
+        return self._status(self.z_status, self.z_ref)
+
+    def get_time(self):
+        return self.time
+
+    def get_calibration_version(self):
+        return self.calibration
+
+    def get_exception(self):
+        return self.exception
+
+    def has_exception(self):
+        return not self.exception is None and not self.exception == ''
+
+    def get_trigger_count(self):
+        return self.trigger
+
+    def get_position_theta(self):
+        return self.theta
+
+    def get_references_theta(self):
+        return self.theta_ref
+
+    def has_reference_theta(self):
+        return not self.theta_ref is None
+
+    def get_position_z(self):
+        return self.z
+
+    def get_references_z(self):
+        return self.z_ref
+
+    def has_reference_z(self):
+        return not self.z_ref is None
+
+    def get_dict(self):
+        d = {}
+        for key, value in zip([self.KEY_TRIGGER_COUNT, self.KEY_THETA_POSITION, self.KEY_THETA_REFERENCE,
+                               self.KEY_Z_POSITION, self.KEY_Z_REFERENCE, self.KEY_TIME, self.KEY_EXCEPTION],
+                              self[:7]):
+            if not value is None:
+                d[key] = value
+
+        if self.error:
+            d[self.KEY_ERROR] = True
+
+        if not self.theta_status is None:
+            d[self.KEY_THETA_STATUS] = self.theta_status
+
+        if not self.z_status is None:
+            d[self.KEY_Z_STATUS] = self.z_status
+
+        if not self.calibration is None:
+            d[self.KEY_CALIBRATION] = self.calibration
+
+        return d
+
+
+class ErrorSample(Sample):
+    __slots__ = ()
+
+    def __new__(cls, trigger=None, theta=None, theta_ref=None, z=None, z_ref=None, time=None, exception=None,
+                error=True, theta_status=None, z_status=None, calibration=None):
+        return super(ErrorSample, cls).__new__(cls, trigger, theta, theta_ref, z, z_ref, time, exception, True,
+                                               Sample.STATUS_ERROR, Sample.STATUS_ERROR, calibration)
+
+    def _error(self):
+        raise RuntimeError('Encoder data cannot be read')
+
+    def get_trigger_count(self):
+        self._error()
+
+    def get_position_theta(self):
+        self._error()
+
+    def get_references_theta(self):
+        self._error()
+
+    def has_reference_theta(self):
+        self._error()
+
+    def get_position_z(self):
+        self._error()
+
+    def get_references_z(self):
+        self._error()
+
+    def has_reference_z(self):
+        self._error()
+
+
 class DataEncoder(object):
+    BINARY = False
+
     def __init__(self):
         pass
 
-    def encode(self, object):
+    def _prepare(self, object):
+        if isinstance(object, Sample):
+            if object.time is None:
+                object = object._replace(time=time.time())
+            return object
+
         if not isinstance(object, Data):
-            raise RuntimeError("object is not an instance of Data")
+            raise RuntimeError("object is not an instance of Data or Sample")
 
         object.set_time(time.time())
+        return object
+
+    def encode(self, object):
+        with METRICS.timer('encode_seconds'):
+            return json.dumps(self._prepare(object).get_dict())
+
+    def decode(self, encoded_object):
+        try:
+            return Sample.from_dict(json.loads(encoded_object))
+        except:
+            return ErrorSample()
+
+
+class BinaryDataEncoder(DataEncoder):
+    """
+    Fixed-width struct record: version, presence flags, trigger, theta, theta references,
+    z, z references, time, the axis status codes, the calibration version and the length of the
+    trailing utf-8 exception text. Version 1 (without status codes) and version 2 (without calibration
+    version) records are still decoded.
+    """
+
+    VERSION = 3
+    BINARY = True
+
+    RECORD = struct.Struct('<BHqdddddddBBIH')
+    RECORD_V2 = struct.Struct('<BHqdddddddBBH')
+    RECORD_V1 = struct.Struct('<BHqdddddddH')
 
-        return json.dumps(object.get_dict())
+    FLAG_TRIGGER = 1 << 0
+    FLAG_THETA = 1 << 1
+    FLAG_THETA_REFERENCE = 1 << 2
+    FLAG_Z = 1 << 3
+    FLAG_Z_REFERENCE = 1 << 4
+    FLAG_TIME = 1 << 5
+    FLAG_ERROR = 1 << 6
+    FLAG_EXCEPTION = 1 << 7
+    FLAG_STATUS = 1 << 8
+    FLAG_CALIBRATION = 1 << 9
+
+    MAX_EXCEPTION_LENGTH = 0xFFFF
+
+    NO_REFERENCE = (0.0, 0.0)
+
+    def _pair(self, references):
+        if not len(references) == 2:
+            raise RuntimeError("Binary encoding requires exactly two reference positions")
+        return float(references[0]), float(references[1])
+
+    def encode(self, object):
+        with METRICS.timer('encode_seconds'):
+            return self._encode(object)
+
+    def _encode(self, object):
+        sample = self._prepare(object)
+        if isinstance(sample, Data):
+            sample = Sample.from_dict(sample.get_dict())
+
+        flags = self.FLAG_TIME
+        theta_ref = z_ref = self.NO_REFERENCE
+        exception = b''
+
+        if not sample.trigger is None:
+            flags |= self.FLAG_TRIGGER
+        if not sample.theta is None:
+            flags |= self.FLAG_THETA
+        if not sample.theta_ref is None:
+            flags |= self.FLAG_THETA_REFERENCE
+            theta_ref = self._pair(sample.theta_ref)
+        if not sample.z is None:
+            flags |= self.FLAG_Z
+        if not sample.z_ref is None:
+            flags |= self.FLAG_Z_REFERENCE
+            z_ref = self._pair(sample.z_ref)
+        if sample.error:
+            flags |= self.FLAG_ERROR
+        if not sample.theta_status is None or not sample.z_status is None:
+            flags |= self.FLAG_STATUS
+        if not sample.calibration is None:
+            flags |= self.FLAG_CALIBRATION
+        if not sample.exception is None:
+            flags |= self.FLAG_EXCEPTION
+            exception = sample.exception.encode('utf-8')
+            if len(exception) > self.MAX_EXCEPTION_LENGTH:
+                # cut on a character boundary, a split multibyte character would make the record undecodable
+                exception = exception[:self.MAX_EXCEPTION_LENGTH].decode('utf-8', 'ignore').encode('utf-8')
+
+        return self.RECORD.pack(self.VERSION, flags, sample.trigger or 0, sample.theta or 0.0, theta_ref[0],
+                                theta_ref[1], sample.z or 0.0, z_ref[0], z_ref[1], sample.time,
+                                sample.get_status_theta(), sample.get_status_z(), sample.calibration or 0,
+                                len(exception)) + exception
 
     def decode(self, encoded_object):
         try:
-            return Data(json.loads(encoded_object))
+            version = bytearray(encoded_object[:1])[0]
+
+            calibration = None
+
+            if version == self.VERSION:
+                record = self.RECORD
+                (_, flags, trigger, theta, theta_ref1, theta_ref2, z, z_ref1, z_ref2, t, theta_status, z_status,
+                 calibration, length) = record.unpack_from(encoded_object, 0)
+            elif version == 2:
+                record = self.RECORD_V2
+                (_, flags, trigger, theta, theta_ref1, theta_ref2,
+                 z, z_ref1, z_ref2, t, theta_status, z_status, length) = record.unpack_from(encoded_object, 0)
+            elif version == 1:
+                record = self.RECORD_V1
+                (_, flags, trigger, theta, theta_ref1, theta_ref2,
+                 z, z_ref1, z_ref2, t, length) = record.unpack_from(encoded_object, 0)
+            else:
+                raise RuntimeError("Unknown binary data version")
+
+            if version == 1 or not flags & self.FLAG_STATUS:
+                theta_status = z_status = None
+
+            if not flags & self.FLAG_CALIBRATION:
+                calibration = None
+
+            exception = None
+            if flags & self.FLAG_EXCEPTION:
+                start = record.size
+                exception = bytes(encoded_object[start:start + length]).decode('utf-8')
+
+            cls = ErrorSample if flags & self.FLAG_ERROR else Sample
+
+            return cls(trigger if flags & self.FLAG_TRIGGER else None,
+                       theta if flags & self.FLAG_THETA else None,
+                       [theta_ref1, theta_ref2] if flags & self.FLAG_THETA_REFERENCE else None,
+                       z if flags & self.FLAG_Z else None,
+                       [z_ref1, z_ref2] if flags & self.FLAG_Z_REFERENCE else None,
+                       t if flags & self.FLAG_TIME else None,
+                       exception, False, theta_status, z_status, calibration)
         except:
-            return ErrorData({})
+            return ErrorSample()
@@ -1,7 +1,73 @@
+import os
+import stat
+import time
+
+import encoder.parameters
 from encoder.DataEncoder import DataEncoder
+from encoder.metrics import METRICS
 from e21_util.lock import ENCODER_FILE_LOCK
 
 
+def _replacement_mode(path):
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        # reading the umask means setting it, which would race with other threads
+        return 0o644
+
+
+def write_atomic(path, raw):
+    """
+    Replaces the file at path by one holding raw (str or bytes). The new content is written to a
+    temporary file in the same directory and renamed into place, so readers see either the old or
+    the new file. mkstemp creates files readable by their owner only, the new file gets the mode of
+    the file it replaces instead, or 0644.
+    """
+    import tempfile
+
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.' + name + '.', dir=directory)
+    try:
+        os.fchmod(fd, _replacement_mode(path))
+        with os.fdopen(fd, 'wb' if isinstance(raw, bytes) else 'w') as f:
+            f.write(raw)
+        os.rename(tmp, path)
+    except BaseException as e:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise e
+
+
+def create_mapping(path, size, reusable):
+    """
+    Prepares the file of a writable memory-mapped ring (SharedMemory, History, TriggerTable)
+    without truncating it.
+
+    Other processes may have the file mapped, shrinking it would kill them with SIGBUS. An existing
+    file of the right size is kept if reusable() accepts it, any other is unlinked (mappings keep
+    the old inode) and replaced by a new one.
+
+    :return: True if a new zeroed file has been created
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        existing = os.fstat(fd).st_size
+        if existing == size and reusable():
+            return False
+
+        if existing > 0:
+            os.close(fd)
+            fd = None
+            os.unlink(path)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+
+        os.ftruncate(fd, size)
+        return True
+    finally:
+        if not fd is None:
+            os.close(fd)
+
+
 class AbstractCommunication(object):
     """
     :return: Data
@@ -13,36 +79,202 @@ class AbstractCommunication(object):
     def save(self, data):
         raise RuntimeError('No implementation')
 
+    def save_batch(self, samples):
+        """
+        Publishes several samples at once. Transports that only hold the latest sample
+        just publish the last one.
+        """
+        return self.save(samples[-1])
+
+    def has_clients(self):
+        """
+        :return: False only if the transport knows that nobody is reading
+        """
+        return True
+
+    def close(self):
+        pass
+
+
+class ClientHeartbeat(object):
+    """
+    Reader presence for transports that do not see their readers. Every reader touches the file
+    `path + SUFFIX` at most every INTERVAL seconds; the writer reports clients as long as the file
+    has been touched within the last TIMEOUT seconds.
+
+    The writer creates the file with mode 0666, so readers of other users can touch it. A reader
+    that cannot is not counted, the writer then only ticks at its idle rate.
+    """
+
+    SUFFIX = '.clients'
+    INTERVAL = 0.5
+    TIMEOUT = 2.0
+
+    def __init__(self, path):
+        self._path = path + self.SUFFIX
+        self._next_touch = 0
+        self._next_check = 0
+        self._clients = True
+
+    def get_path(self):
+        return self._path
+
+    def touch(self):
+        now = time.time()
+        if now < self._next_touch:
+            return
+        self._next_touch = now + self.INTERVAL
+
+        try:
+            os.utime(self._path, None)
+        except OSError:
+            # no writer yet, or not permitted
+            pass
+
+    def has_clients(self):
+        now = time.time()
+        if now < self._next_check:
+            return self._clients
+        self._next_check = now + self.INTERVAL
+
+        try:
+            touched = os.stat(self._path).st_mtime
+        except OSError:
+            self._create()
+            # a new file counts as touched, readers of a previous writer get TIMEOUT seconds to show up
+            touched = now
+
+        self._clients = now - touched < self.TIMEOUT
+        return self._clients
+
+    def _create(self):
+        try:
+            fd = os.open(self._path, os.O_WRONLY | os.O_CREAT, 0o666)
+        except OSError:
+            return
+
+        try:
+            os.fchmod(fd, 0o666)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
 
 class File(AbstractCommunication):
-    def __init__(self, filepath, encoder=None):
+    # a cached sample must never be older than a client accepts
+    MAX_CACHE_AGE = encoder.parameters.TIME_DIFF
+
+    def __init__(self, filepath, encoder=None, cache_max_age=None, atomic=False):
+        """
+        :param cache_max_age: if given, load() returns the last decoded sample without reading the
+                              file as long as the file is unchanged and the cached sample is younger
+                              than cache_max_age seconds
+        :param atomic: save() writes a temporary file and renames it into place, so neither save()
+                       nor load() take ENCODER_FILE_LOCK. Writer and readers must agree on this mode.
+        """
         self._path = filepath
 
         if not encoder is None and not isinstance(encoder, DataEncoder):
             raise RuntimeError("Given encoder must be an instance of DataEncoder")
 
+        if not cache_max_age is None and not 0 < cache_max_age <= self.MAX_CACHE_AGE:
+            raise RuntimeError("cache_max_age must be in (0, {}]".format(self.MAX_CACHE_AGE))
+
         if encoder is None:
             encoder = DataEncoder()
 
         self._encoder = encoder
         self._lock = ENCODER_FILE_LOCK()
+        self._atomic = atomic
+        self._heartbeat = ClientHeartbeat(filepath)
+
+        self._cache_max_age = cache_max_age
+        self._cache_key = None
+        self._cache_time = 0
+        self._cache_data = None
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    def _mode(self, mode):
+        if self._encoder.BINARY:
+            return mode + 'b'
+        return mode
+
+    def get_cache_statistics(self):
+        return {'hits': self._cache_hits, 'misses': self._cache_misses}
+
+    def _file_key(self):
+        st = os.stat(self._path)
+        return st.st_ino, st.st_size, getattr(st, 'st_mtime_ns', st.st_mtime)
 
     def load(self):
         """
 
         :return: encoder.DataEncoder.Data
         """
-        with self._lock:
-            with open(self._path, 'r') as f:
-                raw = f.read()
-                if raw == "":
-                    raise RuntimeError("No data in file found.")
-                data = self._encoder.decode(raw)
-                return data
+        self._heartbeat.touch()
+
+        if self._cache_max_age is None:
+            return self._load()
+
+        key = self._file_key()
+        now = time.time()
+
+        if key == self._cache_key and now - self._cache_time < self._cache_max_age:
+            self._cache_hits += 1
+            METRICS.count('file_cache_hits')
+            return self._cache_data
+
+        self._cache_misses += 1
+        METRICS.count('file_cache_misses')
+
+        data = self._load()
+
+        # keyed by the state before reading: a concurrent write changes the key and forces a reload
+        self._cache_key = key
+        self._cache_time = now
+        self._cache_data = data
+        return data
+
+    def has_clients(self):
+        return self._heartbeat.has_clients()
+
+    def _load(self):
+        if self._atomic:
+            return self._read()
+
+        self._acquire()
+        try:
+            return self._read()
+        finally:
+            self._lock.release()
+
+    def _acquire(self):
+        with METRICS.timer('file_lock_wait_seconds'):
+            self._lock.acquire()
+
+    def _read(self):
+        with open(self._path, self._mode('r')) as f:
+            raw = f.read()
+            if not raw:
+                raise RuntimeError("No data in file found.")
+            data = self._encoder.decode(raw)
+            return data
 
     def save(self, data):
-        with self._lock:
-            with open(self._path, 'w') as f:
+        if self._atomic:
+            return self._save_atomic(data)
+
+        self._acquire()
+        try:
+            with open(self._path, self._mode('w')) as f:
                 raw = self._encoder.encode(data)
                 f.write(raw)
                 return True
+        finally:
+            self._lock.release()
+
+    def _save_atomic(self, data):
+        write_atomic(self._path, self._encoder.encode(data))
+        return True
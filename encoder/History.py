@@ -0,0 +1,184 @@
+import os
+import numpy
+
+from encoder.DataEncoder import Data, Sample
+from encoder.File import create_mapping
+
+
+class History(object):
+    """
+    Bounded ring of the last `capacity` samples, stored as a NumPy structured array.
+
+    With a filepath the array is a memory-mapped file: the watchdog appends to it and
+    clients map the same file read-only. Queries return views into the ring whenever
+    the requested window does not wrap around, so they reflect live data; copy them
+    if they must outlive the next `capacity` samples.
+    """
+
+    MAGIC = 0x48434e45
+    VERSION = 1
+
+    HEADER = numpy.dtype([('magic', '<u4'), ('version', '<u4'), ('capacity', '<i8'), ('count', '<i8'), ('reserved', '<i8')])
+    DTYPE = numpy.dtype([('time', '<f8'), ('theta', '<f8'), ('z', '<f8'), ('trigger', '<i8')])
+
+    NO_TRIGGER = -1
+    DEFAULT_CAPACITY = 100000
+
+    def __init__(self, filepath=None, capacity=DEFAULT_CAPACITY, writable=True):
+        if capacity < 1:
+            raise RuntimeError("History capacity must be positive")
+
+        self._path = filepath
+        self._capacity = capacity
+        self._writable = writable
+        self._header = None
+        self._records = None
+
+        if filepath is None:
+            self._header = numpy.zeros(1, dtype=self.HEADER)[0]
+            self._header['capacity'] = capacity
+            self._records = numpy.zeros(capacity, dtype=self.DTYPE)
+
+    def _open(self):
+        if not self._records is None:
+            return
+
+        if self._writable:
+            size = self.HEADER.itemsize + self._capacity * self.DTYPE.itemsize
+            # a ring left by a previous watchdog with the same capacity is continued
+            created = create_mapping(self._path, size, self._is_compatible)
+
+            header = numpy.memmap(self._path, dtype=self.HEADER, mode='r+', shape=(1,))
+            if created:
+                header['capacity'] = self._capacity
+                header['version'] = self.VERSION
+                # readers accept the file only once the header is complete
+                header['magic'] = self.MAGIC
+            self._header = header[0]
+            mode = 'r+'
+        else:
+            if not os.path.exists(self._path) or os.path.getsize(self._path) < self.HEADER.itemsize:
+                raise RuntimeError("No history found.")
+
+            header = numpy.memmap(self._path, dtype=self.HEADER, mode='r', shape=(1,))[0]
+            if not header['magic'] == self.MAGIC or not header['version'] == self.VERSION:
+                raise RuntimeError("History has an unknown layout")
+
+            self._header = header
+            self._capacity = int(header['capacity'])
+            mode = 'r'
+
+        self._records = numpy.memmap(self._path, dtype=self.DTYPE, mode=mode,
+                                     offset=self.HEADER.itemsize, shape=(self._capacity,))
+
+    def _is_compatible(self):
+        header = numpy.memmap(self._path, dtype=self.HEADER, mode='r', shape=(1,))[0]
+        return (header['magic'] == self.MAGIC and header['version'] == self.VERSION and
+                header['capacity'] == self._capacity)
+
+    def get_capacity(self):
+        return self._capacity
+
+    def append(self, data):
+        """
+        :param data: encoder.DataEncoder.Sample (or Data), must have its time set
+        """
+        if not self._writable:
+            raise RuntimeError("History is read-only")
+
+        if isinstance(data, Data):
+            data = Sample.from_dict(data.get_dict())
+
+        self._open()
+
+        count = int(self._header['count'])
+
+        self._records[count % self._capacity] = (
+            data.time,
+            numpy.nan if data.theta is None else data.theta,
+            numpy.nan if data.z is None else data.z,
+            self.NO_TRIGGER if data.trigger is None else data.trigger
+        )
+
+        # publish the record only after it has been written completely
+        self._header['count'] = count + 1
+
+    def extend(self, samples):
+        for data in samples:
+            self.append(data)
+
+    def _segments(self):
+        self._open()
+
+        count = int(self._header['count'])
+        n = min(count, self._capacity)
+        first = (count - n) % self._capacity
+
+        if first + n <= self._capacity:
+            return [self._records[first:first + n]]
+
+        return [self._records[first:], self._records[:first + n - self._capacity]]
+
+    def _search(self, segments, t, side):
+        offset = 0
+        for segment in segments:
+            if len(segment) > 0 and (t < segment['time'][-1] or (side == 'left' and t == segment['time'][-1])):
+                return offset + int(numpy.searchsorted(segment['time'], t, side=side))
+            offset += len(segment)
+        return offset
+
+    def _slice(self, segments, start, stop):
+        offset = 0
+        parts = []
+        for segment in segments:
+            lo = max(start - offset, 0)
+            hi = min(stop - offset, len(segment))
+            if lo < hi:
+                parts.append(segment[lo:hi])
+            offset += len(segment)
+
+        if len(parts) == 0:
+            return numpy.zeros(0, dtype=self.DTYPE)
+        if len(parts) == 1:
+            return parts[0]
+        return numpy.concatenate(parts)
+
+    def __len__(self):
+        return sum(len(segment) for segment in self._segments())
+
+    def get_history(self, since=None):
+        """
+        :return: structured array (time, theta, z, trigger) of all samples newer than `since`
+        """
+        segments = self._segments()
+        start = 0 if since is None else self._search(segments, since, 'right')
+        return self._slice(segments, start, sum(len(segment) for segment in segments))
+
+    def get_range(self, t0, t1):
+        """
+        :return: structured array (time, theta, z, trigger) of all samples with t0 <= time <= t1
+        """
+        segments = self._segments()
+        return self._slice(segments, self._search(segments, t0, 'left'), self._search(segments, t1, 'right'))
+
+    def get_angle_at(self, t):
+        return self._interpolate('theta', t)
+
+    def get_z_at(self, t):
+        return self._interpolate('z', t)
+
+    def _interpolate(self, field, t):
+        segments = self._segments()
+        n = sum(len(segment) for segment in segments)
+        index = self._search(segments, t, 'left')
+
+        window = self._slice(segments, max(index - 1, 0), min(index + 1, n))
+
+        if len(window) == 0 or t < window['time'][0] or t > window['time'][-1]:
+            raise RuntimeError("Requested time is not covered by the history")
+
+        values = window[field]
+        if numpy.isnan(values).any():
+            raise RuntimeError("No valid position recorded at the requested time")
+
+        return float(numpy.interp(t, window['time'], values))
@@ -0,0 +1,211 @@
+import mmap
+import os
+import struct
+import time
+
+from encoder.DataEncoder import DataEncoder
+from encoder.File import AbstractCommunication, ClientHeartbeat, create_mapping
+
+
+class SharedMemory(AbstractCommunication):
+    """
+    Memory-mapped ring buffer of fixed-size slots.
+
+    Layout: a header (magic, version, slot count, slot size, head) followed by
+    `slots` slots. Each slot starts with a sequence number and the payload length.
+    The writer makes the sequence odd while it is writing a slot and even again once
+    it is done (seqlock), then advances head. Readers never take a lock: they copy
+    the newest slot and retry if the sequence changed in between.
+
+    A restarted writer continues the ring of its predecessor if the layout matches, so
+    readers keep their mapping and never see a slot being cleared. Otherwise it replaces the
+    file; readers notice the new inode within STAT_INTERVAL seconds and map the new file.
+    """
+
+    MAGIC = b'ENCR'
+    VERSION = 1
+
+    HEADER = struct.Struct('<4sIIIQ')
+    HEAD = struct.Struct('<Q')
+    HEAD_OFFSET = HEADER.size - HEAD.size
+    SLOT_HEADER = struct.Struct('<QI')
+    SEQ = struct.Struct('<Q')
+
+    DEFAULT_SLOTS = 64
+    DEFAULT_SLOT_SIZE = 1024
+
+    READ_RETRIES = 100
+    STAT_INTERVAL = 0.1
+
+    def __init__(self, filepath, encoder=None, slots=DEFAULT_SLOTS, slot_size=DEFAULT_SLOT_SIZE):
+        self._path = filepath
+
+        if not encoder is None and not isinstance(encoder, DataEncoder):
+            raise RuntimeError("Given encoder must be an instance of DataEncoder")
+
+        if encoder is None:
+            encoder = DataEncoder()
+
+        if slots < 2:
+            raise RuntimeError("Ring buffer needs at least two slots")
+
+        if slot_size <= self.SLOT_HEADER.size:
+            raise RuntimeError("Slot size too small")
+
+        self._encoder = encoder
+        self._slots = slots
+        self._slot_size = slot_size
+        self._map = None
+        self._writable = False
+        self._head = 0
+        self._inode = None
+        self._next_stat = 0
+        self._heartbeat = ClientHeartbeat(filepath)
+
+    def _size(self):
+        return self.HEADER.size + self._slots * self._slot_size
+
+    def _slot_offset(self, index):
+        return self.HEADER.size + (index % self._slots) * self._slot_size
+
+    def _is_compatible(self):
+        with open(self._path, 'rb') as f:
+            magic, version, slots, slot_size, _ = self.HEADER.unpack(f.read(self.HEADER.size))
+        return magic == self.MAGIC and version == self.VERSION and slots == self._slots and \
+            slot_size == self._slot_size
+
+    def _open_writer(self):
+        created = create_mapping(self._path, self._size(), self._is_compatible)
+
+        fd = os.open(self._path, os.O_RDWR)
+        try:
+            self._map = mmap.mmap(fd, self._size(), mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+        if created:
+            self._write_field(self.HEADER, 0, self.MAGIC, self.VERSION, self._slots, self._slot_size, 0)
+
+        self._head = self._read_field(self.HEAD, self.HEAD_OFFSET)[0]
+        self._writable = True
+
+    def _open_reader(self):
+        if not os.path.exists(self._path):
+            raise RuntimeError("No data in shared memory found.")
+
+        fd = os.open(self._path, os.O_RDONLY)
+        try:
+            stat = os.fstat(fd)
+            size = stat.st_size
+            if size < self.HEADER.size:
+                raise RuntimeError("No data in shared memory found.")
+            self._map = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ)
+        finally:
+            os.close(fd)
+
+        self._inode = stat.st_ino
+        self._next_stat = time.time() + self.STAT_INTERVAL
+
+        magic, version, slots, slot_size, _ = self._read_field(self.HEADER, 0)
+
+        if not magic == self.MAGIC or not version == self.VERSION:
+            self.close()
+            raise RuntimeError("Shared memory has an unknown layout")
+
+        self._slots = slots
+        self._slot_size = slot_size
+
+    def _is_replaced(self):
+        now = time.time()
+        if now < self._next_stat:
+            return False
+        self._next_stat = now + self.STAT_INTERVAL
+
+        try:
+            return not os.stat(self._path).st_ino == self._inode
+        except OSError:
+            # no new file yet, the old mapping is still the best there is
+            return False
+
+    def close(self):
+        if not self._map is None:
+            self._map.close()
+            self._map = None
+            self._writable = False
+
+    def load(self):
+        """
+
+        :return: encoder.DataEncoder.Data
+        """
+        self._heartbeat.touch()
+
+        if not self._map is None and not self._writable and self._is_replaced():
+            self.close()
+
+        if self._map is None:
+            self._open_reader()
+
+        for _ in range(self.READ_RETRIES):
+            head = self._read_field(self.HEAD, self.HEAD_OFFSET)[0]
+            if head == 0:
+                raise RuntimeError("No data in shared memory found.")
+
+            offset = self._slot_offset(head - 1)
+            seq, length = self._read_field(self.SLOT_HEADER, offset)
+            start = offset + self.SLOT_HEADER.size
+            raw = self._map[start:start + min(length, self._slot_size - self.SLOT_HEADER.size)]
+
+            if seq % 2 == 0 and self._read_field(self.SEQ, offset)[0] == seq:
+                return self._encoder.decode(raw)
+
+        raise RuntimeError("Could not read a consistent sample from shared memory")
+
+    # unpack_from/pack_into access shared fields byte by byte, and pack_into even zeroes the field
+    # before packing, so a reader could see an even sequence with a zero length or a zero head.
+    # Fields are copied with a single slice instead.
+
+    def _read_field(self, field, offset):
+        return field.unpack(self._map[offset:offset + field.size])
+
+    def _write_field(self, field, offset, *values):
+        self._map[offset:offset + field.size] = field.pack(*values)
+
+    def has_clients(self):
+        return self._heartbeat.has_clients()
+
+    def save(self, data):
+        self._write(data)
+        self._write_field(self.HEAD, self.HEAD_OFFSET, self._head)
+        return True
+
+    def save_batch(self, samples):
+        for data in samples:
+            self._write(data)
+        self._write_field(self.HEAD, self.HEAD_OFFSET, self._head)
+        return True
+
+    def _write(self, data):
+        if not self._writable:
+            self._open_writer()
+
+        raw = self._encoder.encode(data)
+        if not isinstance(raw, bytes):
+            raw = raw.encode('utf-8')
+
+        if len(raw) > self._slot_size - self.SLOT_HEADER.size:
+            raise RuntimeError("Encoded data does not fit into a shared memory slot")
+
+        offset = self._slot_offset(self._head)
+        seq = self._read_field(self.SEQ, offset)[0]
+        # a writer that died while writing left the sequence odd
+        seq += seq % 2
+
+        # the length changes only while the sequence is odd
+        self._write_field(self.SEQ, offset, seq + 1)
+        self._write_field(self.SLOT_HEADER, offset, seq + 1, len(raw))
+        start = offset + self.SLOT_HEADER.size
+        self._map[start:start + len(raw)] = raw
+        self._write_field(self.SEQ, offset, seq + 2)
+
+        self._head += 1
@@ -0,0 +1,360 @@
+import os
+import selectors
+import socket
+import struct
+import threading
+
+from encoder.DataEncoder import DataEncoder
+from encoder.File import AbstractCommunication
+from encoder.delta import DeltaStreamEncoder, DeltaStreamDecoder
+
+
+FRAME = struct.Struct('<I')
+
+REQUEST_LATEST = b'G'
+REQUEST_STREAM = b'S'
+REQUEST_DELTA = b'D'
+
+
+def _create_socket(address):
+    if isinstance(address, tuple):
+        return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+
+def _check_encoder(encoder):
+    if not encoder is None and not isinstance(encoder, DataEncoder):
+        raise RuntimeError("Given encoder must be an instance of DataEncoder")
+
+    if encoder is None:
+        encoder = DataEncoder()
+
+    return encoder
+
+
+def _to_bytes(raw):
+    if not isinstance(raw, bytes):
+        raw = raw.encode('utf-8')
+    return raw
+
+
+class _Client(object):
+    def __init__(self, sock):
+        self.socket = sock
+        self.pending = b''
+        self.streaming = False
+        self.delta = False
+        self.events = selectors.EVENT_READ
+
+
+class SocketServer(AbstractCommunication):
+    """
+    Watchdog side of the socket transport. Serves the latest sample on a unix socket (address is
+    a path) or a TCP socket (address is a (host, port) tuple).
+
+    Clients send single byte requests: REQUEST_LATEST is answered with one frame holding the latest
+    sample, REQUEST_STREAM subscribes the client to a frame for every published sample. A frame is
+    the payload length followed by the encoded sample; a zero length means no data yet.
+    REQUEST_DELTA subscribes like REQUEST_STREAM, but the payloads are DeltaStreamEncoder frames,
+    starting with a keyframe.
+    """
+
+    BACKLOG = 128
+    RECV_SIZE = 4096
+    MAX_PENDING = 1 << 20
+
+    def __init__(self, address, encoder=None, delta_encoder=None):
+        if not delta_encoder is None and not isinstance(delta_encoder, DeltaStreamEncoder):
+            raise RuntimeError("Given delta encoder must be an instance of DeltaStreamEncoder")
+
+        if delta_encoder is None:
+            delta_encoder = DeltaStreamEncoder()
+
+        self._address = address
+        self._encoder = _check_encoder(encoder)
+        self._delta = delta_encoder
+        self._delta_clients = 0
+        self._lock = threading.Lock()
+        self._latest = FRAME.pack(0)
+        self._clients = {}
+        self._server = None
+        self._selector = None
+        self._thread = None
+        self._running = False
+        self._wakeup = None
+
+    def start(self):
+        if self._running:
+            return
+
+        if not isinstance(self._address, tuple) and os.path.exists(self._address):
+            os.unlink(self._address)
+
+        self._server = _create_socket(self._address)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(self._address)
+        self._server.listen(self.BACKLOG)
+        self._server.setblocking(False)
+
+        self._wakeup = socket.socketpair()
+        for sock in self._wakeup:
+            sock.setblocking(False)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ)
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def get_client_count(self):
+        return len(self._clients)
+
+    def has_clients(self):
+        return self.get_client_count() > 0
+
+    def load(self):
+        with self._lock:
+            latest = self._latest
+
+        if len(latest) == FRAME.size:
+            raise RuntimeError("No data found.")
+
+        return self._encoder.decode(latest[FRAME.size:])
+
+    def save(self, data):
+        self.start()
+
+        raw = _to_bytes(self._encoder.encode(data))
+        self._publish(FRAME.pack(len(raw)) + raw, None, [data])
+        return True
+
+    def save_batch(self, samples):
+        self.start()
+
+        frames = []
+        for data in samples:
+            raw = _to_bytes(self._encoder.encode(data))
+            frames.append(FRAME.pack(len(raw)) + raw)
+
+        self._publish(b''.join(frames), frames[-1], samples)
+        return True
+
+    def _publish(self, frames, latest, samples):
+        with self._lock:
+            self._latest = frames if latest is None else latest
+
+            # the delta state is shared by all delta clients, so it only advances while there are some
+            delta = b''
+            if self._delta_clients > 0:
+                encoded = [self._delta.encode(data) for data in samples]
+                delta = b''.join(FRAME.pack(len(raw)) + raw for raw in encoded)
+
+            for client in self._clients.values():
+                if client.delta:
+                    client.pending += delta
+                elif client.streaming:
+                    client.pending += frames
+
+        try:
+            self._wakeup[1].send(b'\x01')
+        except socket.error:
+            # a wake-up is already pending
+            pass
+
+    def _run(self):
+        while self._running:
+            for key, events in self._selector.select():
+                if key.fileobj is self._server:
+                    self._accept()
+                elif key.fileobj is self._wakeup[0]:
+                    self._drain_wakeup()
+                else:
+                    self._handle(key.data, events)
+
+            self._update_interest()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except socket.error:
+                return
+
+            sock.setblocking(False)
+            client = _Client(sock)
+            with self._lock:
+                self._clients[sock] = client
+            self._selector.register(sock, selectors.EVENT_READ, client)
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup[0].recv(self.RECV_SIZE):
+                pass
+        except socket.error:
+            pass
+
+    def _handle(self, client, events):
+        try:
+            if events & selectors.EVENT_READ:
+                requests = client.socket.recv(self.RECV_SIZE)
+                if len(requests) == 0:
+                    self._drop(client)
+                    return
+
+                with self._lock:
+                    for request in bytearray(requests):
+                        if request == ord(REQUEST_LATEST):
+                            client.pending += self._latest
+                        elif request == ord(REQUEST_STREAM):
+                            client.streaming = True
+                        elif request == ord(REQUEST_DELTA) and not client.delta:
+                            client.delta = True
+                            self._delta_clients += 1
+                            self._delta.request_keyframe()
+
+            if client.pending:
+                with self._lock:
+                    sent = client.socket.send(client.pending)
+                    client.pending = client.pending[sent:]
+        except socket.error:
+            self._drop(client)
+
+    def _update_interest(self):
+        with self._lock:
+            clients = list(self._clients.values())
+
+        for client in clients:
+            if len(client.pending) > self.MAX_PENDING:
+                # a streaming client that does not keep up is disconnected
+                self._drop(client)
+                continue
+
+            events = selectors.EVENT_READ
+            if client.pending:
+                events |= selectors.EVENT_WRITE
+
+            if not events == client.events:
+                client.events = events
+                self._selector.modify(client.socket, events, client)
+
+    def _drop(self, client):
+        with self._lock:
+            if self._clients.pop(client.socket, None) is None:
+                return
+
+            if client.delta:
+                self._delta_clients -= 1
+
+        self._selector.unregister(client.socket)
+        client.socket.close()
+
+    def close(self):
+        if not self._running:
+            return
+
+        self._running = False
+        self._wakeup[1].send(b'\x01')
+        self._thread.join()
+
+        for client in list(self._clients.values()):
+            self._drop(client)
+
+        self._selector.close()
+        self._server.close()
+        for sock in self._wakeup:
+            sock.close()
+
+        if not isinstance(self._address, tuple) and os.path.exists(self._address):
+            os.unlink(self._address)
+
+
+class SocketClient(AbstractCommunication):
+    """
+    Client side of the socket transport, see SocketServer.
+    """
+
+    def __init__(self, address, encoder=None, delta_decoder=None):
+        if not delta_decoder is None and not isinstance(delta_decoder, DeltaStreamDecoder):
+            raise RuntimeError("Given delta decoder must be an instance of DeltaStreamDecoder")
+
+        if delta_decoder is None:
+            delta_decoder = DeltaStreamDecoder()
+
+        self._address = address
+        self._encoder = _check_encoder(encoder)
+        self._delta = delta_decoder
+        self._socket = None
+        self._streaming = False
+
+    def _connect(self):
+        if not self._socket is None:
+            return
+
+        sock = _create_socket(self._address)
+        try:
+            sock.connect(self._address)
+        except socket.error as e:
+            sock.close()
+            raise RuntimeError("Could not connect to encoder server: {}".format(e))
+
+        self._socket = sock
+
+    def _receive(self, size):
+        chunks = []
+        while size > 0:
+            chunk = self._socket.recv(size)
+            if len(chunk) == 0:
+                self.close()
+                raise RuntimeError("Encoder server closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def _receive_frame(self, decoder=None):
+        length = FRAME.unpack(self._receive(FRAME.size))[0]
+        if length == 0:
+            raise RuntimeError("No data found.")
+
+        if decoder is None:
+            decoder = self._encoder
+        return decoder.decode(self._receive(length))
+
+    def load(self):
+        if self._streaming:
+            raise RuntimeError("Connection is in streaming mode")
+
+        self._connect()
+        try:
+            self._socket.sendall(REQUEST_LATEST)
+        except socket.error as e:
+            self.close()
+            raise RuntimeError("Could not request data from encoder server: {}".format(e))
+
+        return self._receive_frame()
+
+    def stream(self, delta=False):
+        """
+        Generator of every sample the watchdog publishes. The connection can only be used for
+        streaming afterwards.
+
+        :param delta: receive delta encoded frames, the samples are rebuilt by the DeltaStreamDecoder
+        """
+        self._connect()
+        self._socket.sendall(REQUEST_DELTA if delta else REQUEST_STREAM)
+        self._streaming = True
+
+        decoder = self._delta if delta else None
+        while not self._socket is None:
+            yield self._receive_frame(decoder)
+
+    def save(self, data):
+        raise RuntimeError("Clients cannot publish data")
+
+    def close(self):
+        if not self._socket is None:
+            self._socket.close()
+            self._socket = None
+        self._streaming = False
@@ -1,20 +1,72 @@
-from encoder.DataEncoder import Data, ErrorData
+import collections
+import time
+
+from encoder.DataEncoder import Sample, ErrorSample
 from encoder.File import AbstractCommunication
+from encoder.History import History
+from encoder.subscription import Notifier
+from encoder.scheduler import TickScheduler
+from encoder.recorder import Recorder
+from encoder.capture import TriggerTable
+from encoder.calibration_store import CalibrationStore
+from encoder.metrics import METRICS
 from e21_util.simultaneous import StoppableThread, StopException
-from encoder.heidenhain_encoder import EncoderFactory
+from encoder.heidenhain_encoder import EncoderFactory, HeidenhainEncoder
 
 class PositionWatchdog(StoppableThread):
-    def __init__(self, comm, encoder_factory):
+    # an unchanged error is published again only after this interval, well below
+    # EncoderInterface.PARAMETER_TIME_DIFF, so clients keep seeing the error instead of stale data
+    ERROR_REPUBLISH_INTERVAL = 0.25
+    MAX_DRAIN_TIME = 0.05
+    # without new entries for this long the device is asked for an error
+    HEALTH_CHECK_INTERVAL = 0.1
+
+    def __init__(self, comm, encoder_factory, history=None, batch_size=1, notifier=None, scheduler=None,
+                 recorder=None, trigger_table=None, calibration_store=None):
         super(PositionWatchdog, self).__init__()
 
         if not isinstance(comm, AbstractCommunication):
             raise RuntimeError("comm must be an instance of AbstractCommunication")
 
+        if not history is None and not isinstance(history, History):
+            raise RuntimeError("history must be an instance of History")
+
+        if not notifier is None and not isinstance(notifier, Notifier):
+            raise RuntimeError("notifier must be an instance of Notifier")
+
+        if not scheduler is None and not isinstance(scheduler, TickScheduler):
+            raise RuntimeError("scheduler must be an instance of TickScheduler")
+
+        if not recorder is None and not isinstance(recorder, Recorder):
+            raise RuntimeError("recorder must be an instance of Recorder")
+
+        if not trigger_table is None and not isinstance(trigger_table, TriggerTable):
+            raise RuntimeError("trigger_table must be an instance of TriggerTable")
+
+        if not calibration_store is None and not isinstance(calibration_store, CalibrationStore):
+            raise RuntimeError("calibration_store must be an instance of CalibrationStore")
+
+        if batch_size < 1:
+            raise RuntimeError("batch_size must be at least 1")
+
         if not isinstance(encoder_factory, EncoderFactory):
             raise RuntimeError("encoder_factory must be an instance of EncoderFactory")
 
         self._comm = comm
-        self._initialized = False
+        self._history = history
+        self._batch_size = batch_size
+        self._notifier = notifier
+        self._scheduler = scheduler
+        self._recorder = recorder
+        self._trigger_table = trigger_table
+        self._calibration_store = calibration_store
+        self._calibration_version = None
+        self._is_initialized = False
+        self._error_key = None
+        self._error_message = None
+        self._error_time = 0
+        self._messages = {}
+        self._health_check_at = 0
         self._fac = encoder_factory
         self._encoder = self._fac.get_encoder()
         self._z = self._fac.get_z()
@@ -29,46 +81,251 @@ class PositionWatchdog(StoppableThread):
     def get_theta(self):
         return self._theta
 
+    def get_history(self):
+        return self._history
+
+    def get_scheduler(self):
+        return self._scheduler
+
+    def get_trigger_table(self):
+        return self._trigger_table
+
     def initialize(self):
-        if self._initialized is True:
+        if self._is_initialized is True:
             return
 
         self._fac.initialize()
         self._encoder.clear_buffer()
+        self._is_initialized = True
 
     def _on_stop(self):
+        self.close()
+
+    def close(self):
+        """
+        Releases the device and all channels. Done when the thread stops; only needed for a
+        watchdog that has never been started.
+        """
         self._encoder.disconnect()
+        self._comm.close()
+
+        if not self._recorder is None:
+            self._recorder.stop()
+
+        if not self._notifier is None:
+            self._notifier.close()
 
     def do_execute(self):
         self.initialize()
 
+        if not self._scheduler is None:
+            self._scheduler.wait()
+
+        METRICS.tick()
+        self.tick()
+
+    def tick(self):
+        """
+        Reads the device once, without waiting for the scheduler, and drains everything it has
+        queued since the last tick, so the published sample is always the newest entry.
+
+        :return: the last published sample, None if nothing has been published
+        """
+        self._update_calibration()
+
         try:
-            self._encoder.read()
+            if not self._encoder.ensure_connected():
+                raise RuntimeError(HeidenhainEncoder.RECONNECTING)
 
-            data = Data({})
+            with self._encoder.lease():
+                if not self._encoder.read_next():
+                    # no new entry, the sample published last is still the latest one
+                    self._check_health()
+                    return None
 
-            self._set_theta(data)
-            self._set_z(data)
+                samples = self._drain()
 
-            self._comm.save(data)
+            if len(samples) == 1:
+                self._publish(samples[0])
+            else:
+                self._publish_batch(samples)
+            return samples[-1]
         except KeyboardInterrupt as e:
             raise e
         except StopException as e:
             raise e
         except BaseException as e:
-            self._comm.save(ErrorData({}, e))
+            self._publish_error(e)
+            return None
 
-    def _set_theta(self, data):
-        try:
-            data.set_position_theta(self._theta.get_angle())
-            data.set_trigger_count(self._theta.get_trigger())
-            data.set_reference_theta(self._theta.get_reference())
-        except RuntimeError as e:
-            data.add_exception(e)
+    def _update_calibration(self):
+        if self._calibration_store is None:
+            return
 
-    def _set_z(self, data):
         try:
-            data.set_position_z(self._z.get_position())
-            data.set_reference_z(self._z.get_reference())
-        except RuntimeError as e:
-            data.add_exception(e)
+            calibration = self._calibration_store.poll()
+        except KeyboardInterrupt as e:
+            raise e
+        except StopException as e:
+            raise e
+        except BaseException:
+            # keep the calibration in use until the store is readable again, a broken store
+            # must never stop the positions from being published
+            METRICS.count('calibration_errors')
+            return
+
+        if calibration is None:
+            return
+
+        # applied between two reads, so all samples of a tick share one calibration
+        self._theta.set_calibration(calibration.theta)
+        self._z.set_calibration(calibration.z)
+        self._calibration_version = calibration.version
+        METRICS.count('calibration_updates')
+
+    def get_calibration_version(self):
+        return self._calibration_version
+
+    def _publish_error(self, e):
+        METRICS.count('watchdog_errors')
+
+        now = time.time()
+        key = (type(e), e.args)
+
+        if key == self._error_key:
+            if now - self._error_time < self.ERROR_REPUBLISH_INTERVAL:
+                return
+        else:
+            self._error_key = key
+            self._error_message = str(e)
+
+        self._error_time = now
+        self._comm.save(ErrorSample(time=now, exception=self._error_message))
+
+        if not self._notifier is None:
+            self._notifier.notify()
+
+    def _combine(self, theta_exception, z_exception):
+        if z_exception is None:
+            return theta_exception
+
+        if theta_exception is None:
+            return z_exception
+
+        # the messages are constants, so the joined variants are built only once
+        key = (theta_exception, z_exception)
+        message = self._messages.get(key)
+        if message is None:
+            message = self._messages[key] = theta_exception + ";" + z_exception
+        return message
+
+    def _check_health(self):
+        # a device that stopped delivering entries may report why, repeated errors drop the connection
+        now = time.time()
+        if now < self._health_check_at:
+            return
+        self._health_check_at = now + self.HEALTH_CHECK_INTERVAL
+
+        if not self._encoder.check_health():
+            raise RuntimeError(HeidenhainEncoder.DEVICE_ERROR)
+
+    def _read_more(self, deadline):
+        if time.time() < deadline:
+            return self._encoder.read_next()
+
+        # the device produces faster than it can be read, drop the backlog instead of falling behind
+        self._encoder.clear_buffer()
+        return False
+
+    def _drain(self):
+        # history, recorder and trigger table want every entry, the channel only the last batch_size
+        now = time.time()
+        deadline = now + self.MAX_DRAIN_TIME
+        self._health_check_at = now + self.HEALTH_CHECK_INTERVAL
+
+        if self._history is None and self._recorder is None and self._trigger_table is None:
+            if self._batch_size == 1:
+                while self._read_more(deadline):
+                    pass
+                return [self._read_sample()]
+
+            samples = collections.deque([self._read_sample()], self._batch_size)
+        else:
+            samples = [self._read_sample()]
+
+        while self._read_more(deadline):
+            samples.append(self._read_sample())
+        return list(samples)
+
+    def _read_sample(self):
+        theta, trigger, theta_ref, t, theta_exception = self._theta.snapshot()
+        z, z_ref, z_exception = self._z.snapshot()
+
+        return Sample(trigger, theta, theta_ref, z, z_ref, t, self._combine(theta_exception, z_exception),
+                      False,
+                      Sample.STATUS_OK if theta_exception is None else Sample.STATUS_NO_REFERENCE,
+                      Sample.STATUS_OK if z_exception is None else Sample.STATUS_NO_REFERENCE,
+                      self._calibration_version)
+
+    def _publish(self, data):
+        self._error_key = None
+
+        with METRICS.timer('publish_seconds'):
+            self._comm.save(data)
+        METRICS.count('samples_published')
+
+        if not self._history is None:
+            self._history.append(data)
+
+        if not self._recorder is None:
+            self._recorder.record(data)
+
+        if not self._trigger_table is None:
+            self._trigger_table.capture(data)
+
+        if not self._notifier is None:
+            self._notifier.notify()
+
+        self._update_scheduler(data)
+
+    def _publish_batch(self, samples):
+        """
+        Publishes the last batch_size samples, all of them go to history, recorder and trigger table.
+        """
+        self._error_key = None
+        published = samples[-self._batch_size:]
+
+        with METRICS.timer('publish_seconds'):
+            if len(published) == 1:
+                self._comm.save(published[0])
+            else:
+                self._comm.save_batch(published)
+        METRICS.count('samples_published', len(published))
+
+        if not self._history is None:
+            self._history.extend(samples)
+
+        if not self._recorder is None:
+            self._recorder.record_batch(samples)
+
+        if not self._trigger_table is None:
+            self._trigger_table.capture_batch(samples)
+
+        if not self._notifier is None:
+            self._notifier.notify(len(published))
+
+        self._update_scheduler(samples[-1])
+
+    def is_idle(self):
+        """
+        :return: True if neither a subscriber nor a client is reading the published data
+        """
+        subscribed = not self._notifier is None and self._notifier.has_subscribers()
+        return not subscribed and not self._comm.has_clients()
+
+    def _update_scheduler(self, data):
+        if self._scheduler is None:
+            return
+
+        self._scheduler.set_idle(self.is_idle())
+        self._scheduler.update_position(data.theta, data.z)
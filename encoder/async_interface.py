@@ -0,0 +1,136 @@
+import asyncio
+import functools
+
+from encoder.interface import EncoderInterface
+
+
+class AsyncEncoderInterface(object):
+    """
+    asyncio counterpart of EncoderInterface. Samples are loaded in an executor so the event
+    loop never blocks on the file lock, and waiting for new samples uses the watchdog's
+    notifier socket instead of polling.
+
+    It wraps an EncoderInterface instead of extending it, so none of the blocking methods is
+    reachable from a coroutine by accident.
+    """
+
+    RECV_SIZE = 4096
+
+    def __init__(self, comm, history=None, notify_path=None, executor=None, theta_predictor=None, z_predictor=None,
+                 trigger_table=None):
+        self._interface = EncoderInterface(comm, history, notify_path, theta_predictor, z_predictor, trigger_table)
+        self._notify_path = notify_path
+        self._executor = executor
+        self._reader = None
+        self._writer = None
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args))
+
+    async def load(self):
+        return await self._run(self._interface.get_data)
+
+    async def get_data(self):
+        return await self.load()
+
+    async def get_angle(self, at=None):
+        data = await self.load()
+
+        if at is None:
+            return self._interface._angle(data)
+
+        return self._interface._estimate(self._interface._theta_predictor, self._interface._angle, data, at)
+
+    async def get_z(self, at=None):
+        data = await self.load()
+
+        if at is None:
+            return self._interface._z(data)
+
+        return self._interface._estimate(self._interface._z_predictor, self._interface._z, data, at)
+
+    def check_theta(self, data):
+        return self._interface.check_theta(data)
+
+    def check_z(self, data):
+        return self._interface.check_z(data)
+
+    async def try_get_angle(self):
+        """
+        :return: (status, angle), the angle is None unless status is Sample.STATUS_OK
+        """
+        return await self._run(self._interface.try_get_angle)
+
+    async def try_get_z(self):
+        """
+        :return: (status, z), z is None unless status is Sample.STATUS_OK
+        """
+        return await self._run(self._interface.try_get_z)
+
+    async def get_history(self, since=None):
+        return await self._run(self._interface.get_history, since)
+
+    async def get_range(self, t0, t1):
+        return await self._run(self._interface.get_range, t0, t1)
+
+    async def get_angle_at(self, t):
+        return await self._run(self._interface.get_angle_at, t)
+
+    async def get_z_at(self, t):
+        return await self._run(self._interface.get_z_at, t)
+
+    async def get_trigger_position(self, trigger):
+        return await self._run(self._interface.get_trigger_position, trigger)
+
+    async def get_trigger_range(self, first, last):
+        return await self._run(self._interface.get_trigger_range, first, last)
+
+    async def _connect(self):
+        if not self._reader is None:
+            return
+
+        if self._notify_path is None:
+            raise RuntimeError("No notification channel available")
+
+        self._reader, self._writer = await asyncio.open_unix_connection(self._notify_path)
+
+    async def wait_for_sample(self):
+        await self._connect()
+
+        if len(await self._reader.read(self.RECV_SIZE)) == 0:
+            await self.close()
+            raise RuntimeError("Encoder notifier closed the connection")
+
+        return await self.load()
+
+    async def _wait_until(self, getter, target, tol):
+        # connect first, so that no sample published during the first check is missed
+        await self._connect()
+
+        while True:
+            value = await getter()
+            if abs(value - target) <= tol:
+                return value
+
+            if len(await self._reader.read(self.RECV_SIZE)) == 0:
+                await self.close()
+                raise RuntimeError("Encoder notifier closed the connection")
+
+    async def wait_until_angle(self, target, tol, timeout=None):
+        try:
+            return await asyncio.wait_for(self._wait_until(self.get_angle, target, tol), timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError("Timeout while waiting for theta to reach {}".format(target))
+
+    async def wait_until_z(self, target, tol, timeout=None):
+        try:
+            return await asyncio.wait_for(self._wait_until(self.get_z, target, tol), timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError("Timeout while waiting for z to reach {}".format(target))
+
+    async def close(self):
+        if not self._writer is None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
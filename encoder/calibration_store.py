@@ -0,0 +1,126 @@
+import fcntl
+import json
+import math
+import numbers
+import os
+import time
+
+from collections import namedtuple
+
+import encoder.calibration
+from encoder.File import write_atomic
+
+
+Calibration = namedtuple('Calibration', ['version', 'theta', 'z'])
+
+
+class CalibrationStore(object):
+    """
+    Versioned calibration offsets in a small JSON file. Every commit() increments the version and
+    replaces the file atomically, so readers see either the old or the new calibration.
+
+    Without a file the defaults of encoder.calibration apply as version 0.
+    """
+
+    KEY_VERSION = 'version'
+    KEY_THETA = 'theta'
+    KEY_Z = 'z'
+    KEY_TIME = 'time'
+
+    CHECK_INTERVAL = 0.1
+
+    def __init__(self, filepath, check_interval=CHECK_INTERVAL):
+        self._path = filepath
+        self._check_interval = check_interval
+        self._stat = None
+        self._calibration = None
+        self._polled = None
+        self._next_check = 0
+
+    def get_path(self):
+        return self._path
+
+    def _file_key(self):
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime
+
+    def _read(self):
+        try:
+            with open(self._path, 'r') as f:
+                d = json.load(f)
+        except (IOError, OSError):
+            return Calibration(0, encoder.calibration.THETA_CALIBRATION, encoder.calibration.Z_CALIBRATION)
+        except ValueError:
+            raise RuntimeError("Could not read calibration values")
+
+        return self._parse(d)
+
+    def _parse(self, d):
+        if not isinstance(d, dict):
+            raise RuntimeError("Calibration file does not hold an object")
+
+        version = d.get(self.KEY_VERSION)
+        if isinstance(version, bool) or not isinstance(version, numbers.Integral) or version < 0:
+            raise RuntimeError("Invalid calibration version {!r}".format(version))
+
+        values = []
+        for key in [self.KEY_THETA, self.KEY_Z]:
+            value = d.get(key)
+            valid = not isinstance(value, bool) and isinstance(value, numbers.Real)
+            if not valid or math.isinf(value) or math.isnan(value):
+                raise RuntimeError("Invalid calibration value {!r} for '{}'".format(value, key))
+            values.append(float(value))
+
+        return Calibration(int(version), values[0], values[1])
+
+    def get(self):
+        """
+        :return: the current Calibration, the file is only read again after it changed
+        """
+        key = self._file_key()
+        if self._calibration is None or not key == self._stat:
+            self._calibration = self._read()
+            self._stat = key
+        return self._calibration
+
+    def poll(self):
+        """
+        Cheap change check for the watchdog loop, looks at the file at most every check_interval seconds.
+
+        :return: the new Calibration if it changed since the last call, otherwise None
+        """
+        now = time.time()
+        if now < self._next_check:
+            return None
+        self._next_check = now + self._check_interval
+
+        calibration = self.get()
+        if calibration == self._polled:
+            return None
+
+        self._polled = calibration
+        return calibration
+
+    def commit(self, theta=None, z=None):
+        """
+        Stores new offsets, an axis that is not given keeps its value.
+
+        :return: the committed Calibration
+        """
+        with open(self._path + '.lock', 'a') as lock:
+            # serialises concurrent commits, so no version is handed out twice
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            current = self._read()
+            calibration = Calibration(current.version + 1,
+                                      current.theta if theta is None else float(theta),
+                                      current.z if z is None else float(z))
+
+            write_atomic(self._path, json.dumps({self.KEY_VERSION: calibration.version,
+                                                 self.KEY_THETA: calibration.theta,
+                                                 self.KEY_Z: calibration.z, self.KEY_TIME: time.time()}))
+
+        return calibration
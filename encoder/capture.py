@@ -0,0 +1,188 @@
+import os
+import numpy
+
+from encoder.DataEncoder import Data, Sample
+from encoder.File import create_mapping
+
+
+class TriggerTable(object):
+    """
+    Position of every captured detector trigger, indexed by trigger count modulo `capacity`.
+
+    The watchdog stores the first sample showing a new trigger count, for every entry it drains
+    from the device, so triggers are not lost when clients poll slower than the trigger rate.
+    With a filepath the table is a memory-mapped file like History. A slot is invalidated before
+    it is rewritten and every record carries its trigger count, so readers never return a position
+    of another trigger; a trigger overwritten by one `capacity` triggers later is reported as
+    not captured.
+
+    Triggers are captured whether the axes are referenced or not; the status of both axes is
+    recorded with the position, which is NaN unless the status is Sample.STATUS_OK.
+    """
+
+    MAGIC = 0x47495254
+    VERSION = 2
+
+    HEADER = numpy.dtype([('magic', '<u4'), ('version', '<u4'), ('capacity', '<i8'), ('last', '<i8'),
+                          ('count', '<i8')])
+    DTYPE = numpy.dtype([('trigger', '<i8'), ('time', '<f8'), ('theta', '<f8'), ('z', '<f8'),
+                         ('theta_status', '<u1'), ('z_status', '<u1')])
+
+    NO_TRIGGER = -1
+    DEFAULT_CAPACITY = 1 << 16
+
+    def __init__(self, filepath=None, capacity=DEFAULT_CAPACITY, writable=True):
+        if capacity < 1:
+            raise RuntimeError("Trigger table capacity must be positive")
+
+        self._path = filepath
+        self._capacity = capacity
+        self._writable = writable
+        self._header = None
+        self._records = None
+
+        if filepath is None:
+            self._header = numpy.zeros(1, dtype=self.HEADER)[0]
+            self._header['capacity'] = capacity
+            self._header['last'] = self.NO_TRIGGER
+            self._records = numpy.zeros(capacity, dtype=self.DTYPE)
+            self._records['trigger'] = self.NO_TRIGGER
+
+    def _open(self):
+        if not self._records is None:
+            return
+
+        if self._writable:
+            size = self.HEADER.itemsize + self._capacity * self.DTYPE.itemsize
+            create_mapping(self._path, size, self._is_compatible)
+
+            # trigger counts of a previous run mean nothing now, a reused table is emptied in place
+            records = numpy.memmap(self._path, dtype=self.DTYPE, mode='r+',
+                                   offset=self.HEADER.itemsize, shape=(self._capacity,))
+            records['trigger'] = self.NO_TRIGGER
+
+            # readers accept the table only once the slots are initialized
+            header = numpy.memmap(self._path, dtype=self.HEADER, mode='r+', shape=(1,))
+            header['capacity'] = self._capacity
+            header['last'] = self.NO_TRIGGER
+            header['count'] = 0
+            header['version'] = self.VERSION
+            header['magic'] = self.MAGIC
+            self._header = header[0]
+            self._records = records
+            return
+
+        if not os.path.exists(self._path) or os.path.getsize(self._path) < self.HEADER.itemsize:
+            raise RuntimeError("No trigger table found.")
+
+        header = numpy.memmap(self._path, dtype=self.HEADER, mode='r', shape=(1,))[0]
+        if not header['magic'] == self.MAGIC or not header['version'] == self.VERSION:
+            raise RuntimeError("Trigger table has an unknown layout")
+
+        self._header = header
+        self._capacity = int(header['capacity'])
+        self._records = numpy.memmap(self._path, dtype=self.DTYPE, mode='r',
+                                     offset=self.HEADER.itemsize, shape=(self._capacity,))
+
+    def _is_compatible(self):
+        header = numpy.memmap(self._path, dtype=self.HEADER, mode='r', shape=(1,))[0]
+        return (header['magic'] == self.MAGIC and header['version'] == self.VERSION and
+                header['capacity'] == self._capacity)
+
+    def get_capacity(self):
+        return self._capacity
+
+    def get_count(self):
+        """
+        :return: number of triggers captured so far
+        """
+        self._open()
+        return int(self._header['count'])
+
+    def get_last_trigger(self):
+        """
+        :return: the latest captured trigger count, NO_TRIGGER if none
+        """
+        self._open()
+        return int(self._header['last'])
+
+    def capture(self, data):
+        """
+        Stores data if it shows a trigger count different from the last captured one.
+
+        :return: True if a trigger has been captured
+        """
+        if not self._writable:
+            raise RuntimeError("Trigger table is read-only")
+
+        if isinstance(data, Data):
+            data = Sample.from_dict(data.get_dict())
+
+        if data.trigger is None:
+            return False
+
+        self._open()
+
+        if data.trigger == self._header['last']:
+            return False
+
+        record = self._records[data.trigger % self._capacity]
+        record['trigger'] = self.NO_TRIGGER
+        record['time'] = data.time
+        record['theta'] = numpy.nan if data.theta is None else data.theta
+        record['z'] = numpy.nan if data.z is None else data.z
+        record['theta_status'] = data.get_status_theta()
+        record['z_status'] = data.get_status_z()
+        record['trigger'] = data.trigger
+
+        self._header['last'] = data.trigger
+        self._header['count'] += 1
+        return True
+
+    def capture_batch(self, samples):
+        for data in samples:
+            self.capture(data)
+
+    def get(self, trigger):
+        """
+        :return: record (trigger, time, theta, z, theta_status, z_status) of the given trigger count
+        """
+        self._open()
+
+        slot = trigger % self._capacity
+        record = self._records[slot].copy()
+
+        # the slot may have been rewritten while it was copied
+        if not record['trigger'] == trigger or not self._records[slot]['trigger'] == trigger:
+            raise RuntimeError("Trigger {} has not been captured".format(trigger))
+
+        return record
+
+    def get_range(self, first, last):
+        """
+        :return: structured array (trigger, time, theta, z, theta_status, z_status) of the captured triggers
+                 first <= trigger <= last,
+                 triggers that have not been captured are left out
+        """
+        self._open()
+
+        if last - first + 1 > self._capacity:
+            first = last - self._capacity + 1
+
+        if last < first:
+            return numpy.zeros(0, dtype=self.DTYPE)
+
+        start = first % self._capacity
+        stop = start + last - first + 1
+
+        if stop <= self._capacity:
+            records = self._records[start:stop].copy()
+            live = self._records['trigger'][start:stop]
+        else:
+            records = numpy.concatenate([self._records[start:], self._records[:stop - self._capacity]])
+            live = numpy.concatenate([self._records['trigger'][start:],
+                                      self._records['trigger'][:stop - self._capacity]])
+
+        # as in get(), a slot rewritten while it was copied no longer holds the copied trigger
+        valid = (records['trigger'] == numpy.arange(first, last + 1)) & (live == records['trigger'])
+        return records[valid]
@@ -0,0 +1,83 @@
+import numpy
+
+import encoder.parameters
+
+
+class LinearConversion(object):
+    """
+    Vectorized counterpart of the driver's computeDegree/computePosition followed by the
+    calibration offset: value = counts * scale + offset - calibration.
+    """
+
+    PROBE = 1 << 20
+    LINEARITY_TOL = 1e-9
+
+    def __init__(self, scale, offset=0.0, calibration=0.0):
+        self._scale = float(scale)
+        self._offset = float(offset)
+        self._calibration = float(calibration)
+
+    @classmethod
+    def from_function(cls, compute, calibration=0.0):
+        """
+        Derives scale and offset by probing a scalar conversion function, which has to be linear.
+        """
+        offset = compute(0)
+        scale = (compute(cls.PROBE) - offset) / float(cls.PROBE)
+
+        expected = offset + 2 * cls.PROBE * scale
+        if abs(compute(2 * cls.PROBE) - expected) > cls.LINEARITY_TOL * max(1.0, abs(expected)):
+            raise RuntimeError("Conversion function is not linear")
+
+        return cls(scale, offset, calibration)
+
+    def get_scale(self):
+        return self._scale
+
+    def get_offset(self):
+        return self._offset
+
+    def get_calibration(self):
+        return self._calibration
+
+    def with_calibration(self, calibration):
+        return self.__class__(self._scale, self._offset, calibration)
+
+    def convert(self, counts):
+        """
+        :return: float64 array of calibrated values
+        """
+        return numpy.asarray(counts, dtype=numpy.float64) * self._scale + (self._offset - self._calibration)
+
+    def calibrate(self, values):
+        """
+        Applies only the calibration to values the driver has converted already.
+
+        :return: float64 array of calibrated values, NaN where a value is None
+        """
+        values = numpy.array([numpy.nan if v is None else v for v in values], dtype=numpy.float64)
+        return values - self._calibration
+
+    def convert_references(self, ref1, ref2):
+        """
+        :return: array of shape (n, 2) with the calibrated reference pairs
+        """
+        return numpy.column_stack((self.convert(ref1), self.convert(ref2)))
+
+
+class ThetaConversion(LinearConversion):
+    def check_references(self, references, angle_diff=encoder.parameters.ANGLE_DIFF,
+                         tol=encoder.parameters.ANGLE_TOL):
+        """
+        Vectorized reference spacing check of EncoderInterface._check_reference_theta.
+
+        :param references: array of shape (n, 2), see convert_references
+        :return: boolean array, True where the reference pair is valid
+        """
+        references = numpy.asarray(references, dtype=numpy.float64)
+        diff = numpy.abs(references[:, 0] - references[:, 1])
+        return numpy.abs(diff - angle_diff) <= tol
+
+
+class ZConversion(LinearConversion):
+    pass
@@ -0,0 +1,186 @@
+import time
+
+from encoder.DataEncoder import Sample, ErrorSample, BinaryDataEncoder
+from encoder.metrics import METRICS
+
+
+KEYFRAME = 0x4B
+DELTA = 0x44
+
+
+def _zigzag(value):
+    return (value << 1) if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value):
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+
+def write_varint(out, value):
+    value = _zigzag(value)
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    """
+    :return: (value, offset after the varint)
+    """
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return _unzigzag(result), offset
+        shift += 7
+
+
+class _State(object):
+    """
+    What the decoder knows: the last keyframe and the positions rebuilt since then.
+    """
+
+    def __init__(self, sample):
+        self.sample = sample
+        self.time_us = int(round(sample.time * 1e6))
+        self.trigger = sample.trigger
+        self.theta = sample.theta
+        self.z = sample.z
+
+
+def _shape(sample):
+    # everything a delta frame does not carry
+    return (sample.trigger is None, sample.theta is None, sample.z is None,
+            None if sample.theta_ref is None else tuple(sample.theta_ref),
+            None if sample.z_ref is None else tuple(sample.z_ref),
+            sample.exception, sample.error, sample.theta_status, sample.z_status, sample.calibration)
+
+
+class DeltaStreamEncoder(object):
+    """
+    Stateful encoder for a stream of samples. A keyframe holds the full BinaryDataEncoder record;
+    the following samples are sent as delta frames with only the changes of time (microseconds),
+    trigger and positions (multiples of `quantum`) as zigzag varints. A keyframe is sent whenever
+    anything else changes (references, exception, status, calibration) and at least every
+    `keyframe_interval` samples, so a consumer can resynchronise.
+
+    Positions are rebuilt by the decoder with an error of at most quantum / 2, deltas are taken
+    against the rebuilt values so the error does not accumulate.
+
+    The codec trades CPU for bandwidth: frames are about a tenth of a binary record, but decoding
+    them is slower than BinaryDataEncoder.decode (see benchmarks/delta_stream.py). Use it where the
+    link, not the consumer, is the limit.
+    """
+
+    def __init__(self, quantum=1e-7, keyframe_interval=1000):
+        if quantum <= 0:
+            raise RuntimeError("quantum must be positive")
+
+        if keyframe_interval < 1:
+            raise RuntimeError("keyframe_interval must be at least 1")
+
+        self._quantum = quantum
+        self._keyframe_interval = keyframe_interval
+        self._binary = BinaryDataEncoder()
+        self._state = None
+        self._shape = None
+        self._since_keyframe = 0
+
+    def request_keyframe(self):
+        self._state = None
+
+    def encode(self, sample):
+        if not isinstance(sample, Sample):
+            sample = Sample.from_dict(sample.get_dict())
+
+        if sample.time is None:
+            sample = sample._replace(time=time.time())
+
+        shape = _shape(sample)
+        if self._state is None or not shape == self._shape or self._since_keyframe >= self._keyframe_interval:
+            return self._keyframe(sample, shape)
+
+        state = self._state
+        out = bytearray([DELTA])
+
+        time_us = int(round(sample.time * 1e6))
+        write_varint(out, time_us - state.time_us)
+        state.time_us = time_us
+
+        if not sample.trigger is None:
+            write_varint(out, sample.trigger - state.trigger)
+            state.trigger = sample.trigger
+
+        if not sample.theta is None:
+            delta = int(round((sample.theta - state.theta) / self._quantum))
+            write_varint(out, delta)
+            state.theta += delta * self._quantum
+
+        if not sample.z is None:
+            delta = int(round((sample.z - state.z) / self._quantum))
+            write_varint(out, delta)
+            state.z += delta * self._quantum
+
+        self._since_keyframe += 1
+        return bytes(out)
+
+    def _keyframe(self, sample, shape):
+        raw = self._binary.encode(sample)
+        # the decoder starts from the decoded record, so must the encoder
+        self._state = _State(self._binary.decode(raw))
+        self._shape = shape
+        self._since_keyframe = 0
+        METRICS.count('delta_keyframes')
+        return bytes(bytearray([KEYFRAME])) + raw
+
+
+class DeltaStreamDecoder(object):
+    """
+    Rebuilds full samples from the frames of a DeltaStreamEncoder. Frames that cannot be decoded,
+    including delta frames before the first keyframe, yield an ErrorSample.
+    """
+
+    def __init__(self, quantum=1e-7):
+        self._quantum = quantum
+        self._binary = BinaryDataEncoder()
+        self._state = None
+
+    def decode(self, frame):
+        try:
+            frame = bytearray(frame)
+
+            if frame[0] == KEYFRAME:
+                sample = self._binary.decode(bytes(frame[1:]))
+                # an undecodable keyframe comes back as ErrorSample without time
+                self._state = None if sample.time is None else _State(sample)
+                return sample
+
+            if not frame[0] == DELTA or self._state is None:
+                raise RuntimeError("Delta frame without keyframe")
+
+            state = self._state
+            key = state.sample
+
+            delta, offset = read_varint(frame, 1)
+            state.time_us += delta
+
+            if not key.trigger is None:
+                delta, offset = read_varint(frame, offset)
+                state.trigger += delta
+
+            if not key.theta is None:
+                delta, offset = read_varint(frame, offset)
+                state.theta += delta * self._quantum
+
+            if not key.z is None:
+                delta, offset = read_varint(frame, offset)
+                state.z += delta * self._quantum
+
+            return key._replace(trigger=state.trigger, theta=state.theta, z=state.z, time=state.time_us / 1e6)
+        except:
+            self._state = None
+            return ErrorSample()
@@ -1,25 +1,122 @@
 from encoder.interface import EncoderInterface
-from encoder.Watchdog import PositionWatchdog
 from encoder.File import File, AbstractCommunication
-from encoder.heidenhain_encoder import EncoderFactory
+from encoder.SharedMemory import SharedMemory
+from encoder.Socket import SocketServer, SocketClient
+from encoder.subscription import Notifier
 from e21_util.paths import Paths
 
+# The watchdog side (watchdogs, device drivers, numpy based history and trigger table) is imported
+# on first use, so client processes neither pay for nor need it.
+
+
+def get_device_path(name=None):
+    if name is None:
+        return Paths().ENCODER_PATH
+    return Paths().ENCODER_PATH + '.' + name
+
 
 class Factory(object):
-    def __init__(self, encoder_factory=None):
-        if not isinstance(encoder_factory, EncoderFactory):
-            encoder_factory = EncoderFactory()
+    COMMUNICATION_FILE = 'file'
+    COMMUNICATION_SHARED_MEMORY = 'shm'
+    COMMUNICATION_SOCKET = 'socket'
+
+    def __init__(self, encoder_factory=None, communication=COMMUNICATION_FILE, name=None):
+        """
+        :param name: device name, namespaces all paths as ENCODER_PATH.<name> when several devices are served
+        """
+        if communication not in [self.COMMUNICATION_FILE, self.COMMUNICATION_SHARED_MEMORY,
+                                 self.COMMUNICATION_SOCKET]:
+            raise RuntimeError("Unknown communication type '{}'".format(communication))
 
         self._fac = encoder_factory
+        self._communication = communication
+        self._name = name
 
     def get_encoder_factory(self):
+        from encoder.heidenhain_encoder import EncoderFactory
+
+        if not isinstance(self._fac, EncoderFactory):
+            self._fac = EncoderFactory()
+
         return self._fac
 
-    def get_communication(self):
-        return File(Paths().ENCODER_PATH)
+    def get_name(self):
+        return self._name
+
+    def get_path(self):
+        return get_device_path(self._name)
+
+    def get_communication(self, communication=None, server=False):
+        """
+        :param server: return the publishing side, only relevant for transports with distinct sides
+        """
+        if communication is None:
+            communication = self._communication
+
+        if communication == self.COMMUNICATION_SOCKET:
+            if server:
+                return SocketServer(self.get_path() + '.sock')
+            return SocketClient(self.get_path() + '.sock')
+
+        if communication == self.COMMUNICATION_SHARED_MEMORY:
+            return SharedMemory(self.get_path() + '.shm')
+
+        if communication == self.COMMUNICATION_FILE:
+            return File(self.get_path())
+
+        raise RuntimeError("Unknown communication type '{}'".format(communication))
+
+    def get_history_path(self):
+        return self.get_path() + '.history'
+
+    def get_history(self, writable=False):
+        from encoder.History import History
+
+        return History(self.get_history_path(), writable=writable)
+
+    def get_trigger_table_path(self):
+        return self.get_path() + '.triggers'
+
+    def get_trigger_table(self, writable=False):
+        from encoder.capture import TriggerTable
 
-    def get_watchdog(self):
-        return PositionWatchdog(self.get_communication(), self._fac)
+        return TriggerTable(self.get_trigger_table_path(), writable=writable)
+
+    def get_calibration_store(self):
+        from encoder.calibration_store import CalibrationStore
+
+        return CalibrationStore(self.get_path() + '.calibration')
+
+    def get_notify_path(self):
+        return self.get_path() + '.notify'
+
+    def get_watchdog(self, batch_size=1, scheduler=None, capture=False):
+        """
+        :param capture: record the position of every trigger in the trigger table
+        """
+        from encoder.Watchdog import PositionWatchdog
+
+        trigger_table = self.get_trigger_table(writable=True) if capture else None
+        return PositionWatchdog(self.get_communication(server=True), self.get_encoder_factory(),
+                                self.get_history(writable=True), batch_size, Notifier(self.get_notify_path()),
+                                scheduler, trigger_table=trigger_table,
+                                calibration_store=self.get_calibration_store())
+
+    def get_pipelined_watchdog(self, batch_size=256, scheduler=None, queue_size=10000,
+                               drop_policy=None, capture=False):
+        """
+        :param drop_policy: PipelinedWatchdog.DROP_OLDEST (default) or PipelinedWatchdog.DROP_NEWEST
+        """
+        from encoder.pipeline import PipelinedWatchdog
+
+        if drop_policy is None:
+            drop_policy = PipelinedWatchdog.DROP_OLDEST
+
+        trigger_table = self.get_trigger_table(writable=True) if capture else None
+        return PipelinedWatchdog(self.get_communication(server=True), self.get_encoder_factory(), queue_size,
+                                 drop_policy, history=self.get_history(writable=True), batch_size=batch_size,
+                                 notifier=Notifier(self.get_notify_path()), scheduler=scheduler,
+                                 trigger_table=trigger_table, calibration_store=self.get_calibration_store())
 
     def get_interface(self, comm=None):
         if not isinstance(comm, AbstractCommunication) and not comm is None:
@@ -28,4 +125,18 @@ class Factory(object):
         if comm is None:
             comm = self.get_communication()
 
-        return EncoderInterface(comm)
+        # the paths are mapped on first use, so reading positions does not import numpy
+        return EncoderInterface(comm, self.get_history_path(), self.get_notify_path(),
+                                trigger_table=self.get_trigger_table_path())
+
+    def get_async_interface(self, comm=None):
+        from encoder.async_interface import AsyncEncoderInterface
+
+        if not isinstance(comm, AbstractCommunication) and not comm is None:
+            raise RuntimeError("Given communication is not an instance of AbstractCommunication")
+
+        if comm is None:
+            comm = self.get_communication()
+
+        return AsyncEncoderInterface(comm, self.get_history_path(), self.get_notify_path(),
+                                     trigger_table=self.get_trigger_table_path())
@@ -1,21 +1,41 @@
-import heidenhain
+import contextlib
+import importlib
+import random
+import threading
+import time
+
 import encoder.calibration
+from encoder.metrics import METRICS
+from encoder.conversion import ThetaConversion, ZConversion
 from e21_util.lock import HEIDENHAIN_LOCK
 
 
 class EncoderFactory(object):
-    def __init__(self):
+    def __init__(self, device_factory=None, lock=None):
+        """
+        :param device_factory: callable returning the driver object, defaults to heidenhain.get_encoder
+        :param lock: lock guarding exclusive device access, defaults to HEIDENHAIN_LOCK
+        """
+        self._device_factory = device_factory
+        self._lock = lock
+
         # Lazy init
         self._encoder = None
         self._z = None
         self._theta = None
 
+    def get_lock(self):
+        """
+        :return: the lock given, None if HEIDENHAIN_LOCK is used
+        """
+        return self._lock
+
     def initialize(self):
         self.get_encoder().connect()
 
     def get_encoder(self):
         if self._encoder is None:
-            self._encoder is HeidenhainEncoder()
+            self._encoder = HeidenhainEncoder(self._device_factory, self._lock)
 
         return self._encoder
 
@@ -30,17 +50,89 @@ class EncoderFactory(object):
         return self._theta
 
 
+class DeviceClock(object):
+    """
+    Maps device timestamps onto host time. The offset between both clocks is the smallest
+    difference between host read time and device timestamp seen so far, i.e. that of the entry
+    read with the least delay, so entries that waited in the device buffer keep their own time.
+    The offset may rise by MAX_DRIFT per second to follow a drift between both clocks.
+    """
+
+    MAX_DRIFT = 1e-4
+    # the device timestamps restarted if they go back by more than this
+    RESTART = 1.0
+
+    def __init__(self, resolution):
+        self._resolution = resolution
+        self._offset = None
+        self._last = None
+
+    def reset(self):
+        self._offset = None
+        self._last = None
+
+    def to_host(self, timestamp, read_time):
+        device = timestamp * self._resolution
+        offset = read_time - device
+
+        if self._offset is None or device < self._last - self.RESTART:
+            self._offset = offset
+        else:
+            self._offset = min(offset, self._offset + (device - self._last) * self.MAX_DRIFT)
+
+        self._last = device
+        return device + self._offset
+
+
 class HeidenhainEncoder(object):
-    def __init__(self):
+    """
+    A connection that failed MAX_READ_FAILURES reads or health checks in a row is dropped.
+    ensure_connected() then reconnects, but never blocks: attempts, the first one included, are
+    spaced by an exponential backoff with jitter between RECONNECT_MIN_DELAY and
+    RECONNECT_MAX_DELAY seconds. The backoff starts over only once a connection has lasted
+    HEALTHY_PERIOD seconds, so a flapping device is not reconnected at full speed.
+    """
+
+    MAX_READ_FAILURES = 3
+    RECONNECT_MIN_DELAY = 0.1
+    RECONNECT_MAX_DELAY = 10.0
+    HEALTHY_PERIOD = 10.0
+    RECONNECTING = "Heidenhain-Encoder connection lost, reconnecting"
+    DEVICE_ERROR = "Heidenhain-Encoder reports an error"
+    # seconds per unit of the timestamp in the axis data
+    TIMESTAMP_RESOLUTION = 1e-6
+
+    def __init__(self, device_factory=None, lock=None):
+        if device_factory is None:
+            # the hardware library is only needed by processes driving the device
+            import heidenhain
+            device_factory = heidenhain.get_encoder
+
+        if lock is None:
+            lock = HEIDENHAIN_LOCK()
+
         self._connected = False
         self._encoder = None
-        self._lock = HEIDENHAIN_LOCK()
+        self._device_factory = device_factory
+        self._lock = lock
+        self._lease_lock = threading.RLock()
+        self._clock = DeviceClock(self.TIMESTAMP_RESOLUTION)
+        self._read_time = None
+
+        self._read_failures = 0
+        self._connected_at = None
+        self._lost_at = None
+        self._reconnect_delay = self.RECONNECT_MIN_DELAY
+        self._reconnect_at = None
+        self._reconnects = 0
+        self._reconnect_failures = 0
+        self._last_reconnect_duration = None
 
     def connect(self):
         if self._connected:
             return True
 
-        self._encoder = heidenhain.get_encoder()
+        self._encoder = self._device_factory()
 
         try:
             success = self._lock.acquire(blocking=False)
@@ -53,7 +145,9 @@ class HeidenhainEncoder(object):
             if not suc:
                 raise RuntimeError("Could not connect to Heidenhain-Encoder")
 
+            self._clock.reset()
             self._connected = True
+            self._connected_at = time.time()
             return True
         except BaseException as e:
             self._lock.release()
@@ -72,6 +166,7 @@ class HeidenhainEncoder(object):
                 raise RuntimeError("Could not disconnect from Heidenhain-Encoder. Releasing lock ...")
 
             self._connected = False
+            self._lost_at = None
 
         finally:
             self._lock.release()
@@ -81,6 +176,142 @@ class HeidenhainEncoder(object):
     def is_connected(self):
         return self._connected
 
+    @contextlib.contextmanager
+    def lease(self):
+        """
+        Borrows the connection for exclusive use, e.g. by ReferenceMarkHelper while the watchdog
+        runs in the same process. Connects for the duration of the lease if nobody holds it open.
+
+        The lease only excludes threads of this process. Other processes are kept off the device
+        by the device lock, which is held as long as the connection is open.
+        """
+        with self._lease_lock:
+            connected = self._connected
+            if not connected:
+                self.connect()
+
+            try:
+                yield self
+            finally:
+                if not connected:
+                    self.disconnect()
+
+    @contextlib.contextmanager
+    def session(self):
+        """
+        Keeps the connection open like lease(), but without excluding other threads, which
+        may take their own leases in between.
+        """
+        with self._lease_lock:
+            connected = self._connected
+            if not connected:
+                self.connect()
+
+        try:
+            yield self
+        finally:
+            if not connected:
+                with self._lease_lock:
+                    self.disconnect()
+
+    def check_health(self):
+        """
+        Counts a device error as a failed read.
+
+        :return: True if the connection is usable
+        """
+        if not self._connected:
+            return False
+
+        try:
+            healthy = not self._encoder.hasError()
+        except BaseException:
+            healthy = False
+
+        if not healthy:
+            self._fail()
+
+        return healthy
+
+    def _fail(self):
+        self._read_failures += 1
+        if self._read_failures >= self.MAX_READ_FAILURES:
+            self._drop()
+
+    def _drop(self):
+        METRICS.count('connection_lost')
+
+        try:
+            self.disconnect()
+        except BaseException:
+            pass
+
+        now = time.time()
+        if not self._connected_at is None and now - self._connected_at >= self.HEALTHY_PERIOD:
+            self._reconnect_delay = self.RECONNECT_MIN_DELAY
+
+        self._connected = False
+        self._encoder = None
+        self._read_failures = 0
+        self._lost_at = now
+        self._backoff(now)
+
+    def _backoff(self, now):
+        self._reconnect_at = now + self._reconnect_delay * random.uniform(0.5, 1.0)
+        self._reconnect_delay = min(self._reconnect_delay * 2, self.RECONNECT_MAX_DELAY)
+
+    def ensure_connected(self):
+        """
+        Reconnects a dropped connection once the backoff delay has passed.
+
+        :return: True if connected, False while still waiting for the next attempt
+        """
+        if self._connected:
+            return True
+
+        if self._lost_at is None:
+            # never connected or disconnected on purpose
+            return False
+
+        now = time.time()
+        if now < self._reconnect_at:
+            return False
+
+        # a lease holder owns the connection, try again on the next call
+        if not self._lease_lock.acquire(False):
+            return False
+
+        METRICS.count('reconnect_attempts')
+        try:
+            self.connect()
+            self._encoder.clearBuffer()
+        except BaseException:
+            self._connected = False
+            self._encoder = None
+            self._reconnect_failures += 1
+            METRICS.count('reconnect_failures')
+
+            self._backoff(now)
+            return False
+        finally:
+            self._lease_lock.release()
+
+        self._last_reconnect_duration = time.time() - self._lost_at
+        METRICS.observe('reconnect_seconds', self._last_reconnect_duration)
+        self._reconnects += 1
+        self._lost_at = None
+        return True
+
+    def get_connection_statistics(self):
+        return {
+            'connected': self._connected,
+            'reconnects': self._reconnects,
+            'reconnect_failures': self._reconnect_failures,
+            'last_reconnect_duration': self._last_reconnect_duration,
+            'reconnect_delay': self._reconnect_delay,
+            'down_since': self._lost_at,
+        }
+
     def assert_connected(self):
         if not self.is_connected():
             raise RuntimeError("Heidenhain-Encoder is not connected.")
@@ -98,7 +329,35 @@ class HeidenhainEncoder(object):
 
     def read(self):
         self.assert_connected()
-        return self._encoder.read()
+        try:
+            with METRICS.timer('device_read_seconds'):
+                result = self._encoder.read()
+        except BaseException as e:
+            METRICS.count('device_read_errors')
+            self._fail()
+            raise e
+
+        if result:
+            # an empty buffer says nothing about the health of the device
+            self._read_failures = 0
+            self._read_time = time.time()
+        return result
+
+    def read_next(self):
+        """
+        Reads the next queued entry. The driver returns a false value once its buffer is empty.
+
+        :return: True if an entry has been read
+        """
+        self.assert_connected()
+        return bool(self.read())
+
+    def to_host_time(self, timestamp):
+        """
+        :param timestamp: timestamp of the entry read last, as found in the axis data
+        :return: the time the entry was taken, in seconds since the epoch
+        """
+        return self._clock.to_host(timestamp, self._read_time)
 
     def clear_buffer(self):
         self.assert_connected()
@@ -114,6 +373,8 @@ class HeidenhainEncoder(object):
 
 
 class ThetaEncoder(object):
+    NO_REFERENCE = "Cannot read angle, no valid reference given"
+
     def __init__(self, encoder_obj):
 
         if not isinstance(encoder_obj, HeidenhainEncoder):
@@ -131,13 +392,13 @@ class ThetaEncoder(object):
 
     def get_angle(self):
         if not self.has_reference():
-            raise RuntimeError("Cannot read angle, no valid reference given")
+            raise RuntimeError(self.NO_REFERENCE)
 
         return self._encoder.get_encoder().getThetaData().getAbsoluteDegree() - self._calibration
 
     def get_reference(self):
         if not self.has_reference():
-            raise RuntimeError("Cannot read angle, no valid reference given")
+            raise RuntimeError(self.NO_REFERENCE)
         theta_data = self._encoder.get_encoder().getThetaData()
         data = theta_data.getData()
         ref1 = data.ref1
@@ -149,6 +410,48 @@ class ThetaEncoder(object):
         self._encoder.assert_connected()
         return self._encoder.get_encoder().getThetaData().getData().triggerCounter
 
+    def raw(self):
+        """
+        Uncalibrated values from a single fetch of the axis data. The angle is the driver's
+        getAbsoluteDegree(), None without a reference; the references are left in counts.
+
+        :return: (angle, trigger, ref1, ref2, has reference, time)
+        """
+        self._encoder.assert_connected()
+        theta_data = self._encoder.get_encoder().getThetaData()
+        data = theta_data.getData()
+        t = self._encoder.to_host_time(data.timestamp)
+
+        if not theta_data.hasReference():
+            return None, data.triggerCounter, data.ref1, data.ref2, False, t
+
+        return theta_data.getAbsoluteDegree(), data.triggerCounter, data.ref1, data.ref2, True, t
+
+    def get_calibration(self):
+        return self._calibration
+
+    def snapshot(self):
+        """
+        Reads angle, trigger, references and the time of the entry from a single fetch of the axis data.
+
+        :return: (angle, trigger, reference, time, exception message or None)
+        """
+        self._encoder.assert_connected()
+
+        with METRICS.timer('theta_snapshot_seconds'):
+            theta_data = self._encoder.get_encoder().getThetaData()
+            data = theta_data.getData()
+            t = self._encoder.to_host_time(data.timestamp)
+
+            # the trigger counter does not depend on the reference
+            if not theta_data.hasReference():
+                return None, data.triggerCounter, None, t, self.NO_REFERENCE
+
+            return (theta_data.getAbsoluteDegree() - self._calibration, data.triggerCounter,
+                    [theta_data.computeDegree(data.ref1) - self._calibration,
+                     theta_data.computeDegree(data.ref2) - self._calibration],
+                    t, None)
+
     def start_reference(self):
         self._encoder.assert_connected()
         return self._encoder.get_encoder().startReferenceTheta()
@@ -169,12 +472,30 @@ class ThetaEncoder(object):
         self._encoder.assert_connected()
         return self._encoder.get_encoder().clearReferenceTheta()
 
-    def read_calibration(self):
+    def set_calibration(self, calibration):
+        self._calibration = calibration
+
+    def read_calibration(self, store=None):
+        """
+        :param store: encoder.calibration_store.CalibrationStore, without one encoder.calibration is reloaded
+        """
+        if not store is None:
+            self._calibration = store.get().theta
+            return
+
         try:
-            reload(encoder.calibration)
-            self._calibration = encoder.calibration.THETA_CALIBRATION
-        except:
+            importlib.reload(encoder.calibration)
+        except Exception:
             raise RuntimeError("Could not read calibration values")
+        self._calibration = encoder.calibration.THETA_CALIBRATION
+
+    def get_conversion(self):
+        """
+        :return: encoder.conversion.ThetaConversion for bulk conversion of raw counts
+        """
+        self._encoder.assert_connected()
+        return ThetaConversion.from_function(self._encoder.get_encoder().getThetaData().computeDegree,
+                                             self._calibration)
 
     def compute_calibration(self, angle):
         old_calib = self._calibration
@@ -185,6 +506,8 @@ class ThetaEncoder(object):
 
 
 class ZEncoder(object):
+    NO_REFERENCE = "Cannot read position, no valid reference given"
+
     def __init__(self, encoder_obj):
         if not isinstance(encoder_obj, HeidenhainEncoder):
             raise RuntimeError("encoder must be an instance of HeidenhainEncoder")
@@ -201,7 +524,7 @@ class ZEncoder(object):
 
     def get_reference(self):
         if not self.has_reference():
-            raise RuntimeError("Cannot read position, no valid reference given")
+            raise RuntimeError(self.NO_REFERENCE)
 
         z_data = self._encoder.get_encoder().getZData()
         data = z_data.getData()
@@ -212,7 +535,7 @@ class ZEncoder(object):
 
     def get_position(self):
         if not self.has_reference():
-            raise RuntimeError("Cannot read position, no valid reference given")
+            raise RuntimeError(self.NO_REFERENCE)
 
         return self._encoder.get_encoder().getZData().getAbsolutePosition() - self._calibration
 
@@ -220,6 +543,46 @@ class ZEncoder(object):
         self._encoder.assert_connected()
         return self._encoder.get_encoder().getZData().getData().triggerCounter
 
+    def raw(self):
+        """
+        Uncalibrated values from a single fetch of the axis data. The position is the driver's
+        getAbsolutePosition(), None without a reference; the references are left in counts.
+
+        :return: (position, ref1, ref2, has reference)
+        """
+        self._encoder.assert_connected()
+        z_data = self._encoder.get_encoder().getZData()
+        data = z_data.getData()
+
+        if not z_data.hasReference():
+            return None, data.ref1, data.ref2, False
+
+        return z_data.getAbsolutePosition(), data.ref1, data.ref2, True
+
+    def get_calibration(self):
+        return self._calibration
+
+    def snapshot(self):
+        """
+        Reads position and references from a single fetch of the axis data.
+
+        :return: (position, reference, exception message or None)
+        """
+        self._encoder.assert_connected()
+
+        with METRICS.timer('z_snapshot_seconds'):
+            z_data = self._encoder.get_encoder().getZData()
+
+            if not z_data.hasReference():
+                return None, None, self.NO_REFERENCE
+
+            data = z_data.getData()
+
+            return (z_data.getAbsolutePosition() - self._calibration,
+                    [z_data.computePosition(data.ref1) - self._calibration,
+                     z_data.computePosition(data.ref2) - self._calibration],
+                    None)
+
     def start_reference(self):
         self._encoder.assert_connected()
         return self._encoder.get_encoder().startReferenceZ()
@@ -240,12 +603,30 @@ class ZEncoder(object):
         self._encoder.assert_connected()
         return self._encoder.get_encoder().clearReferenceZ()
 
-    def read_calibration(self):
+    def set_calibration(self, calibration):
+        self._calibration = calibration
+
+    def read_calibration(self, store=None):
+        """
+        :param store: encoder.calibration_store.CalibrationStore, without one encoder.calibration is reloaded
+        """
+        if not store is None:
+            self._calibration = store.get().z
+            return
+
         try:
-            reload(encoder.calibration)
-            self._calibration = encoder.calibration.Z_CALIBRATION
-        except:
+            importlib.reload(encoder.calibration)
+        except Exception:
             raise RuntimeError("Could not read calibration values")
+        self._calibration = encoder.calibration.Z_CALIBRATION
+
+    def get_conversion(self):
+        """
+        :return: encoder.conversion.ZConversion for bulk conversion of raw counts
+        """
+        self._encoder.assert_connected()
+        return ZConversion.from_function(self._encoder.get_encoder().getZData().computePosition,
+                                         self._calibration)
 
     def compute_calibration(self, position):
         old_calib = self._calibration
@@ -256,51 +637,55 @@ class ZEncoder(object):
 
 
 class ReferenceMarkHelper(object):
+    """
+    Takes a lease only for every single step, so a watchdog in the same process keeps publishing
+    during a reference search.
+    """
+
+    # pause between two steps, leaves the device to the watchdog meanwhile
+    STEP_INTERVAL = 0.01
+
     def __init__(self, encoder):
         if not isinstance(encoder, HeidenhainEncoder):
             raise RuntimeError("encoder must be an instance of HeidenhainEncoder")
 
         self._encoder = encoder
 
-    def _search(self, axis, force=False):
-        is_connected = False
-        try:
-            is_connected = self._encoder.is_connected()
-            if not is_connected:
-                self._encoder.connect()
-
+    def _search_step(self, axis):
+        with self._encoder.lease():
             self._encoder.read()
-            if not force and axis.has_reference():
-                raise RuntimeError("Axis is already referenced!")
+            if axis.has_reference() and axis.received_reference():
+                return True
 
-            self._encoder.clear_buffer()
-            axis.clear_reference()
-            axis.start_reference()
-            while not axis.has_reference() or not axis.received_reference():
+            print(axis.info())
+            return False
+
+    def _search(self, axis, force=False):
+        with self._encoder.session():
+            with self._encoder.lease():
                 self._encoder.read()
-                print(axis.info())
-        except BaseException as e:
-            print(e)
-            raise e
-        finally:
-            axis.stop_reference()
-            if not is_connected:
-                self._encoder.disconnect()
+                if not force and axis.has_reference():
+                    raise RuntimeError("Axis is already referenced!")
+
+                self._encoder.clear_buffer()
+                axis.clear_reference()
+                axis.start_reference()
+
+            try:
+                while not self._search_step(axis):
+                    time.sleep(self.STEP_INTERVAL)
+            except BaseException as e:
+                print(e)
+                raise e
+            finally:
+                with self._encoder.lease():
+                    axis.stop_reference()
 
     def _reset(self, axis):
-        self._encoder.read()
-
-        is_connected = False
-        try:
-            is_connected = self._encoder.is_connected()
-            if not is_connected:
-                self._encoder.connect()
-
+        with self._encoder.lease():
+            self._encoder.read()
             self._encoder.clear_buffer()
             axis.clear_reference()
-        finally:
-            if not is_connected:
-                self._encoder.disconnect()
 
     def reset_theta(self):
         self._reset(ThetaEncoder(self._encoder))
@@ -320,20 +705,15 @@ class ReferenceMarkHelper(object):
 
 
     def _show(self, axis):
-        is_connected = False
-        try:
-            is_connected = self._encoder.is_connected()
-            if not is_connected:
-                self._encoder.connect()
-
-            while True:
-                self._encoder.read()
-                print(axis.info())
-        except BaseException as e:
-            print(e)
-        finally:
-            if not is_connected:
-                self._encoder.disconnect()
+        with self._encoder.session():
+            try:
+                while True:
+                    with self._encoder.lease():
+                        self._encoder.read()
+                        print(axis.info())
+                    time.sleep(self.STEP_INTERVAL)
+            except BaseException as e:
+                print(e)
 
     def show_theta(self):
         self._show(ThetaEncoder(self._encoder))
@@ -1,25 +1,70 @@
 import time
+import encoder.parameters
 from encoder.File import AbstractCommunication
+from encoder.subscription import Subscription
+from encoder.metrics import METRICS
+from encoder.DataEncoder import Sample
+from encoder.predictor import AlphaBetaPredictor
 
 
 class EncoderInterface(object):
 
-    PARAMETER_TIME_DIFF = 1 # more than 1 sec time diff is not allowed
-    PARAMETER_ANGLE_DIFF = 13
-    PARAMETER_ANGLE_TOL = 0.1
+    PARAMETER_TIME_DIFF = encoder.parameters.TIME_DIFF
+    PARAMETER_ANGLE_DIFF = encoder.parameters.ANGLE_DIFF
+    PARAMETER_ANGLE_TOL = encoder.parameters.ANGLE_TOL
 
-    def __init__(self, comm):
+    def __init__(self, comm, history=None, notify_path=None, theta_predictor=None, z_predictor=None,
+                 trigger_table=None):
+        """
+        :param history: History, or the path of a history file which is mapped read-only on first use
+        :param theta_predictor: AlphaBetaPredictor used by get_angle(at=...), a default one if not given
+        :param z_predictor: AlphaBetaPredictor used by get_z(at=...), a default one if not given
+        :param trigger_table: TriggerTable, or the path of a trigger table mapped read-only on first use
+        """
         if not isinstance(comm, AbstractCommunication):
             raise RuntimeError("comm must be an instance of AbstractCommunication")
 
+        # History and TriggerTable need numpy, they are only imported when given or used
+        if not history is None and not isinstance(history, str):
+            from encoder.History import History
+
+            if not isinstance(history, History):
+                raise RuntimeError("history must be an instance of History")
+
+        if not trigger_table is None and not isinstance(trigger_table, str):
+            from encoder.capture import TriggerTable
+
+            if not isinstance(trigger_table, TriggerTable):
+                raise RuntimeError("trigger_table must be an instance of TriggerTable")
+
+        if not theta_predictor is None and not isinstance(theta_predictor, AlphaBetaPredictor):
+            raise RuntimeError("theta_predictor must be an instance of AlphaBetaPredictor")
+
+        if not z_predictor is None and not isinstance(z_predictor, AlphaBetaPredictor):
+            raise RuntimeError("z_predictor must be an instance of AlphaBetaPredictor")
+
+        if theta_predictor is None:
+            theta_predictor = AlphaBetaPredictor()
+
+        if z_predictor is None:
+            z_predictor = AlphaBetaPredictor()
+
         self._comm = comm
+        self._history = history
+        self._notify_path = notify_path
+        self._theta_predictor = theta_predictor
+        self._z_predictor = z_predictor
+        self._trigger_table = trigger_table
 
     def get_data(self):
         return self._comm.load()
 
     def _check_time(self, data):
         diff = time.time() - data.get_time()
+        METRICS.observe('sample_age_seconds', abs(diff))
+
         if abs(diff) >= self.PARAMETER_TIME_DIFF:
+            METRICS.count('stale_rejections')
             raise RuntimeError("No new encoder data given (Too old)")
 
     def _check_reference_theta(self, data):
@@ -35,8 +80,29 @@ class EncoderInterface(object):
         if abs(diff - self.PARAMETER_ANGLE_DIFF) > self.PARAMETER_ANGLE_TOL:
             raise RuntimeError("Given reference angles are not in range")
 
-    def get_angle(self):
+    def get_angle(self, at=None):
+        """
+        :param at: if given, an encoder.predictor.Estimate of the angle at this time is returned
+        """
         data = self.get_data()
+
+        if at is None:
+            return self._angle(data)
+
+        return self._estimate(self._theta_predictor, self._angle, data, at)
+
+    def _estimate(self, predictor, position, data, at):
+        try:
+            value = position(data)
+        except BaseException as e:
+            # never extrapolate across a failed check
+            predictor.reset()
+            raise e
+
+        predictor.update(data.get_time(), value)
+        return predictor.predict(at)
+
+    def _angle(self, data):
         self._check_time(data)
         self._check_reference_theta(data)
 
@@ -52,9 +118,205 @@ class EncoderInterface(object):
 
         pass
 
-    def get_z(self):
+    def get_z(self, at=None):
+        """
+        :param at: if given, an encoder.predictor.Estimate of the position at this time is returned
+        """
         data = self.get_data()
+
+        if at is None:
+            return self._z(data)
+
+        return self._estimate(self._z_predictor, self._z, data, at)
+
+    def _z(self, data):
         self._check_time(data)
         self._check_reference_z(data)
 
-        return data.get_position_z()
\ No newline at end of file
+        return data.get_position_z()
+
+    def _check_status(self, data, status):
+        if not status == Sample.STATUS_OK:
+            return status
+
+        diff = time.time() - data.get_time()
+        METRICS.observe('sample_age_seconds', abs(diff))
+
+        if abs(diff) >= self.PARAMETER_TIME_DIFF:
+            METRICS.count('stale_rejections')
+            return Sample.STATUS_STALE
+
+        return Sample.STATUS_OK
+
+    def check_theta(self, data):
+        """
+        Same checks as get_angle(), but reported as one of the Sample.STATUS_* codes instead of raising.
+        """
+        status = self._check_status(data, data.get_status_theta())
+        if not status == Sample.STATUS_OK:
+            return status
+
+        ref = data.get_references_theta()
+        if not len(ref) == 2 or abs(abs(ref[0] - ref[1]) - self.PARAMETER_ANGLE_DIFF) > self.PARAMETER_ANGLE_TOL:
+            return Sample.STATUS_INVALID_REFERENCE
+
+        return Sample.STATUS_OK
+
+    def check_z(self, data):
+        """
+        Same checks as get_z(), but reported as one of the Sample.STATUS_* codes instead of raising.
+        """
+        status = self._check_status(data, data.get_status_z())
+        if not status == Sample.STATUS_OK:
+            return status
+
+        if not len(data.get_references_z()) == 2:
+            return Sample.STATUS_INVALID_REFERENCE
+
+        return Sample.STATUS_OK
+
+    def try_get_angle(self):
+        """
+        :return: (status, angle), the angle is None unless status is Sample.STATUS_OK
+        """
+        data = self.get_data()
+        status = self.check_theta(data)
+        return status, data.get_position_theta() if status == Sample.STATUS_OK else None
+
+    def try_get_z(self):
+        """
+        :return: (status, z), z is None unless status is Sample.STATUS_OK
+        """
+        data = self.get_data()
+        status = self.check_z(data)
+        return status, data.get_position_z() if status == Sample.STATUS_OK else None
+
+    def _get_history(self):
+        if self._history is None:
+            raise RuntimeError("No history available")
+
+        if isinstance(self._history, str):
+            from encoder.History import History
+            self._history = History(self._history, writable=False)
+
+        return self._history
+
+    def get_history(self, since=None):
+        """
+        :return: numpy structured array with the fields time, theta, z and trigger
+        """
+        return self._get_history().get_history(since)
+
+    def get_range(self, t0, t1):
+        return self._get_history().get_range(t0, t1)
+
+    def get_angle_at(self, t):
+        return self._get_history().get_angle_at(t)
+
+    def get_z_at(self, t):
+        return self._get_history().get_z_at(t)
+
+    def _get_trigger_table(self):
+        if self._trigger_table is None:
+            raise RuntimeError("No trigger table available")
+
+        if isinstance(self._trigger_table, str):
+            from encoder.capture import TriggerTable
+            self._trigger_table = TriggerTable(self._trigger_table, writable=False)
+
+        return self._trigger_table
+
+    def get_trigger_position(self, trigger):
+        """
+        :return: record (trigger, time, theta, z, theta_status, z_status) captured at the given trigger count
+        """
+        return self._get_trigger_table().get(trigger)
+
+    def get_trigger_range(self, first, last):
+        """
+        :return: structured array (trigger, time, theta, z, theta_status, z_status) of the captured triggers
+                 first <= trigger <= last
+        """
+        return self._get_trigger_table().get_range(first, last)
+
+    def subscribe(self, callback=None, decimation=1, threshold=None):
+        """
+        Without a callback the returned Subscription is consumed with wait() or by iterating
+        over it. With a callback it is started and calls back from its own thread.
+
+        :return: encoder.subscription.Subscription
+        """
+        if self._notify_path is None:
+            raise RuntimeError("No notification channel available")
+
+        subscription = Subscription(self._comm, self._notify_path, callback, decimation, threshold)
+        subscription.connect()
+
+        if not callback is None:
+            subscription.start()
+
+        return subscription
+
+    def _wait_for(self, position, target, tol, settle_time, timeout):
+        # subscribe before the first check, so that no sample published in between is missed
+        subscription = self.subscribe()
+        try:
+            deadline = None if timeout is None else time.time() + timeout
+            settled_since = None
+            error = None
+
+            try:
+                data = self.get_data()
+            except (IOError, OSError, RuntimeError) as e:
+                data = None
+                error = e
+
+            while True:
+                in_range = False
+                if not data is None:
+                    try:
+                        in_range = abs(position(data) - target) <= tol
+                        error = None
+                    except RuntimeError as e:
+                        # error and stale samples may be transient, only the deadline ends the wait
+                        error = e
+
+                if in_range:
+                    if settled_since is None:
+                        settled_since = data.get_time()
+
+                    if data.get_time() - settled_since >= settle_time:
+                        return data
+                else:
+                    settled_since = None
+
+                remaining = None
+                if not deadline is None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        message = "Timeout while waiting for position {}".format(target)
+                        if not error is None:
+                            message += ", last error: {}".format(error)
+                        raise RuntimeError(message)
+
+                sample = subscription.wait(remaining)
+                if not sample is None:
+                    data = sample
+        finally:
+            subscription.close()
+
+    def wait_for_angle(self, target, tol, settle_time=0, timeout=None):
+        """
+        Blocks until theta stayed within target +- tol for settle_time seconds.
+
+        :return: the sample that satisfied the condition
+        """
+        return self._wait_for(self._angle, target, tol, settle_time, timeout)
+
+    def wait_for_z(self, target, tol, settle_time=0, timeout=None):
+        """
+        Blocks until z stayed within target +- tol for settle_time seconds.
+
+        :return: the sample that satisfied the condition
+        """
+        return self._wait_for(self._z, target, tol, settle_time, timeout)
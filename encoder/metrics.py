@@ -0,0 +1,180 @@
+import bisect
+import threading
+import time
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class Histogram(object):
+    # upper bounds in seconds
+    BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2,
+               5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        :return: upper bound of the bucket holding the q-quantile
+        """
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.BUCKETS + (float('inf'),), self.counts):
+            total += count
+            if total >= rank:
+                return bound
+
+
+class _Timer(object):
+    __slots__ = ('_metrics', '_name', '_start')
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = _clock()
+        return self
+
+    def __exit__(self, *args):
+        self._metrics.observe(self._name, _clock() - self._start)
+        return False
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics(object):
+    """
+    Counters and latency histograms per stage. Disabled by default: then timer() returns a
+    shared no-op context manager and count()/observe() return immediately.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._export_path = None
+        self._export_interval = None
+        self._export_next = 0
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+
+        # watchdog, pipeline and device threads record concurrently, += alone loses updates
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+
+            histogram.observe(seconds)
+
+    def timer(self, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def get_stats(self):
+        stats = {}
+        with self._lock:
+            for name, value in self._counters.items():
+                stats[name] = value
+            for name, histogram in self._histograms.items():
+                stats[name] = {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'mean': histogram.sum / histogram.count if histogram.count else None,
+                    'p50': histogram.quantile(0.5),
+                    'p99': histogram.quantile(0.99),
+                }
+        return stats
+
+    def to_prometheus(self, prefix='encoder'):
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                metric = '{}_{}_total'.format(prefix, name)
+                lines.append('# TYPE {} counter'.format(metric))
+                lines.append('{} {}'.format(metric, self._counters[name]))
+
+            for name in sorted(self._histograms):
+                histogram = self._histograms[name]
+                metric = '{}_{}'.format(prefix, name)
+                lines.append('# TYPE {} histogram'.format(metric))
+
+                total = 0
+                for bound, count in zip(histogram.BUCKETS, histogram.counts):
+                    total += count
+                    lines.append('{}_bucket{{le="{}"}} {}'.format(metric, bound, total))
+
+                lines.append('{}_bucket{{le="+Inf"}} {}'.format(metric, histogram.count))
+                lines.append('{}_sum {}'.format(metric, histogram.sum))
+                lines.append('{}_count {}'.format(metric, histogram.count))
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix='encoder'):
+        # encoder.File imports this module
+        from encoder.File import write_atomic
+
+        write_atomic(path, self.to_prometheus(prefix))
+
+    def export(self, path, interval=10.0):
+        """
+        Writes the Prometheus text dump to path every interval seconds, triggered by tick().
+        """
+        self._export_path = path
+        self._export_interval = interval
+        self._export_next = 0
+
+    def tick(self):
+        if not self.enabled or self._export_path is None:
+            return
+
+        now = time.time()
+        if now >= self._export_next:
+            self._export_next = now + self._export_interval
+            self.write_prometheus(self._export_path)
+
+
+METRICS = Metrics()
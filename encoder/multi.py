@@ -0,0 +1,243 @@
+import fcntl
+import os
+import threading
+
+from encoder.interface import EncoderInterface
+from encoder.DataEncoder import Sample
+from encoder.factory import Factory, get_device_path
+
+# Like encoder.factory, the watchdog side (watchdogs, device drivers, numpy) is imported on first use,
+# so clients of several devices neither pay for nor need it.
+
+
+class DeviceLock(object):
+    """
+    Inter-process lock on a lock file, used instead of HEIDENHAIN_LOCK so that every device
+    can be claimed by a different process.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._fd = None
+        self._thread_lock = threading.Lock()
+
+    def acquire(self, blocking=True):
+        if not self._thread_lock.acquire(blocking):
+            return False
+
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            os.close(fd)
+            self._thread_lock.release()
+            return False
+
+        self._fd = fd
+        return True
+
+    def release(self):
+        # HeidenhainEncoder releases after a failed acquire as well
+        if self._fd is None:
+            return
+
+        fd = self._fd
+        self._fd = None
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+        return False
+
+
+class MultiPositionWatchdog(object):
+    """
+    Serves several devices, every device by its own PositionWatchdog thread publishing to its own
+    channel, so a slow or reconnecting device never delays the others. Each watchdog is paced by
+    its own scheduler, if it has one; a TickScheduler paces a single loop and cannot be shared.
+    """
+
+    def __init__(self, watchdogs):
+        from encoder.Watchdog import PositionWatchdog
+
+        schedulers = set()
+
+        for name, watchdog in watchdogs:
+            if not isinstance(watchdog, PositionWatchdog):
+                raise RuntimeError("Watchdog of device '{}' must be an instance of PositionWatchdog".format(name))
+
+            scheduler = watchdog.get_scheduler()
+            if not scheduler is None:
+                if id(scheduler) in schedulers:
+                    raise RuntimeError("Watchdog of device '{}' shares its scheduler".format(name))
+                schedulers.add(id(scheduler))
+
+        if len(watchdogs) == 0:
+            raise RuntimeError("At least one device is required")
+
+        self._watchdogs = list(watchdogs)
+        self._started = []
+
+    def get_names(self):
+        return [name for name, _ in self._watchdogs]
+
+    def get_watchdog(self, name):
+        for device, watchdog in self._watchdogs:
+            if device == name:
+                return watchdog
+
+        raise RuntimeError("Unknown device '{}'".format(name))
+
+    def start(self):
+        for _, watchdog in self._watchdogs:
+            watchdog.start()
+            self._started.append(watchdog)
+
+    def stop(self):
+        for _, watchdog in self._watchdogs:
+            if watchdog in self._started:
+                watchdog.stop()
+            else:
+                watchdog.close()
+
+    def join(self, timeout=None):
+        for watchdog in self._started:
+            watchdog.join(timeout)
+
+    def is_alive(self):
+        return any(watchdog.is_alive() for watchdog in self._started)
+
+
+class MultiEncoderInterface(object):
+    """
+    Client side of MultiPositionWatchdog: one EncoderInterface per device.
+    """
+
+    AXIS_THETA = 'theta'
+    AXIS_Z = 'z'
+
+    def __init__(self, interfaces):
+        for name, interface in interfaces:
+            if not isinstance(interface, EncoderInterface):
+                raise RuntimeError("Interface of device '{}' must be an instance of EncoderInterface".format(name))
+
+        self._interfaces = list(interfaces)
+        self._by_name = dict(self._interfaces)
+
+    def get_names(self):
+        return [name for name, _ in self._interfaces]
+
+    def get_interface(self, name):
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise RuntimeError("Unknown device '{}'".format(name))
+
+    def get_angle(self, name, at=None):
+        return self.get_interface(name).get_angle(at)
+
+    def get_z(self, name, at=None):
+        return self.get_interface(name).get_z(at)
+
+    def get_position(self, name, axis, at=None):
+        if axis == self.AXIS_THETA:
+            return self.get_angle(name, at)
+
+        if axis == self.AXIS_Z:
+            return self.get_z(name, at)
+
+        raise RuntimeError("Unknown axis '{}'".format(axis))
+
+    def get_all(self):
+        """
+        :return: {device: {axis: (status, value)}}, value is None unless status is Sample.STATUS_OK
+        """
+        positions = {}
+        for name, interface in self._interfaces:
+            data = interface.get_data()
+            theta_status = interface.check_theta(data)
+            theta = data.get_position_theta() if theta_status == Sample.STATUS_OK else None
+            z_status = interface.check_z(data)
+            z = data.get_position_z() if z_status == Sample.STATUS_OK else None
+            positions[name] = {self.AXIS_THETA: (theta_status, theta), self.AXIS_Z: (z_status, z)}
+        return positions
+
+
+class MultiFactory(object):
+    """
+    Factory for several devices, every device gets a Factory with paths namespaced by its name.
+
+    :param devices: list of (name, device) where device is an EncoderFactory or a callable returning
+                    the driver object; the latter is locked with a DeviceLock next to the device channel
+    """
+
+    def __init__(self, devices, communication=Factory.COMMUNICATION_FILE):
+        self._communication = communication
+        self._factories = []
+        self._drivers = {}
+        names = set()
+
+        for name, device in devices:
+            if name in names:
+                raise RuntimeError("Device '{}' is given twice".format(name))
+            names.add(name)
+
+            if callable(device):
+                # the EncoderFactory is built on first use by the watchdog side, see _get_device_factory
+                self._drivers[name] = device
+                factory = Factory(None, communication, name)
+            else:
+                from encoder.heidenhain_encoder import EncoderFactory
+
+                if not isinstance(device, EncoderFactory):
+                    raise RuntimeError("Device '{}' must be an EncoderFactory or a callable".format(name))
+
+                if device.get_lock() is None:
+                    # HEIDENHAIN_LOCK is one lock for all devices, they would exclude each other
+                    raise RuntimeError("Device '{}' needs a lock of its own".format(name))
+                factory = Factory(device, communication, name)
+
+            self._factories.append((name, factory))
+
+    def get_names(self):
+        return [name for name, _ in self._factories]
+
+    def _get_device_factory(self, name, factory):
+        driver = self._drivers.pop(name, None)
+        if driver is None:
+            return factory
+
+        from encoder.heidenhain_encoder import EncoderFactory
+
+        lock = DeviceLock(get_device_path(name) + '.lock')
+        factory = Factory(EncoderFactory(driver, lock), self._communication, name)
+        self._factories = [(device, factory if device == name else f) for device, f in self._factories]
+        return factory
+
+    def get_factory(self, name):
+        for device, factory in self._factories:
+            if device == name:
+                return self._get_device_factory(name, factory)
+
+        raise RuntimeError("Unknown device '{}'".format(name))
+
+    def get_watchdog(self, batch_size=1, scheduler_factory=None, capture=False):
+        """
+        :param scheduler_factory: callable returning a new TickScheduler, called once per device
+        """
+        watchdogs = []
+        for name in self.get_names():
+            factory = self.get_factory(name)
+            scheduler = None if scheduler_factory is None else scheduler_factory()
+            watchdogs.append((name, factory.get_watchdog(batch_size, scheduler, capture=capture)))
+
+        return MultiPositionWatchdog(watchdogs)
+
+    def get_interface(self):
+        return MultiEncoderInterface([(name, factory.get_interface()) for name, factory in self._factories])
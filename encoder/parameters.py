@@ -0,0 +1,5 @@
+# limits a published sample has to meet, checked by EncoderInterface
+
+TIME_DIFF = 1  # more than 1 sec time diff is not allowed
+ANGLE_DIFF = 13  # spacing of the two theta reference marks in degree
+ANGLE_TOL = 0.1
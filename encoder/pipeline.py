@@ -0,0 +1,239 @@
+import queue
+import time
+
+from collections import namedtuple
+
+from encoder.DataEncoder import Sample
+from encoder.Watchdog import PositionWatchdog
+from encoder.heidenhain_encoder import HeidenhainEncoder
+from encoder.metrics import METRICS
+from e21_util.simultaneous import StoppableThread, StopException
+
+
+RawSample = namedtuple('RawSample', ['time', 'theta', 'trigger', 'theta_ref1', 'theta_ref2', 'theta_referenced',
+                                     'z', 'z_ref1', 'z_ref2', 'z_referenced'])
+
+
+class AcquisitionThread(StoppableThread):
+    """
+    Only reads the device: every new entry is turned into a RawSample of uncalibrated values
+    and put into the pipeline queue. Read errors are forwarded as the exception itself.
+    """
+
+    def __init__(self, pipeline):
+        super(AcquisitionThread, self).__init__()
+        self._pipeline = pipeline
+
+    def do_execute(self):
+        self._pipeline.acquire()
+
+
+class PipelinedWatchdog(PositionWatchdog):
+    """
+    PositionWatchdog split into two stages connected by a bounded queue. An AcquisitionThread
+    reads the device; this thread calibrates whole batches with the vectorized conversions,
+    encodes and publishes them. A slow publication therefore never delays the next device read.
+
+    When the queue is full, DROP_OLDEST discards the oldest queued sample, DROP_NEWEST the
+    sample just acquired.
+    """
+
+    DROP_OLDEST = 'oldest'
+    DROP_NEWEST = 'newest'
+
+    QUEUE_TIMEOUT = 0.1
+
+    def __init__(self, comm, encoder_factory, queue_size=10000, drop_policy=DROP_OLDEST, **kwargs):
+        super(PipelinedWatchdog, self).__init__(comm, encoder_factory, **kwargs)
+
+        if drop_policy not in [self.DROP_OLDEST, self.DROP_NEWEST]:
+            raise RuntimeError("Unknown drop policy '{}'".format(drop_policy))
+
+        self._queue = queue.Queue(queue_size)
+        self._drop_policy = drop_policy
+        self._acquisition = None
+        self._theta_conversion = None
+        self._z_conversion = None
+
+        self._acquired = 0
+        self._dropped = 0
+        self._published = 0
+        self._max_depth = 0
+
+    def get_pipeline_statistics(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_max_depth': self._max_depth,
+            'acquired': self._acquired,
+            'dropped': self._dropped,
+            'published': self._published,
+        }
+
+    def initialize(self):
+        super(PipelinedWatchdog, self).initialize()
+
+        if self._acquisition is None:
+            self._acquisition = AcquisitionThread(self)
+            self._acquisition.start()
+
+    def close(self):
+        if not self._acquisition is None:
+            self._acquisition.stop()
+            self._acquisition.join()
+            self._acquisition = None
+
+        super(PipelinedWatchdog, self).close()
+
+    # acquisition stage
+
+    def acquire(self):
+        if not self._scheduler is None:
+            self._scheduler.wait()
+
+        try:
+            if not self._encoder.ensure_connected():
+                raise RuntimeError(HeidenhainEncoder.RECONNECTING)
+
+            with self._encoder.lease():
+                if not self._encoder.read_next():
+                    # nothing queued since the last read, the entry read last is already in the queue
+                    self._check_health()
+                    return
+
+                self._resolve_conversions()
+
+                # drain everything queued, the bounded queue and its drop policy limit the backlog
+                now = time.time()
+                deadline = now + self.MAX_DRAIN_TIME
+                self._health_check_at = now + self.HEALTH_CHECK_INTERVAL
+                self._put(self._read_raw())
+                while self._read_more(deadline):
+                    self._put(self._read_raw())
+        except KeyboardInterrupt as e:
+            raise e
+        except StopException as e:
+            raise e
+        except BaseException as e:
+            self._put(e)
+
+    def _resolve_conversions(self):
+        # probes the driver, so only under the lease; done before the first entry is queued
+        if self._theta_conversion is None:
+            self._z_conversion = self._z.get_conversion()
+            self._theta_conversion = self._theta.get_conversion()
+
+    def _read_raw(self):
+        theta, trigger, theta_ref1, theta_ref2, theta_referenced, t = self._theta.raw()
+        z, z_ref1, z_ref2, z_referenced = self._z.raw()
+
+        return RawSample(t, theta, trigger, theta_ref1, theta_ref2, theta_referenced,
+                         z, z_ref1, z_ref2, z_referenced)
+
+    def _put(self, item):
+        self._acquired += 1
+
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._dropped += 1
+            METRICS.count('pipeline_dropped')
+
+            if self._drop_policy == self.DROP_NEWEST:
+                return
+
+            try:
+                self._queue.get_nowait()
+                self._queue.put_nowait(item)
+            except (queue.Empty, queue.Full):
+                pass
+
+        depth = self._queue.qsize()
+        if depth > self._max_depth:
+            self._max_depth = depth
+
+    # calibration and publication stage
+
+    def _take(self):
+        try:
+            items = [self._queue.get(timeout=self.QUEUE_TIMEOUT)]
+        except queue.Empty:
+            return []
+
+        while len(items) < self._batch_size:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return items
+
+    def do_execute(self):
+        self.initialize()
+        METRICS.tick()
+
+        items = self._take()
+        raw = []
+
+        self._update_calibration()
+
+        try:
+            for item in items:
+                if isinstance(item, BaseException):
+                    self._flush(raw)
+                    raw = []
+                    self._publish_error(item)
+                else:
+                    raw.append(item)
+
+            self._flush(raw)
+        except KeyboardInterrupt as e:
+            raise e
+        except StopException as e:
+            raise e
+        except BaseException as e:
+            self._publish_error(e)
+
+    def _conversions(self):
+        # follow calibration changes without probing the driver again
+        if not self._theta_conversion.get_calibration() == self._theta.get_calibration():
+            self._theta_conversion = self._theta_conversion.with_calibration(self._theta.get_calibration())
+        if not self._z_conversion.get_calibration() == self._z.get_calibration():
+            self._z_conversion = self._z_conversion.with_calibration(self._z.get_calibration())
+
+        return self._theta_conversion, self._z_conversion
+
+    def _flush(self, raw):
+        if len(raw) == 0:
+            return
+
+        theta_conversion, z_conversion = self._conversions()
+
+        # positions come from getAbsoluteDegree()/getAbsolutePosition() like in PositionWatchdog,
+        # only the references are converted from counts
+        theta = theta_conversion.calibrate([r.theta for r in raw])
+        theta_ref = theta_conversion.convert_references([r.theta_ref1 for r in raw], [r.theta_ref2 for r in raw])
+        z = z_conversion.calibrate([r.z for r in raw])
+        z_ref = z_conversion.convert_references([r.z_ref1 for r in raw], [r.z_ref2 for r in raw])
+
+        samples = []
+        for i, r in enumerate(raw):
+            if r.theta_referenced:
+                theta_values = (float(theta[i]), r.trigger, [float(theta_ref[i, 0]), float(theta_ref[i, 1])])
+                theta_exception, theta_status = None, Sample.STATUS_OK
+            else:
+                theta_values = (None, r.trigger, None)
+                theta_exception, theta_status = self._theta.NO_REFERENCE, Sample.STATUS_NO_REFERENCE
+
+            if r.z_referenced:
+                z_values = (float(z[i]), [float(z_ref[i, 0]), float(z_ref[i, 1])])
+                z_exception, z_status = None, Sample.STATUS_OK
+            else:
+                z_values = (None, None)
+                z_exception, z_status = self._z.NO_REFERENCE, Sample.STATUS_NO_REFERENCE
+
+            samples.append(Sample(theta_values[1], theta_values[0], theta_values[2], z_values[0], z_values[1],
+                                  r.time, self._combine(theta_exception, z_exception), False, theta_status,
+                                  z_status, self._calibration_version))
+
+        self._publish_batch(samples)
+        self._published += len(samples)
@@ -0,0 +1,86 @@
+import math
+
+from collections import namedtuple
+
+import encoder.parameters
+
+
+Estimate = namedtuple('Estimate', ['value', 'time', 'uncertainty'])
+
+
+class AlphaBetaPredictor(object):
+    """
+    Alpha-beta filter tracking position and velocity of one axis from the published samples.
+
+    predict() extrapolates the filtered state to a given time. The uncertainty is the RMS of the
+    recent residuals plus the RMS of the recent velocity corrections times the extrapolation
+    horizon; it is infinite as long as a single sample gives no velocity. Estimates more than
+    `max_horizon` seconds after the last sample are refused, by default the age at which
+    EncoderInterface refuses the sample itself.
+    """
+
+    def __init__(self, alpha=0.5, beta=0.1, max_horizon=encoder.parameters.TIME_DIFF, smoothing=0.05):
+        if not 0 < alpha <= 1 or not 0 <= beta <= 2:
+            raise RuntimeError("alpha must be in (0, 1] and beta in [0, 2]")
+
+        if max_horizon <= 0:
+            raise RuntimeError("max_horizon must be positive")
+
+        self._alpha = alpha
+        self._beta = beta
+        self._max_horizon = max_horizon
+        self._smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        self._time = None
+        self._position = None
+        self._velocity = 0.0
+        self._residual = 0.0
+        self._velocity_noise = 0.0
+        self._updates = 0
+
+    def is_initialized(self):
+        return not self._time is None
+
+    def update(self, t, value):
+        if self._time is None:
+            self._time = t
+            self._position = value
+            return
+
+        dt = t - self._time
+        if dt <= 0:
+            # the same sample was read again
+            return
+
+        predicted = self._position + self._velocity * dt
+        residual = value - predicted
+        correction = self._beta * residual / dt
+
+        self._position = predicted + self._alpha * residual
+        self._velocity += correction
+        self._time = t
+
+        # the averages start at the first observed values instead of zero
+        s = 1.0 if self._updates == 0 else self._smoothing
+        self._updates += 1
+        self._residual += s * (residual * residual - self._residual)
+        self._velocity_noise += s * (correction * correction - self._velocity_noise)
+
+    def predict(self, at):
+        """
+        :return: Estimate of the position at time `at`
+        """
+        if self._time is None:
+            raise RuntimeError("No samples to extrapolate from")
+
+        horizon = at - self._time
+        if horizon > self._max_horizon:
+            raise RuntimeError("Cannot extrapolate {:.3f} s past the last sample".format(horizon))
+
+        if self._updates == 0:
+            return Estimate(self._position, at, float('inf'))
+
+        uncertainty = math.sqrt(self._residual) + math.sqrt(self._velocity_noise) * abs(horizon)
+        return Estimate(self._position + self._velocity * horizon, at, uncertainty)
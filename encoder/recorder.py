@@ -0,0 +1,194 @@
+import os
+import queue
+import threading
+
+import numpy
+
+from encoder.History import History
+
+
+class Recorder(object):
+    """
+    Appends every published sample to segment files in `directory`. The acquisition thread only
+    puts samples into a bounded queue; a writer thread converts them to History.DTYPE records and
+    appends them in chunks. If the queue is full the sample is dropped and counted, recording
+    never blocks the watchdog.
+
+    A new segment is started after `segment_records` records or `segment_duration` seconds.
+    Segments are named after the time of their first record and are plain arrays of History.DTYPE.
+    An existing segment is never appended to; if the name is taken, a counter is added to it.
+    """
+
+    SUFFIX = '.rec'
+    FLUSH_RECORDS = 4096
+    FLUSH_INTERVAL = 0.1
+
+    def __init__(self, directory, segment_records=1000000, segment_duration=3600.0, queue_size=100000):
+        self._directory = directory
+        self._segment_records = segment_records
+        self._segment_duration = segment_duration
+        self._queue = queue.Queue(queue_size)
+        self._thread = None
+        self._file = None
+        self._segment_start = None
+        self._segment_size = 0
+
+        self._recorded = 0
+        self._dropped = 0
+        self._segments = 0
+
+    def start(self):
+        if not self._thread is None:
+            return
+
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def record(self, data):
+        self.start()
+
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            self._dropped += 1
+
+    def record_batch(self, samples):
+        for data in samples:
+            self.record(data)
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def get_statistics(self):
+        return {'recorded': self._recorded, 'dropped': self._dropped, 'segments': self._segments,
+                'queued': self._queue.qsize()}
+
+    def _run(self):
+        pending = []
+        running = True
+
+        while running:
+            try:
+                data = self._queue.get(timeout=self.FLUSH_INTERVAL)
+                if data is None:
+                    running = False
+                elif not data.error and not data.time is None:
+                    pending.append(data)
+            except queue.Empty:
+                pass
+
+            if len(pending) >= self.FLUSH_RECORDS or (pending and (not running or self._queue.empty())):
+                self._write(pending)
+                pending = []
+
+        self._close_segment()
+
+    def _write(self, samples):
+        records = numpy.array([(data.time,
+                                numpy.nan if data.theta is None else data.theta,
+                                numpy.nan if data.z is None else data.z,
+                                History.NO_TRIGGER if data.trigger is None else data.trigger)
+                               for data in samples], dtype=History.DTYPE)
+
+        while len(records) > 0:
+            if self._file is None or self._rotate(records['time'][0]):
+                self._open_segment(records['time'][0])
+
+            chunk = records[:self._segment_records - self._segment_size]
+            self._file.write(chunk.tobytes())
+            self._file.flush()
+
+            self._segment_size += len(chunk)
+            self._recorded += len(chunk)
+            records = records[len(chunk):]
+
+    def _rotate(self, t):
+        return self._segment_size >= self._segment_records or t - self._segment_start >= self._segment_duration
+
+    def _open_segment(self, t):
+        self._close_segment()
+
+        self._file = self._create_segment(t)
+        self._segment_start = t
+        self._segment_size = 0
+        self._segments += 1
+
+    def _create_segment(self, t):
+        stamp = '{:016d}'.format(int(t * 1e6))
+        name = stamp
+        index = 0
+
+        while True:
+            try:
+                return open(os.path.join(self._directory, 'segment-' + name + self.SUFFIX), 'xb')
+            except FileExistsError:
+                # left by an earlier recorder that started in the same microsecond
+                index += 1
+                name = '{}-{}'.format(stamp, index)
+
+    def _close_segment(self):
+        if not self._file is None:
+            self._file.close()
+            self._file = None
+
+
+class RecordingReader(object):
+    """
+    Memory-maps the segments written by Recorder for fast time range extraction.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def get_segments(self):
+        """
+        :return: sorted list of (start time, path)
+        """
+        segments = []
+        for name in os.listdir(self._directory):
+            if name.startswith('segment-') and name.endswith(Recorder.SUFFIX):
+                # segment-<start>.rec or segment-<start>-<index>.rec
+                parts = name[len('segment-'):-len(Recorder.SUFFIX)].split('-')
+                index = int(parts[1]) if len(parts) > 1 else 0
+                segments.append((int(parts[0]) / 1e6, index, os.path.join(self._directory, name)))
+        return [(start, path) for start, _, path in sorted(segments)]
+
+    def _map(self, path):
+        # a segment being written may end with a partial record
+        count = os.path.getsize(path) // History.DTYPE.itemsize
+        if count == 0:
+            return numpy.zeros(0, dtype=History.DTYPE)
+        return numpy.memmap(path, dtype=History.DTYPE, mode='r', shape=(count,))
+
+    def get_range(self, t0, t1):
+        """
+        :return: structured array (time, theta, z, trigger) of all recorded samples with t0 <= time <= t1
+        """
+        segments = self.get_segments()
+        parts = []
+
+        for start, path in segments:
+            # segments of a restarted recorder may overlap, so the next start does not bound this one
+            if start > t1:
+                continue
+
+            records = self._map(path)
+            lo = numpy.searchsorted(records['time'], t0, side='left')
+            hi = numpy.searchsorted(records['time'], t1, side='right')
+            if lo < hi:
+                parts.append(records[lo:hi])
+
+        if len(parts) == 0:
+            return numpy.zeros(0, dtype=History.DTYPE)
+        if len(parts) == 1:
+            return parts[0]
+        return numpy.concatenate(parts)
@@ -0,0 +1,117 @@
+import time
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class TickScheduler(object):
+    """
+    Paces the watchdog loop with absolute deadlines, so sleeping never accumulates drift.
+
+    The tick rate is `rate` in normal operation, `idle_rate` while no client is reading and
+    `burst_rate` while an axis is moving (and `burst_hold` seconds after it stopped). A tick that
+    starts later than its deadline counts as overrun; if it is more than one period late the
+    schedule is re-anchored instead of catching up with a burst of ticks.
+    """
+
+    def __init__(self, rate=1000.0, idle_rate=10.0, burst_rate=None, motion_threshold=1e-4, burst_hold=1.0,
+                 clock=_clock, sleep=time.sleep):
+        if rate <= 0 or idle_rate <= 0:
+            raise RuntimeError("Tick rates must be positive")
+
+        if burst_rate is None:
+            burst_rate = rate
+
+        if burst_rate <= 0:
+            raise RuntimeError("Tick rates must be positive")
+
+        self._rate = float(rate)
+        self._idle_rate = float(idle_rate)
+        self._burst_rate = float(burst_rate)
+        self._motion_threshold = motion_threshold
+        self._burst_hold = burst_hold
+        self._clock = clock
+        self._sleep = sleep
+
+        self._deadline = None
+        self._idle = False
+        self._burst_until = None
+        self._last_positions = {}
+
+        self._ticks = 0
+        self._overruns = 0
+        self._overrun_total = 0.0
+        self._overrun_max = 0.0
+
+    def set_idle(self, idle):
+        self._idle = idle
+
+    def is_idle(self):
+        return self._idle
+
+    def is_burst(self):
+        return not self._burst_until is None and self._clock() < self._burst_until
+
+    def update_position(self, theta, z, device=None):
+        """
+        Feeds the latest positions (None if unknown); movement beyond motion_threshold enables burst mode.
+
+        :param device: tracks the positions of several devices sharing this scheduler separately
+        """
+        position = (theta, z)
+        last = self._last_positions.get(device)
+        self._last_positions[device] = position
+
+        if last is None:
+            return
+
+        for old, new in zip(last, position):
+            if not old is None and not new is None and abs(new - old) > self._motion_threshold:
+                self._burst_until = self._clock() + self._burst_hold
+                return
+
+    def get_rate(self):
+        if self.is_burst():
+            return self._burst_rate
+
+        if self._idle:
+            return self._idle_rate
+
+        return self._rate
+
+    def wait(self):
+        """
+        Blocks until the next tick is due.
+        """
+        period = 1.0 / self.get_rate()
+        now = self._clock()
+
+        if self._deadline is None:
+            self._deadline = now
+            return
+
+        deadline = self._deadline + period
+        self._ticks += 1
+
+        if now < deadline:
+            self._sleep(deadline - now)
+        elif now > deadline:
+            overrun = now - deadline
+            self._overruns += 1
+            self._overrun_total += overrun
+            self._overrun_max = max(self._overrun_max, overrun)
+
+            if overrun > period:
+                deadline = now
+
+        self._deadline = deadline
+
+    def get_statistics(self):
+        return {
+            'rate': self.get_rate(),
+            'ticks': self._ticks,
+            'overruns': self._overruns,
+            'overrun_mean': self._overrun_total / self._overruns if self._overruns else 0.0,
+            'overrun_max': self._overrun_max,
+            'idle': self._idle,
+            'burst': self.is_burst(),
+        }
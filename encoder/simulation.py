@@ -0,0 +1,211 @@
+import random
+import threading
+import time
+
+from encoder.heidenhain_encoder import EncoderFactory
+
+
+class SimulatedAxisData(object):
+    def __init__(self):
+        self.position = 0
+        self.status = 0
+        self.triggerCounter = 0
+        self.timestamp = 0
+        self.ref1 = 0
+        self.ref2 = 0
+        self.distCodedRef = 0
+
+
+class SimulatedAxis(object):
+    """
+    Mimics the axis objects returned by getThetaData()/getZData() of the heidenhain driver.
+    Positions are integer counts, `scale` converts counts to degree/mm.
+    """
+
+    def __init__(self, scale, velocity, reference_spacing, referenced=True, reference_delay=0.5):
+        self._scale = scale
+        self._velocity = velocity
+        self._reference_spacing = reference_spacing
+        self._reference_delay = reference_delay
+        self._referenced = referenced
+        self._received = referenced
+        self._reference_started = None
+        self._data = SimulatedAxisData()
+
+    def update(self, t, trigger):
+        if not self._reference_started is None and t - self._reference_started >= self._reference_delay:
+            self._referenced = True
+            self._received = True
+            self._reference_started = None
+
+        data = self._data
+        data.position = int(round(self._velocity * t / self._scale))
+        data.triggerCounter = trigger
+        data.timestamp = int(t * 1e6)
+
+        if self._referenced:
+            data.ref1 = 1000
+            data.ref2 = 1000 + int(round(self._reference_spacing / self._scale))
+        else:
+            data.ref1 = data.ref2 = 0
+
+    def getData(self):
+        return self._data
+
+    def computeDegree(self, count):
+        return count * self._scale
+
+    def computePosition(self, count):
+        return count * self._scale
+
+    def getAbsoluteDegree(self):
+        return self.computeDegree(self._data.position)
+
+    def getAbsolutePosition(self):
+        return self.computePosition(self._data.position)
+
+    def hasReference(self):
+        return self._referenced
+
+    def receivedReference(self):
+        return self._received
+
+    def start_reference(self, t):
+        self._reference_started = t
+        return True
+
+    def stop_reference(self):
+        self._reference_started = None
+        return True
+
+    def clear_reference(self):
+        self._referenced = False
+        self._received = False
+        return True
+
+
+class SimulatedDevice(object):
+    """
+    Stand-in for the object returned by heidenhain.get_encoder().
+
+    Entries are produced at `rate` Hz with gaussian `jitter` (seconds) on their timestamps and are
+    queued until read. read() consumes one queued entry and returns False if none is queued.
+    The trigger counter advances at `trigger_rate` Hz. With probability `error_rate` a read fails.
+    """
+
+    THETA_SCALE = 360.0 / 2 ** 27
+    Z_SCALE = 1e-5
+
+    def __init__(self, rate=1000.0, jitter=0.0, trigger_rate=100.0, theta_velocity=1.0, z_velocity=0.1,
+                 referenced=True, error_rate=0.0, buffer_size=10000, seed=None):
+        self._rate = float(rate)
+        self._jitter = jitter
+        self._trigger_rate = trigger_rate
+        self._error_rate = error_rate
+        self._buffer_size = buffer_size
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self._theta = SimulatedAxis(self.THETA_SCALE, theta_velocity, 13.0, referenced)
+        self._z = SimulatedAxis(self.Z_SCALE, z_velocity, 20.0, referenced)
+
+        self._connected = False
+        self._start = None
+        self._consumed = 0
+        self._error = None
+
+    def connect(self):
+        self._connected = True
+        self._start = time.time()
+        self._consumed = 0
+        return True
+
+    def disconnect(self):
+        self._connected = False
+        return True
+
+    def _queued(self, now):
+        produced = int((now - self._start) * self._rate)
+        return min(produced - self._consumed, self._buffer_size)
+
+    def read(self):
+        if not self._connected:
+            raise RuntimeError("Simulated device is not connected")
+
+        with self._lock:
+            now = time.time()
+            queued = self._queued(now)
+            if queued <= 0:
+                return False
+
+            # entries that did not fit into the device buffer are lost
+            self._consumed = int((now - self._start) * self._rate) - queued + 1
+
+            if self._error_rate > 0 and self._random.random() < self._error_rate:
+                self._error = "Simulated read error"
+                raise RuntimeError(self._error)
+
+            t = self._consumed / self._rate
+            if self._jitter > 0:
+                t += self._random.gauss(0, self._jitter)
+
+            trigger = int(t * self._trigger_rate)
+            self._theta.update(t, trigger)
+            self._z.update(t, trigger)
+            return True
+
+    def clearBuffer(self):
+        with self._lock:
+            if self._connected:
+                self._consumed = int((time.time() - self._start) * self._rate)
+        return True
+
+    def clearStatus(self):
+        self._error = None
+        return True
+
+    def clear(self):
+        return self.clearBuffer()
+
+    def clearConnection(self):
+        return True
+
+    def hasError(self):
+        return not self._error is None
+
+    def getError(self):
+        return self._error
+
+    def getThetaData(self):
+        return self._theta
+
+    def getZData(self):
+        return self._z
+
+    def startReferenceTheta(self):
+        return self._theta.start_reference(time.time() - self._start)
+
+    def stopReferenceTheta(self):
+        return self._theta.stop_reference()
+
+    def clearReferenceTheta(self):
+        return self._theta.clear_reference()
+
+    def startReferenceZ(self):
+        return self._z.start_reference(time.time() - self._start)
+
+    def stopReferenceZ(self):
+        return self._z.stop_reference()
+
+    def clearReferenceZ(self):
+        return self._z.clear_reference()
+
+
+class SimulatedEncoderFactory(EncoderFactory):
+    """
+    EncoderFactory backed by a SimulatedDevice. Uses its own in-process lock, so it does not
+    contend with a watchdog driving the real device. Keyword arguments go to SimulatedDevice.
+    """
+
+    def __init__(self, **options):
+        super(SimulatedEncoderFactory, self).__init__(lambda: SimulatedDevice(**options), threading.Lock())
@@ -0,0 +1,257 @@
+import errno
+import os
+import select
+import socket
+import threading
+import time
+
+from encoder.File import AbstractCommunication
+
+
+class Notifier(object):
+    """
+    Watchdog side: a listening unix socket. Every published sample sends one byte to
+    each connected subscriber. Sending never blocks; a subscriber whose socket buffer
+    is full has a wake-up pending anyway.
+    """
+
+    BACKLOG = 16
+
+    def __init__(self, path):
+        self._path = path
+        self._server = None
+        self._inode = None
+        self._clients = []
+
+        # subscribers may connect before the first sample is published
+        self._listen()
+
+    def _remove_stale(self):
+        # the socket file of a notifier that did not close, unless that notifier is still alive
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self._path)
+        except socket.error as e:
+            if e.errno == errno.ENOENT:
+                return
+            if not e.errno == errno.ECONNREFUSED:
+                raise RuntimeError("Could not check encoder notifier {}: {}".format(self._path, e))
+            os.unlink(self._path)
+            return
+        finally:
+            probe.close()
+
+        raise RuntimeError("Another encoder notifier is listening on {}".format(self._path))
+
+    def _listen(self):
+        if os.path.exists(self._path):
+            self._remove_stale()
+
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self._path)
+        self._server.listen(self.BACKLOG)
+        self._server.setblocking(False)
+        self._inode = os.stat(self._path).st_ino
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except socket.error:
+                return
+
+            client.setblocking(False)
+            self._clients.append(client)
+
+    def has_subscribers(self):
+        return len(self._clients) > 0
+
+    def notify(self, count=1):
+        """
+        :param count: number of samples published at once
+        """
+        if self._server is None:
+            return
+
+        self._accept()
+
+        for client in list(self._clients):
+            try:
+                client.send(b'\x01' * count)
+            except socket.error as e:
+                if e.errno in [errno.EAGAIN, errno.EWOULDBLOCK]:
+                    continue
+
+                client.close()
+                self._clients.remove(client)
+
+    def close(self):
+        for client in self._clients:
+            client.close()
+        self._clients = []
+
+        if not self._server is None:
+            self._server.close()
+            self._server = None
+
+            try:
+                # the path may belong to a newer notifier by now
+                if os.stat(self._path).st_ino == self._inode:
+                    os.unlink(self._path)
+            except OSError:
+                pass
+
+
+class Subscription(object):
+    """
+    Client side: blocks on the notifier socket and loads a sample only when the watchdog
+    has published a new one.
+
+    :param decimation: deliver at most one sample per n published samples
+    :param threshold: deliver only if theta or z moved at least this much since the last
+                      delivered sample (errors and reference changes are always delivered)
+    """
+
+    RECV_SIZE = 4096
+
+    def __init__(self, comm, path, callback=None, decimation=1, threshold=None):
+        if not isinstance(comm, AbstractCommunication):
+            raise RuntimeError("comm must be an instance of AbstractCommunication")
+
+        if decimation < 1:
+            raise RuntimeError("decimation must be at least 1")
+
+        self._comm = comm
+        self._path = path
+        self._callback = callback
+        self._decimation = decimation
+        self._threshold = threshold
+        self._socket = None
+        self._thread = None
+        self._closed = False
+        self._notifications = 0
+        self._last = None
+
+    def connect(self):
+        """
+        :return: the connected socket
+        """
+        if self._closed:
+            raise RuntimeError("Subscription is closed")
+
+        sock = self._socket
+        if not sock is None:
+            return sock
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._path)
+        except socket.error as e:
+            sock.close()
+            raise RuntimeError("Could not subscribe to encoder notifications: {}".format(e))
+
+        self._socket = sock
+        return sock
+
+    def _wait_notification(self, timeout):
+        # close() may reset self._socket from another thread at any time
+        sock = self.connect()
+
+        readable, _, _ = select.select([sock], [], [], timeout)
+        if len(readable) == 0:
+            return 0
+
+        # one byte per published sample, several may have piled up
+        count = len(sock.recv(self.RECV_SIZE))
+        if count == 0:
+            self.close()
+            raise RuntimeError("Encoder notifier closed the connection")
+
+        return count
+
+    def _moved(self, old, new):
+        if old is None or new is None:
+            return not old is new
+        return abs(new - old) >= self._threshold
+
+    def _accept(self, data):
+        last = self._last
+
+        if self._threshold is None or last is None or data.error or last.error:
+            return True
+
+        if not data.get_references_theta() == last.get_references_theta():
+            return True
+
+        if not data.get_references_z() == last.get_references_z():
+            return True
+
+        return self._moved(last.get_position_theta(), data.get_position_theta()) or \
+            self._moved(last.get_position_z(), data.get_position_z())
+
+    def wait(self, timeout=None):
+        """
+        Blocks until a new sample passes the filters.
+
+        :param timeout: seconds in total, notifications that are filtered out do not extend it
+        :return: the sample, or None on timeout
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        while not self._closed:
+            remaining = None
+            if not deadline is None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+
+            count = self._wait_notification(remaining)
+            if count == 0:
+                return None
+
+            previous = self._notifications
+            self._notifications += count
+            if previous // self._decimation == self._notifications // self._decimation:
+                continue
+
+            data = self._comm.load()
+            if self._accept(data):
+                self._last = data
+                return data
+
+        return None
+
+    def __iter__(self):
+        while not self._closed:
+            data = self.wait()
+            if not data is None:
+                yield data
+
+    def start(self):
+        if self._callback is None:
+            raise RuntimeError("No callback given")
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for data in self:
+                self._callback(data)
+        except (RuntimeError, select.error, socket.error, ValueError):
+            if not self._closed:
+                raise
+
+    def close(self):
+        self._closed = True
+
+        sock = self._socket
+        self._socket = None
+        if not sock is None:
+            try:
+                # wakes up a thread blocked in select or recv
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
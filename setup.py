@@ -17,7 +17,7 @@ import sys
 
 from setuptools import setup, find_packages
 
-requires = ['e21_util']
+requires = ['e21_util', 'numpy']
 
 desc = ('Encoder')
 
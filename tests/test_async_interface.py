@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('e21_util')
+
+from encoder.DataEncoder import BinaryDataEncoder, ErrorSample, Sample
+from encoder.File import File
+from encoder.async_interface import AsyncEncoderInterface
+from encoder.subscription import Notifier
+
+
+def sample(theta):
+    return Sample(1, theta, [1.0, 14.0], 2.0, [0.5, 20.5], time.time())
+
+
+@pytest.fixture
+def setup(tmpdir):
+    comm = File(str(tmpdir.join('encoder')), BinaryDataEncoder())
+    notifier = Notifier(str(tmpdir.join('notify')))
+    yield comm, notifier, AsyncEncoderInterface(comm, notify_path=str(tmpdir.join('notify')))
+    notifier.close()
+
+
+def test_blocking_methods_are_not_exposed(setup):
+    _, _, interface = setup
+
+    for name in ['wait_for_angle', 'wait_for_z', 'subscribe']:
+        assert not hasattr(interface, name)
+
+    for name in ['load', 'get_data', 'get_angle', 'get_z', 'try_get_angle', 'try_get_z', 'get_range']:
+        assert asyncio.iscoroutinefunction(getattr(interface, name))
+
+
+def test_get_positions(setup):
+    comm, _, interface = setup
+    comm.save(sample(5.0))
+
+    async def run():
+        return await interface.get_angle(), await interface.get_z(), await interface.try_get_angle()
+
+    assert asyncio.run(run()) == (5.0, 2.0, (Sample.STATUS_OK, 5.0))
+
+
+def test_try_get_on_error_sample(setup):
+    comm, _, interface = setup
+    comm.save(ErrorSample())
+
+    status, angle = asyncio.run(interface.try_get_angle())
+    assert status == Sample.STATUS_ERROR
+    assert angle is None
+
+
+def test_wait_for_sample(setup):
+    comm, notifier, interface = setup
+    comm.save(sample(5.0))
+
+    async def run():
+        # subscribe before publishing, the notifier accepts the subscriber on the next publication
+        await interface._connect()
+        comm.save(sample(6.0))
+        notifier.notify()
+        data = await interface.wait_for_sample()
+        await interface.close()
+        return data
+
+    assert asyncio.run(run()).get_position_theta() == 6.0
+
+
+def test_wait_until_angle_times_out(setup):
+    comm, _, interface = setup
+    comm.save(sample(5.0))
+
+    async def run():
+        try:
+            await interface.wait_until_angle(10.0, 0.1, timeout=0.05)
+        finally:
+            await interface.close()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
@@ -0,0 +1,126 @@
+import pytest
+
+from encoder.DataEncoder import BinaryDataEncoder, DataEncoder, Data, ErrorData, Sample, ErrorSample
+
+
+FULL = Sample(42, 12.5, [1.25, 14.25], 3.5, [0.5, 20.5], 1500000000.25, None, False,
+              Sample.STATUS_OK, Sample.STATUS_OK, 7)
+
+
+@pytest.fixture
+def encoder():
+    return BinaryDataEncoder()
+
+
+def test_round_trip(encoder):
+    assert encoder.decode(encoder.encode(FULL)) == FULL
+
+
+def test_round_trip_without_optional_values(encoder):
+    sample = Sample(None, None, None, 3.5, [0.5, 20.5], 10.0, "Cannot read angle, no valid reference given",
+                    False, Sample.STATUS_NO_REFERENCE, Sample.STATUS_OK)
+
+    decoded = encoder.decode(encoder.encode(sample))
+
+    assert decoded == sample
+    assert decoded.calibration is None
+    assert decoded.get_status_theta() == Sample.STATUS_NO_REFERENCE
+
+
+def test_round_trip_error(encoder):
+    decoded = encoder.decode(encoder.encode(ErrorSample(time=10.0, exception=u"Verbindung verloren ä")))
+
+    assert isinstance(decoded, ErrorSample)
+    assert decoded.exception == u"Verbindung verloren ä"
+    assert decoded.get_status_theta() == Sample.STATUS_ERROR
+    assert decoded.get_status_z() == Sample.STATUS_ERROR
+
+
+def test_encode_data(encoder):
+    data = Data({})
+    data.set_trigger_count(3)
+    data.set_position_theta(1.5)
+    data.set_reference_theta([1.0, 14.0])
+
+    decoded = encoder.decode(encoder.encode(data))
+
+    assert decoded.trigger == 3
+    assert decoded.theta == 1.5
+    assert decoded.theta_ref == [1.0, 14.0]
+    assert decoded.z is None
+    # Data is stamped while encoding
+    assert decoded.time == data.get_time()
+
+
+def test_encode_error_data(encoder):
+    decoded = encoder.decode(encoder.encode(ErrorData({}, RuntimeError("failed"))))
+
+    assert isinstance(decoded, ErrorSample)
+    assert decoded.exception == "failed"
+
+
+def test_time_is_set(encoder):
+    assert not encoder.decode(encoder.encode(FULL._replace(time=None))).time is None
+
+
+def test_same_result_as_json():
+    binary = BinaryDataEncoder()
+    json = DataEncoder()
+
+    assert binary.decode(binary.encode(FULL)) == json.decode(json.encode(FULL))
+
+
+def test_exception_is_truncated(encoder):
+    decoded = encoder.decode(encoder.encode(FULL._replace(exception='x' * 70000)))
+
+    assert len(decoded.exception) == BinaryDataEncoder.MAX_EXCEPTION_LENGTH
+
+
+def test_multibyte_exception_is_truncated(encoder):
+    decoded = encoder.decode(encoder.encode(FULL._replace(exception='\u00e4' * 40000)))
+
+    assert not decoded.error
+    assert decoded.exception == '\u00e4' * (BinaryDataEncoder.MAX_EXCEPTION_LENGTH // 2)
+
+
+def test_three_references_are_rejected(encoder):
+    with pytest.raises(RuntimeError):
+        encoder.encode(FULL._replace(theta_ref=[1.0, 2.0, 3.0]))
+
+
+FULL_FLAGS = (BinaryDataEncoder.FLAG_TRIGGER | BinaryDataEncoder.FLAG_THETA | BinaryDataEncoder.FLAG_THETA_REFERENCE |
+              BinaryDataEncoder.FLAG_Z | BinaryDataEncoder.FLAG_Z_REFERENCE | BinaryDataEncoder.FLAG_TIME)
+
+
+def test_decode_version_1(encoder):
+    raw = BinaryDataEncoder.RECORD_V1.pack(1, FULL_FLAGS, 42, 12.5, 1.25, 14.25, 3.5, 0.5, 20.5,
+                                           1500000000.25, 0)
+
+    decoded = encoder.decode(raw)
+
+    assert decoded == FULL._replace(theta_status=None, z_status=None, calibration=None)
+    assert decoded.get_status_theta() == Sample.STATUS_OK
+
+
+def test_decode_version_2(encoder):
+    flags = FULL_FLAGS | BinaryDataEncoder.FLAG_STATUS | BinaryDataEncoder.FLAG_EXCEPTION
+    raw = BinaryDataEncoder.RECORD_V2.pack(2, flags, 42, 12.5, 1.25, 14.25, 3.5, 0.5, 20.5, 1500000000.25,
+                                           Sample.STATUS_OK, Sample.STATUS_NO_REFERENCE, 4) + b'test'
+
+    decoded = encoder.decode(raw)
+
+    assert decoded == FULL._replace(z_status=Sample.STATUS_NO_REFERENCE, calibration=None, exception='test')
+
+
+def test_decode_unknown_version(encoder):
+    raw = bytearray(encoder.encode(FULL))
+    raw[0] = BinaryDataEncoder.VERSION + 1
+
+    assert isinstance(encoder.decode(bytes(raw)), ErrorSample)
+
+
+def test_decode_truncated(encoder):
+    raw = encoder.encode(FULL)
+
+    assert isinstance(encoder.decode(raw[:BinaryDataEncoder.RECORD.size - 1]), ErrorSample)
+    assert isinstance(encoder.decode(b''), ErrorSample)
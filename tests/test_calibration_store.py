@@ -0,0 +1,71 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip('e21_util')
+
+import encoder.calibration
+from encoder.calibration_store import CalibrationStore
+
+
+def _write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test_defaults_without_file(tmpdir):
+    store = CalibrationStore(str(tmpdir.join('calibration')))
+    calibration = store.get()
+
+    assert calibration.version == 0
+    assert calibration.theta == encoder.calibration.THETA_CALIBRATION
+    assert calibration.z == encoder.calibration.Z_CALIBRATION
+
+
+def test_commit(tmpdir):
+    store = CalibrationStore(str(tmpdir.join('calibration')))
+    store.commit(theta=1.5)
+    calibration = store.commit(z=-2)
+
+    assert calibration == (2, 1.5, -2.0)
+    assert CalibrationStore(store.get_path()).get() == calibration
+
+
+@pytest.mark.parametrize('content', [
+    'not json',
+    '[1, 2, 3]',
+    '{"version": 2, "theta": "abc", "z": 1}',
+    '{"version": 2, "theta": 1}',
+    '{"version": "2", "theta": 1, "z": 1}',
+    '{"version": 2, "theta": true, "z": 1}',
+    '{"version": 2, "theta": NaN, "z": 1}',
+    '{"version": -1, "theta": 1, "z": 1}',
+])
+def test_invalid_file(tmpdir, content):
+    path = str(tmpdir.join('calibration'))
+    _write(path, content)
+
+    with pytest.raises(RuntimeError):
+        CalibrationStore(path).get()
+
+
+def test_watchdog_survives_invalid_file(tmpdir):
+    from encoder.DataEncoder import BinaryDataEncoder
+    from encoder.File import File
+    from encoder.Watchdog import PositionWatchdog
+    from encoder.simulation import SimulatedEncoderFactory
+
+    path = str(tmpdir.join('calibration'))
+    _write(path, json.dumps({'version': 2, 'theta': 'abc', 'z': 1}))
+
+    comm = File(str(tmpdir.join('encoder')), BinaryDataEncoder())
+    watchdog = PositionWatchdog(comm, SimulatedEncoderFactory(rate=1000.0),
+                                calibration_store=CalibrationStore(path, check_interval=0.0))
+    watchdog.initialize()
+
+    time.sleep(0.01)
+    data = watchdog.tick()
+
+    assert not data is None
+    assert comm.load().get_position_theta() == data.theta
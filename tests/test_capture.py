@@ -0,0 +1,106 @@
+import math
+import os
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from encoder.DataEncoder import Sample
+from encoder.capture import TriggerTable
+
+
+def sample(trigger, t, referenced=True):
+    if not referenced:
+        return Sample(trigger, None, None, t * 2.0, [0.5, 20.5], float(t), "no reference", False,
+                      Sample.STATUS_NO_REFERENCE, Sample.STATUS_OK)
+
+    return Sample(trigger, t * 0.5, [1.25, 14.25], t * 2.0, [0.5, 20.5], float(t), None, False,
+                  Sample.STATUS_OK, Sample.STATUS_OK)
+
+
+def test_captures_new_triggers(tmpdir):
+    writer = TriggerTable(str(tmpdir.join('triggers')), capacity=8)
+    assert writer.capture(sample(1, 1.0))
+    assert not writer.capture(sample(1, 1.5))
+    assert writer.capture(sample(2, 2.0))
+
+    reader = TriggerTable(str(tmpdir.join('triggers')), writable=False)
+    assert reader.get_count() == 2
+    assert reader.get(2)['theta'] == 1.0
+    assert list(reader.get_range(0, 3)['trigger']) == [1, 2]
+
+
+def test_captures_unreferenced_triggers(tmpdir):
+    table = TriggerTable(str(tmpdir.join('triggers')), capacity=8)
+    assert table.capture(sample(3, 3.0, referenced=False))
+
+    record = table.get(3)
+    assert math.isnan(record['theta'])
+    assert record['z'] == 6.0
+    assert record['theta_status'] == Sample.STATUS_NO_REFERENCE
+    assert record['z_status'] == Sample.STATUS_OK
+
+
+def test_restarted_writer_keeps_reader_mapping(tmpdir):
+    path = str(tmpdir.join('triggers'))
+    writer = TriggerTable(path, capacity=8)
+    writer.capture(sample(1, 1.0))
+
+    reader = TriggerTable(path, writable=False)
+    assert reader.get_count() == 1
+    inode = os.stat(path).st_ino
+
+    # a new watchdog empties the table in place instead of truncating the mapped file
+    writer = TriggerTable(path, capacity=8)
+    writer.capture(sample(5, 5.0))
+
+    assert os.stat(path).st_ino == inode
+    assert reader.get_count() == 1
+    assert reader.get_last_trigger() == 5
+    with pytest.raises(RuntimeError):
+        reader.get(1)
+
+
+def test_reader_without_table(tmpdir):
+    open(str(tmpdir.join('triggers')), 'w').close()
+
+    with pytest.raises(RuntimeError):
+        TriggerTable(str(tmpdir.join('triggers')), writable=False).get_count()
+
+
+def test_range_across_ring_end(tmpdir):
+    table = TriggerTable(str(tmpdir.join('triggers')), capacity=4)
+    for t in range(1, 7):
+        table.capture(sample(t, float(t)))
+
+    # triggers 1 and 2 have been overwritten by 5 and 6
+    assert list(table.get_range(1, 6)['trigger']) == [3, 4, 5, 6]
+    assert list(table.get_range(3, 6)['theta']) == [1.5, 2.0, 2.5, 3.0]
+
+
+
+class RewritingRecords(object):
+    # stands in for the mapped records of a reader, the writer rewrites a slot right after the copy
+    def __init__(self, records, rewrite):
+        self._records = records
+        self._rewrite = rewrite
+
+    def __getitem__(self, key):
+        if isinstance(key, str) and not self._rewrite is None:
+            self._rewrite()
+            self._rewrite = None
+        return self._records[key]
+
+
+def test_range_leaves_out_rewritten_slot(tmpdir):
+    path = str(tmpdir.join('triggers'))
+    writer = TriggerTable(path, capacity=4)
+    for t in range(1, 5):
+        writer.capture(sample(t, float(t)))
+
+    reader = TriggerTable(path, writable=False)
+    reader.get_count()
+    reader._records = RewritingRecords(reader._records, lambda: writer.capture(sample(6, 6.0)))
+
+    # slot 2 held trigger 2 when it was copied, but trigger 6 when it was checked
+    assert list(reader.get_range(1, 4)['trigger']) == [1, 3, 4]
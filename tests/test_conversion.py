@@ -0,0 +1,89 @@
+import math
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+import encoder.parameters
+from encoder.conversion import LinearConversion, ThetaConversion, ZConversion
+
+
+THETA_SCALE = 360.0 / 2 ** 27
+
+
+def compute_degree(count):
+    return count * THETA_SCALE + 2.0
+
+
+def test_from_function():
+    conversion = ThetaConversion.from_function(compute_degree, calibration=0.5)
+
+    assert conversion.get_scale() == pytest.approx(THETA_SCALE, rel=1e-12)
+    assert conversion.get_offset() == 2.0
+    assert conversion.get_calibration() == 0.5
+
+    counts = [0, 1, 12345, -678]
+    expected = [compute_degree(count) - 0.5 for count in counts]
+    assert numpy.allclose(conversion.convert(counts), expected, rtol=0, atol=1e-12)
+
+
+def test_non_linear_function():
+    with pytest.raises(RuntimeError):
+        LinearConversion.from_function(lambda count: count ** 2)
+
+
+def test_counts_beyond_one_revolution():
+    # counts keep counting past a full revolution and below zero, the conversion must not wrap them
+    conversion = ThetaConversion.from_function(compute_degree)
+    counts = numpy.array([2 ** 27 - 1, 2 ** 27, 2 ** 27 + 1, 5 * 2 ** 27, -2 ** 27, 2 ** 40], dtype=numpy.int64)
+
+    values = conversion.convert(counts)
+
+    assert values.dtype == numpy.float64
+    assert numpy.allclose(values, [compute_degree(int(count)) for count in counts], rtol=1e-15, atol=1e-9)
+    assert values[3] == pytest.approx(5 * 360.0 + 2.0)
+    assert values[4] == pytest.approx(-358.0)
+
+
+def test_with_calibration():
+    conversion = ZConversion(1e-5, 1.0)
+    calibrated = conversion.with_calibration(0.25)
+
+    assert isinstance(calibrated, ZConversion)
+    assert conversion.get_calibration() == 0.0
+    assert list(calibrated.convert([100000])) == [1.75]
+
+
+def test_calibrate_missing_values():
+    values = ThetaConversion(THETA_SCALE, calibration=1.0).calibrate([2.0, None, 4.5])
+
+    assert values[0] == 1.0
+    assert math.isnan(values[1])
+    assert values[2] == 3.5
+
+
+def test_references():
+    conversion = ThetaConversion(1.0)
+    references = conversion.convert_references([0, 100, 10, None], [13, 113.05, 30, 13])
+
+    assert references.shape == (4, 2)
+    assert list(conversion.check_references(references)) == [True, True, False, False]
+
+
+def test_references_across_revolution():
+    # the spacing of reference marks on either side of 0 degree is not taken modulo 360,
+    # the same as EncoderInterface._check_reference_theta
+    conversion = ThetaConversion(1.0)
+    references = conversion.convert_references([355.0, -6.0], [368.0, 7.0])
+
+    assert list(conversion.check_references(references)) == [True, True]
+    assert list(conversion.check_references([[355.0, 8.0]])) == [False]
+
+
+def test_check_references_defaults():
+    conversion = ThetaConversion(1.0)
+    tol = encoder.parameters.ANGLE_TOL
+
+    references = [[0.0, encoder.parameters.ANGLE_DIFF + tol * 0.5],
+                  [0.0, encoder.parameters.ANGLE_DIFF + tol * 2]]
+    assert list(conversion.check_references(references)) == [True, False]
@@ -0,0 +1,95 @@
+import pytest
+
+from encoder.DataEncoder import Sample, ErrorSample
+from encoder.delta import DeltaStreamEncoder, DeltaStreamDecoder, KEYFRAME, DELTA, write_varint, read_varint
+
+
+QUANTUM = 1e-7
+
+
+def _stream(count, start=0):
+    return [Sample(i // 10, 12.0 + i * 2.7e-6, [1.25, 14.25], 3.0 - i * 1.3e-7, [0.5, 20.5], 1500000000.0 + i * 1e-4,
+                   None, False, Sample.STATUS_OK, Sample.STATUS_OK, 3)
+            for i in range(start, start + count)]
+
+
+def _assert_close(decoded, sample):
+    assert decoded.trigger == sample.trigger
+    assert decoded.theta == pytest.approx(sample.theta, abs=QUANTUM / 2 + 1e-12)
+    assert decoded.z == pytest.approx(sample.z, abs=QUANTUM / 2 + 1e-12)
+    assert decoded.time == pytest.approx(sample.time, abs=1e-6)
+    assert decoded.theta_ref == sample.theta_ref
+    assert decoded.z_ref == sample.z_ref
+    assert decoded.calibration == sample.calibration
+
+
+@pytest.mark.parametrize('value', [0, 1, -1, 63, -64, 64, 1 << 40, -(1 << 40)])
+def test_varint_round_trip(value):
+    out = bytearray()
+    write_varint(out, value)
+    assert read_varint(out, 0) == (value, len(out))
+
+
+def test_round_trip():
+    encoder = DeltaStreamEncoder(QUANTUM, keyframe_interval=100)
+    decoder = DeltaStreamDecoder(QUANTUM)
+
+    stream = _stream(1000)
+    frames = [encoder.encode(sample) for sample in stream]
+
+    assert sum(1 for frame in frames if bytearray(frame)[0] == KEYFRAME) == 10
+    for frame, sample in zip(frames, stream):
+        _assert_close(decoder.decode(frame), sample)
+
+
+def test_error_does_not_accumulate():
+    encoder = DeltaStreamEncoder(QUANTUM, keyframe_interval=100000)
+    decoder = DeltaStreamDecoder(QUANTUM)
+
+    stream = _stream(20000)
+    for sample in stream:
+        decoded = decoder.decode(encoder.encode(sample))
+
+    _assert_close(decoded, stream[-1])
+
+
+def test_changes_send_keyframe():
+    encoder = DeltaStreamEncoder(QUANTUM)
+    decoder = DeltaStreamDecoder(QUANTUM)
+
+    first, second = _stream(2)
+    unreferenced = Sample(None, None, None, 3.0, [0.5, 20.5], second.time + 1e-4, "no reference", False,
+                          Sample.STATUS_NO_REFERENCE, Sample.STATUS_OK, 3)
+    error = ErrorSample(time=second.time + 2e-4, exception="lost")
+
+    frames = [encoder.encode(sample) for sample in [first, second, unreferenced, error]]
+    assert [bytearray(frame)[0] for frame in frames] == [KEYFRAME, DELTA, KEYFRAME, KEYFRAME]
+
+    decoded = [decoder.decode(frame) for frame in frames]
+    assert decoded[2] == unreferenced
+    assert isinstance(decoded[3], ErrorSample)
+    assert decoded[3].exception == "lost"
+
+
+def test_delta_without_keyframe():
+    encoder = DeltaStreamEncoder(QUANTUM)
+    frames = [encoder.encode(sample) for sample in _stream(3)]
+
+    decoder = DeltaStreamDecoder(QUANTUM)
+    assert isinstance(decoder.decode(frames[1]), ErrorSample)
+
+
+def test_resynchronises_after_broken_frame():
+    encoder = DeltaStreamEncoder(QUANTUM)
+    decoder = DeltaStreamDecoder(QUANTUM)
+    stream = _stream(4)
+
+    decoder.decode(encoder.encode(stream[0]))
+    decoder.decode(encoder.encode(stream[1]))
+
+    # a truncated delta frame drops the state until the next keyframe
+    assert isinstance(decoder.decode(encoder.encode(stream[2])[:1]), ErrorSample)
+    assert isinstance(decoder.decode(encoder.encode(stream[3])), ErrorSample)
+
+    encoder.request_keyframe()
+    _assert_close(decoder.decode(encoder.encode(stream[3])), stream[3])
@@ -0,0 +1,137 @@
+import os
+import stat
+import time
+
+import pytest
+
+pytest.importorskip('e21_util')
+
+from encoder.DataEncoder import BinaryDataEncoder, Sample
+from encoder.File import File, ClientHeartbeat
+from encoder.SharedMemory import SharedMemory
+
+
+@pytest.fixture
+def heartbeat(monkeypatch):
+    monkeypatch.setattr(ClientHeartbeat, 'INTERVAL', 0.0)
+    monkeypatch.setattr(ClientHeartbeat, 'TIMEOUT', 0.2)
+
+
+@pytest.mark.parametrize('transport', [File, SharedMemory])
+def test_clients_are_detected(tmpdir, heartbeat, transport):
+    path = str(tmpdir.join('encoder'))
+    writer = transport(path, BinaryDataEncoder())
+    reader = transport(path, BinaryDataEncoder())
+
+    writer.save(Sample(1, 1.0, time=1.0))
+
+    # a new writer gives readers of its predecessor TIMEOUT seconds to show up
+    assert writer.has_clients()
+    time.sleep(0.3)
+    assert not writer.has_clients()
+
+    reader.load()
+    assert writer.has_clients()
+
+    time.sleep(0.3)
+    assert not writer.has_clients()
+
+
+def test_heartbeat_is_writable_by_others(tmpdir, heartbeat):
+    writer = File(str(tmpdir.join('encoder')))
+    writer.has_clients()
+
+    path = ClientHeartbeat(str(tmpdir.join('encoder'))).get_path()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o666
+
+
+def test_reader_without_writer(tmpdir, heartbeat):
+    reader = File(str(tmpdir.join('encoder')))
+
+    with pytest.raises(IOError):
+        reader.load()
+
+    # readers never create the heartbeat file
+    assert not os.path.exists(ClientHeartbeat(str(tmpdir.join('encoder'))).get_path())
+
+
+def test_atomic_save_keeps_mode(tmpdir):
+    path = str(tmpdir.join('encoder'))
+    writer = File(path, atomic=True)
+
+    writer.save(Sample(1, 1.0))
+    os.chmod(path, 0o664)
+    writer.save(Sample(2, 2.0))
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o664
+    assert File(path, atomic=True).load().trigger == 2
+
+
+def test_cache_hit(tmpdir):
+    path = str(tmpdir.join('encoder'))
+    File(path, BinaryDataEncoder()).save(Sample(1, 1.0))
+
+    reader = File(path, BinaryDataEncoder(), cache_max_age=1.0)
+    assert reader.load().trigger == 1
+    assert reader.load().trigger == 1
+
+    assert reader.get_cache_statistics() == {'hits': 1, 'misses': 1}
+
+
+def test_cache_miss_on_rewrite(tmpdir):
+    path = str(tmpdir.join('encoder'))
+    writer = File(path, BinaryDataEncoder())
+    writer.save(Sample(1, 1.0))
+
+    reader = File(path, BinaryDataEncoder(), cache_max_age=1.0)
+    assert reader.load().trigger == 1
+
+    time.sleep(0.01)
+    writer.save(Sample(2, 1.0))
+
+    assert reader.load().trigger == 2
+    assert reader.get_cache_statistics() == {'hits': 0, 'misses': 2}
+
+
+def test_cache_expires(tmpdir):
+    path = str(tmpdir.join('encoder'))
+    File(path, BinaryDataEncoder()).save(Sample(1, 1.0))
+
+    reader = File(path, BinaryDataEncoder(), cache_max_age=0.05)
+    reader.load()
+    time.sleep(0.06)
+    reader.load()
+
+    assert reader.get_cache_statistics() == {'hits': 0, 'misses': 2}
+
+
+def test_cache_miss_on_atomic_rename(tmpdir):
+    path = str(tmpdir.join('encoder'))
+    writer = File(path, BinaryDataEncoder(), atomic=True)
+    writer.save(Sample(1, 1.0))
+
+    reader = File(path, BinaryDataEncoder(), cache_max_age=1.0, atomic=True)
+    assert reader.load().trigger == 1
+
+    # same size, possibly the same mtime, but a new inode
+    writer.save(Sample(2, 1.0))
+
+    assert reader.load().trigger == 2
+    assert reader.get_cache_statistics() == {'hits': 0, 'misses': 2}
+
+
+def test_cache_age_is_limited():
+    with pytest.raises(RuntimeError):
+        File('unused', cache_max_age=File.MAX_CACHE_AGE * 2)
+
+
+def test_atomic_save_of_new_file(tmpdir):
+    path = str(tmpdir.join('encoder'))
+    umask = os.umask(0o077)
+    try:
+        File(path, atomic=True).save(Sample(1, 1.0))
+        assert os.umask(0o077) == 0o077
+    finally:
+        os.umask(umask)
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('e21_util')
+
+import encoder.calibration
+from encoder.DataEncoder import BinaryDataEncoder
+from encoder.File import File
+from encoder.Watchdog import PositionWatchdog
+from encoder.heidenhain_encoder import HeidenhainEncoder, ReferenceMarkHelper
+from encoder.scheduler import TickScheduler
+from encoder.simulation import SimulatedDevice, SimulatedEncoderFactory
+
+
+def _encoder(**options):
+    encoder = HeidenhainEncoder(lambda: SimulatedDevice(**options), threading.Lock())
+    encoder.connect()
+    return encoder
+
+
+def _fail(encoder):
+    with pytest.raises(RuntimeError):
+        encoder.read()
+
+
+def test_single_failure_keeps_connection():
+    encoder = _encoder(rate=10000.0, error_rate=1.0)
+    time.sleep(0.01)
+
+    for _ in range(HeidenhainEncoder.MAX_READ_FAILURES - 1):
+        _fail(encoder)
+        assert encoder.is_connected()
+
+    _fail(encoder)
+    assert not encoder.is_connected()
+
+
+def test_reconnect_is_delayed():
+    encoder = _encoder(rate=10000.0, error_rate=1.0)
+    time.sleep(0.01)
+
+    for _ in range(HeidenhainEncoder.MAX_READ_FAILURES):
+        _fail(encoder)
+
+    assert not encoder.ensure_connected()
+    time.sleep(HeidenhainEncoder.RECONNECT_MIN_DELAY)
+    assert encoder.ensure_connected()
+
+    # a reconnect alone does not start the backoff over
+    assert encoder.get_connection_statistics()['reconnect_delay'] == 2 * HeidenhainEncoder.RECONNECT_MIN_DELAY
+
+    time.sleep(0.01)
+    for _ in range(HeidenhainEncoder.MAX_READ_FAILURES):
+        _fail(encoder)
+
+    assert encoder.get_connection_statistics()['reconnect_delay'] == 4 * HeidenhainEncoder.RECONNECT_MIN_DELAY
+
+
+def test_flapping_device_backs_off():
+    encoder = _encoder(rate=10000.0, error_rate=0.5)
+
+    end = time.time() + 1.0
+    while time.time() < end:
+        if not encoder.ensure_connected():
+            continue
+
+        try:
+            encoder.read()
+        except RuntimeError:
+            pass
+
+    assert encoder.get_connection_statistics()['reconnects'] <= 5
+
+
+class CountingFile(File):
+    def __init__(self, path):
+        super(CountingFile, self).__init__(path, BinaryDataEncoder())
+        self.saved = 0
+
+    def save(self, data):
+        self.saved += 1
+        super(CountingFile, self).save(data)
+
+
+def test_reference_search_does_not_stall_watchdog(tmpdir):
+    comm = CountingFile(str(tmpdir.join('encoder')))
+    factory = SimulatedEncoderFactory(rate=1000.0, referenced=False)
+    watchdog = PositionWatchdog(comm, factory, scheduler=TickScheduler(rate=200.0))
+
+    watchdog.start()
+    try:
+        time.sleep(0.05)
+        saved = comm.saved
+        ReferenceMarkHelper(factory.get_encoder()).search_theta()
+        during = comm.saved - saved
+    finally:
+        watchdog.stop()
+        watchdog.join()
+
+    # the search takes 0.5 s
+    assert during >= 50
+
+
+def test_read_calibration_without_store():
+    factory = SimulatedEncoderFactory(rate=1000.0)
+    factory.initialize()
+
+    theta = factory.get_theta()
+    z = factory.get_z()
+    theta.set_calibration(99.0)
+    z.set_calibration(99.0)
+
+    theta.read_calibration()
+    z.read_calibration()
+
+    assert theta.get_calibration() == encoder.calibration.THETA_CALIBRATION
+    assert z.get_calibration() == encoder.calibration.Z_CALIBRATION
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from encoder.DataEncoder import Sample
+from encoder.History import History
+
+
+def sample(t):
+    return Sample(int(t), t * 0.5, None, t * 2.0, None, float(t))
+
+
+def test_reader_follows_writer(tmpdir):
+    path = str(tmpdir.join('history'))
+    writer = History(path, capacity=8)
+    writer.extend([sample(t) for t in range(5)])
+
+    reader = History(path, writable=False)
+
+    assert len(reader) == 5
+    assert list(reader.get_history(since=2)['time']) == [3.0, 4.0]
+
+    writer.append(sample(5))
+    assert reader.get_angle_at(4.5) == pytest.approx(2.25)
+
+
+def test_restarted_writer_continues_ring(tmpdir):
+    path = str(tmpdir.join('history'))
+    History(path, capacity=8).extend([sample(t) for t in range(5)])
+
+    reader = History(path, writable=False)
+    assert len(reader) == 5
+
+    # the file is neither truncated nor cleared under the mapped reader
+    History(path, capacity=8).append(sample(5))
+    assert list(reader.get_history()['time']) == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_restarted_writer_with_other_capacity(tmpdir):
+    path = str(tmpdir.join('history'))
+    History(path, capacity=8).extend([sample(t) for t in range(5)])
+
+    reader = History(path, writable=False)
+    assert len(reader) == 5
+
+    writer = History(path, capacity=4)
+    writer.append(sample(10))
+
+    # the old reader keeps its mapping of the replaced file, new readers see the new ring
+    assert len(reader) == 5
+    assert list(History(path, writable=False).get_history()['time']) == [10.0]
+
+
+def test_missing_history(tmpdir):
+    with pytest.raises(RuntimeError):
+        len(History(str(tmpdir.join('missing')), writable=False))
+
+
+def test_unknown_layout(tmpdir):
+    path = str(tmpdir.join('history'))
+    with open(path, 'wb') as f:
+        f.write(b'\x01' * 4096)
+
+    with pytest.raises(RuntimeError):
+        len(History(path, writable=False))
+
+    # a writer replaces a file it does not recognise
+    History(path, capacity=8).append(sample(1))
+    assert len(History(path, writable=False)) == 1
+    assert os.path.getsize(path) == History.HEADER.itemsize + 8 * History.DTYPE.itemsize
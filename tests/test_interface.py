@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('e21_util')
+
+from encoder.DataEncoder import BinaryDataEncoder, ErrorSample, Sample
+from encoder.File import File
+from encoder.interface import EncoderInterface
+from encoder.subscription import Notifier
+
+
+def sample(theta, t=None):
+    return Sample(1, theta, [1.0, 14.0], 2.0, [0.5, 20.5], time.time() if t is None else t)
+
+
+@pytest.fixture
+def setup(tmpdir):
+    comm = File(str(tmpdir.join('encoder')), BinaryDataEncoder())
+    notifier = Notifier(str(tmpdir.join('notify')))
+    yield comm, notifier, EncoderInterface(comm, notify_path=str(tmpdir.join('notify')))
+    notifier.close()
+
+
+def _publish_later(comm, notifier, samples, delay=0.02):
+    def run():
+        for data in samples:
+            time.sleep(delay)
+            comm.save(data)
+            notifier.notify()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize('first', [ErrorSample(), sample(5.0, t=1.0)])
+def test_wait_for_angle_outlasts_bad_samples(setup, first):
+    comm, notifier, interface = setup
+    comm.save(first)
+
+    thread = _publish_later(comm, notifier, [ErrorSample(), sample(3.0), sample(5.0)])
+    try:
+        data = interface.wait_for_angle(5.0, 0.1, timeout=2.0)
+    finally:
+        thread.join()
+
+    assert data.get_position_theta() == 5.0
+
+
+def test_wait_for_z_times_out_with_last_error(setup):
+    comm, notifier, interface = setup
+    comm.save(ErrorSample())
+
+    thread = _publish_later(comm, notifier, [ErrorSample()])
+    try:
+        with pytest.raises(RuntimeError) as e:
+            interface.wait_for_z(2.0, 0.1, timeout=0.1)
+    finally:
+        thread.join()
+
+    assert 'Timeout' in str(e.value)
+    assert 'last error' in str(e.value)
+
+
+def test_wait_without_data(setup):
+    _, _, interface = setup
+
+    with pytest.raises(RuntimeError):
+        interface.wait_for_angle(5.0, 0.1, timeout=0.05)
+
+
+def test_check_theta(setup):
+    _, _, interface = setup
+
+    assert interface.check_theta(sample(5.0)) == Sample.STATUS_OK
+    assert interface.check_theta(sample(5.0, t=1.0)) == Sample.STATUS_STALE
+    assert interface.check_theta(ErrorSample(time=time.time())) == Sample.STATUS_ERROR
+    assert interface.check_theta(Sample(1, 5.0, None, 2.0, [0.5, 20.5], time.time())) == Sample.STATUS_NO_REFERENCE
+    assert interface.check_theta(Sample(1, 5.0, [1.0, 15.0], 2.0, [0.5, 20.5], time.time())) == \
+        Sample.STATUS_INVALID_REFERENCE
+
+
+def test_check_z(setup):
+    _, _, interface = setup
+
+    assert interface.check_z(sample(5.0)) == Sample.STATUS_OK
+    assert interface.check_z(sample(5.0, t=1.0)) == Sample.STATUS_STALE
+    assert interface.check_z(ErrorSample(time=time.time())) == Sample.STATUS_ERROR
+    assert interface.check_z(Sample(1, 5.0, [1.0, 14.0], 2.0, None, time.time())) == Sample.STATUS_NO_REFERENCE
+    assert interface.check_z(Sample(1, 5.0, [1.0, 14.0], 2.0, [0.5], time.time())) == \
+        Sample.STATUS_INVALID_REFERENCE
+
+
+def test_try_get(setup):
+    comm, _, interface = setup
+
+    comm.save(sample(5.0))
+    assert interface.try_get_angle() == (Sample.STATUS_OK, 5.0)
+    assert interface.try_get_z() == (Sample.STATUS_OK, 2.0)
+
+    comm.save(ErrorSample(time=time.time(), exception="failed"))
+    assert interface.try_get_angle() == (Sample.STATUS_ERROR, None)
+    assert interface.try_get_z() == (Sample.STATUS_ERROR, None)
+
+    comm.save(sample(5.0, t=1.0))
+    assert interface.try_get_angle() == (Sample.STATUS_STALE, None)
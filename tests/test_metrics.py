@@ -0,0 +1,72 @@
+import sys
+import threading
+
+from encoder.metrics import Metrics
+
+
+def run_threads(target, count=4):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+
+    interval = sys.getswitchinterval()
+    # switch threads as often as possible to provoke lost updates
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = Metrics()
+    metrics.count('samples')
+    metrics.observe('read_seconds', 1e-3)
+
+    with metrics.timer('read_seconds'):
+        pass
+
+    assert metrics.get_stats() == {}
+
+
+def test_concurrent_counts_are_not_lost():
+    metrics = Metrics(enabled=True)
+
+    def count():
+        for _ in range(20000):
+            metrics.count('samples')
+            metrics.count('batches', 2)
+
+    run_threads(count)
+
+    stats = metrics.get_stats()
+    assert stats['samples'] == 4 * 20000
+    assert stats['batches'] == 4 * 2 * 20000
+
+
+def test_concurrent_observations_are_not_lost():
+    metrics = Metrics(enabled=True)
+
+    def observe():
+        for _ in range(20000):
+            metrics.observe('read_seconds', 1e-3)
+
+    run_threads(observe)
+
+    stats = metrics.get_stats()['read_seconds']
+    assert stats['count'] == 4 * 20000
+    assert abs(stats['sum'] - 4 * 20000 * 1e-3) < 1e-6
+    assert stats['p50'] == 1e-3
+
+
+def test_prometheus_export():
+    metrics = Metrics(enabled=True)
+    metrics.count('samples', 3)
+    metrics.observe('read_seconds', 2e-3)
+
+    text = metrics.to_prometheus()
+
+    assert 'encoder_samples_total 3' in text
+    assert 'encoder_read_seconds_bucket{le="0.0025"} 1' in text
+    assert 'encoder_read_seconds_count 1' in text
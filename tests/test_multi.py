@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('e21_util')
+
+from encoder.DataEncoder import BinaryDataEncoder
+from encoder.File import File
+from encoder.Watchdog import PositionWatchdog
+from encoder.heidenhain_encoder import EncoderFactory
+from encoder.multi import MultiFactory, MultiPositionWatchdog
+from encoder.scheduler import TickScheduler
+from encoder.simulation import SimulatedDevice, SimulatedEncoderFactory
+
+
+class SlowDevice(SimulatedDevice):
+    def read(self):
+        time.sleep(0.1)
+        return super(SlowDevice, self).read()
+
+
+class CountingFile(File):
+    def __init__(self, path):
+        super(CountingFile, self).__init__(path, BinaryDataEncoder())
+        self.saved = 0
+
+    def save(self, data):
+        self.saved += 1
+        super(CountingFile, self).save(data)
+
+
+def test_slow_device_does_not_delay_others(tmpdir):
+    slow = CountingFile(str(tmpdir.join('slow')))
+    fast = CountingFile(str(tmpdir.join('fast')))
+
+    watchdog = MultiPositionWatchdog([
+        ('slow', PositionWatchdog(slow, EncoderFactory(SlowDevice, threading.Lock()),
+                                  scheduler=TickScheduler(rate=200.0))),
+        ('fast', PositionWatchdog(fast, SimulatedEncoderFactory(rate=1000.0),
+                                  scheduler=TickScheduler(rate=200.0))),
+    ])
+
+    watchdog.start()
+    time.sleep(0.5)
+    watchdog.stop()
+    watchdog.join()
+
+    assert not watchdog.is_alive()
+    assert slow.saved <= 5
+    assert fast.saved >= 50
+
+
+def test_scheduler_is_not_shared(tmpdir):
+    scheduler = TickScheduler()
+
+    with pytest.raises(RuntimeError):
+        MultiPositionWatchdog([
+            ('a', PositionWatchdog(File(str(tmpdir.join('a'))), SimulatedEncoderFactory(), scheduler=scheduler)),
+            ('b', PositionWatchdog(File(str(tmpdir.join('b'))), SimulatedEncoderFactory(), scheduler=scheduler)),
+        ])
+
+
+def test_devices_need_own_lock():
+    with pytest.raises(RuntimeError):
+        MultiFactory([('a', EncoderFactory(SimulatedDevice))])
+
+
+def test_client_does_not_import_device_side(tmpdir):
+    code = ("import sys\n"
+            "from encoder.multi import MultiFactory\n"
+            "factory = MultiFactory([('a', object), ('b', object)])\n"
+            "factory.get_interface()\n"
+            "loaded = [m for m in ['numpy', 'heidenhain', 'encoder.Watchdog', 'encoder.heidenhain_encoder']\n"
+            "          if m in sys.modules]\n"
+            "assert not loaded, loaded\n")
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([root] + [p for p in sys.path if p])
+
+    subprocess.check_call([sys.executable, '-c', code], env=env, cwd=str(tmpdir))
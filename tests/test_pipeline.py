@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('e21_util')
+
+from encoder.DataEncoder import BinaryDataEncoder
+from encoder.File import File
+from encoder.pipeline import PipelinedWatchdog
+from encoder.simulation import SimulatedEncoderFactory
+from encoder.subscription import Notifier, Subscription
+
+
+def _watchdog(tmpdir, notifier=None, **options):
+    comm = File(str(tmpdir.join('encoder')), BinaryDataEncoder())
+    factory = SimulatedEncoderFactory(**options)
+    factory.initialize()
+    return PipelinedWatchdog(comm, factory, batch_size=1000, notifier=notifier), comm
+
+
+def test_matches_position_watchdog(tmpdir):
+    watchdog, comm = _watchdog(tmpdir, rate=1000.0, theta_velocity=7.3, z_velocity=0.9)
+    watchdog.get_theta().set_calibration(12.5)
+    watchdog.get_z().set_calibration(-3.25)
+
+    time.sleep(0.01)
+    assert watchdog.get_encoder().read_next()
+
+    expected = watchdog._read_sample()
+    watchdog._resolve_conversions()
+    watchdog._flush([watchdog._read_raw()])
+    data = comm.load()
+
+    assert data.get_position_theta() == pytest.approx(expected.get_position_theta(), abs=1e-9)
+    assert data.get_references_theta() == pytest.approx(expected.get_references_theta(), abs=1e-9)
+    assert data.get_position_z() == pytest.approx(expected.get_position_z(), abs=1e-9)
+    assert data.get_references_z() == pytest.approx(expected.get_references_z(), abs=1e-9)
+    assert data.get_trigger_count() == expected.get_trigger_count()
+    assert data.time == pytest.approx(expected.time)
+
+
+def test_entries_are_acquired_once(tmpdir):
+    watchdog, _ = _watchdog(tmpdir, rate=10.0)
+
+    time.sleep(0.25)
+    watchdog.acquire()
+    acquired = watchdog.get_pipeline_statistics()['acquired']
+    assert acquired >= 2
+
+    # no new entry within the next 100 ms, nothing is queued again
+    for _ in range(100):
+        watchdog.acquire()
+    assert watchdog.get_pipeline_statistics()['acquired'] == acquired
+
+
+def test_errors_are_notified(tmpdir):
+    path = str(tmpdir.join('notify'))
+    notifier = Notifier(path)
+    watchdog, comm = _watchdog(tmpdir, notifier=notifier, rate=1000.0, error_rate=1.0)
+    subscription = Subscription(comm, path)
+    subscription.connect()
+
+    watchdog.start()
+    try:
+        data = subscription.wait(timeout=2.0)
+    finally:
+        watchdog.stop()
+        watchdog.join()
+        subscription.close()
+
+    assert not data is None
+    assert data.error
@@ -0,0 +1,44 @@
+import math
+
+import pytest
+
+import encoder.parameters
+from encoder.predictor import AlphaBetaPredictor
+
+
+def test_first_estimate_is_uncertain():
+    predictor = AlphaBetaPredictor()
+    predictor.update(0.0, 1.0)
+
+    estimate = predictor.predict(0.001)
+    assert estimate.value == 1.0
+    assert math.isinf(estimate.uncertainty)
+
+
+def test_uncertainty_starts_at_first_residual():
+    predictor = AlphaBetaPredictor()
+    predictor.update(0.0, 0.0)
+    predictor.update(0.001, 0.5)
+
+    estimate = predictor.predict(0.001)
+    assert estimate.uncertainty == pytest.approx(0.5)
+
+
+def test_tracks_constant_velocity():
+    predictor = AlphaBetaPredictor()
+    for i in range(1000):
+        predictor.update(i * 0.001, i * 0.002)
+
+    estimate = predictor.predict(1.0)
+    assert estimate.value == pytest.approx(2.0, abs=1e-6)
+    assert estimate.uncertainty < 1e-6
+
+
+def test_horizon_matches_sample_age_limit():
+    predictor = AlphaBetaPredictor()
+    predictor.update(0.0, 0.0)
+    predictor.update(0.001, 0.0)
+
+    predictor.predict(0.001 + encoder.parameters.TIME_DIFF * 0.9)
+    with pytest.raises(RuntimeError):
+        predictor.predict(0.001 + encoder.parameters.TIME_DIFF * 1.1)
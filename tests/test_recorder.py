@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('e21_util')
+
+from encoder.DataEncoder import ErrorSample, Sample
+from encoder.recorder import Recorder, RecordingReader
+
+
+def sample(t):
+    return Sample(int(t), t * 0.5, None, t * 2.0, None, float(t))
+
+
+def _record(directory, samples, **options):
+    recorder = Recorder(directory, **options)
+    recorder.record_batch(samples)
+    recorder.stop()
+    return recorder
+
+
+def test_records_samples(tmpdir):
+    directory = str(tmpdir.join('recording'))
+    recorder = _record(directory, [sample(t) for t in range(10)] + [ErrorSample()])
+
+    assert recorder.get_statistics()['recorded'] == 10
+    assert recorder.get_statistics()['dropped'] == 0
+
+    records = RecordingReader(directory).get_range(2.0, 5.0)
+    assert list(records['time']) == [2.0, 3.0, 4.0, 5.0]
+    assert list(records['theta']) == [1.0, 1.5, 2.0, 2.5]
+
+
+def test_rotates_segments(tmpdir):
+    directory = str(tmpdir.join('recording'))
+    recorder = _record(directory, [sample(t) for t in range(10)], segment_records=4)
+
+    assert recorder.get_statistics()['segments'] == 3
+    assert len(RecordingReader(directory).get_segments()) == 3
+    assert list(RecordingReader(directory).get_range(0.0, 9.0)['time']) == [float(t) for t in range(10)]
+
+
+def test_restart_does_not_append(tmpdir):
+    directory = str(tmpdir.join('recording'))
+    _record(directory, [sample(t) for t in range(3)])
+    size = os.path.getsize(RecordingReader(directory).get_segments()[0][1])
+
+    # a restarted recorder whose first record has the same time opens a new segment
+    _record(directory, [sample(t) for t in range(3)])
+    _record(directory, [sample(t) for t in range(3)])
+
+    segments = RecordingReader(directory).get_segments()
+    assert len(segments) == 3
+    assert all(os.path.getsize(path) == size for _, path in segments)
+    assert list(RecordingReader(directory).get_range(1.0, 2.0)['time']) == [1.0, 2.0] * 3
@@ -0,0 +1,188 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+
+pytest.importorskip('e21_util')
+
+from encoder.DataEncoder import BinaryDataEncoder, Sample
+from encoder.SharedMemory import SharedMemory
+
+
+def sample(i):
+    # theta, z and the references are derived from the trigger, so a torn record is detectable
+    return Sample(i, i * 0.5, [i + 1.0, i + 2.0], i * 2.0, [i + 3.0, i + 4.0], 1000.0 + i, None, False,
+                  Sample.STATUS_OK, Sample.STATUS_OK, i % 7)
+
+
+def consistent(data):
+    i = data.trigger
+    return (not data.error and data.theta == i * 0.5 and data.z == i * 2.0 and
+            data.theta_ref == [i + 1.0, i + 2.0] and data.z_ref == [i + 3.0, i + 4.0] and
+            data.time == 1000.0 + i and data.calibration == i % 7)
+
+
+def test_round_trip(tmpdir):
+    path = str(tmpdir.join('shm'))
+    writer = SharedMemory(path, BinaryDataEncoder())
+    reader = SharedMemory(path, BinaryDataEncoder())
+
+    writer.save(sample(1))
+    assert reader.load() == sample(1)
+
+    writer.save(sample(2))
+    assert reader.load() == sample(2)
+
+    writer.close()
+    reader.close()
+
+
+def test_round_trip_json(tmpdir):
+    path = str(tmpdir.join('shm'))
+    writer = SharedMemory(path)
+    reader = SharedMemory(path)
+
+    writer.save(sample(3))
+    assert reader.load() == sample(3)
+
+
+def test_save_batch_publishes_last(tmpdir):
+    path = str(tmpdir.join('shm'))
+    writer = SharedMemory(path, BinaryDataEncoder(), slots=4)
+    reader = SharedMemory(path, BinaryDataEncoder())
+
+    # more samples than slots, the ring wraps around
+    writer.save_batch([sample(i) for i in range(10)])
+    assert reader.load() == sample(9)
+
+
+def test_load_without_writer(tmpdir):
+    with pytest.raises(RuntimeError):
+        SharedMemory(str(tmpdir.join('missing'))).load()
+
+
+def test_load_before_first_save(tmpdir):
+    path = str(tmpdir.join('shm'))
+    SharedMemory(path, BinaryDataEncoder())._open_writer()
+
+    with pytest.raises(RuntimeError):
+        SharedMemory(path, BinaryDataEncoder()).load()
+
+
+def test_restarted_writer_continues_ring(tmpdir):
+    path = str(tmpdir.join('shm'))
+    writer = SharedMemory(path, BinaryDataEncoder(), slots=4)
+    writer.save_batch([sample(i) for i in range(6)])
+
+    reader = SharedMemory(path, BinaryDataEncoder())
+    assert reader.load() == sample(5)
+
+    # readers keep their mapping and never see the ring being cleared
+    writer = SharedMemory(path, BinaryDataEncoder(), slots=4)
+    writer._open_writer()
+    assert reader.load() == sample(5)
+
+    writer.save(sample(6))
+    assert reader.load() == sample(6)
+
+
+def test_restarted_writer_with_other_layout(tmpdir, monkeypatch):
+    monkeypatch.setattr(SharedMemory, 'STAT_INTERVAL', 0.0)
+
+    path = str(tmpdir.join('shm'))
+    SharedMemory(path, BinaryDataEncoder(), slots=4).save(sample(1))
+    reader = SharedMemory(path, BinaryDataEncoder())
+    assert reader.load() == sample(1)
+
+    # the file is replaced instead of resized, the reader maps the new one
+    inode = os.stat(path).st_ino
+    SharedMemory(path, BinaryDataEncoder(), slots=8).save(sample(2))
+
+    assert not os.stat(path).st_ino == inode
+    assert reader.load() == sample(2)
+
+
+def test_unknown_layout(tmpdir):
+    path = str(tmpdir.join('shm'))
+    with open(path, 'wb') as f:
+        f.write(b'\x00' * 4096)
+
+    with pytest.raises(RuntimeError):
+        SharedMemory(path).load()
+
+
+def test_oversized_sample(tmpdir):
+    writer = SharedMemory(str(tmpdir.join('shm')), slot_size=32)
+
+    with pytest.raises(RuntimeError):
+        writer.save(sample(1))
+
+
+def test_slot_being_written_is_not_returned(tmpdir):
+    path = str(tmpdir.join('shm'))
+    writer = SharedMemory(path, BinaryDataEncoder())
+    reader = SharedMemory(path, BinaryDataEncoder())
+    writer.save(sample(1))
+
+    # an odd sequence number marks a slot the writer is in the middle of
+    offset = writer._slot_offset(0)
+    seq, length = SharedMemory.SLOT_HEADER.unpack_from(writer._map, offset)
+    SharedMemory.SLOT_HEADER.pack_into(writer._map, offset, seq + 1, length)
+
+    with pytest.raises(RuntimeError):
+        reader.load()
+
+    SharedMemory.SLOT_HEADER.pack_into(writer._map, offset, seq + 2, length)
+    assert reader.load() == sample(1)
+
+
+# large records keep the writer busy inside a slot for a while, so readers run into it
+LARGE_SLOT = 1 << 16
+
+
+def large_sample(i):
+    return sample(i)._replace(exception='{:08d}'.format(i) * 4096)
+
+
+def _write_forever(path, stop):
+    writer = SharedMemory(path, BinaryDataEncoder(), slots=2, slot_size=LARGE_SLOT)
+    i = 0
+    while not stop.is_set():
+        # head only moves at the end of a batch, so the writer keeps lapping the slot being read
+        writer.save_batch([large_sample(j) for j in range(i, i + 10)])
+        i += 10
+    writer.close()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+def test_no_torn_reads(tmpdir):
+    path = str(tmpdir.join('shm'))
+    SharedMemory(path, BinaryDataEncoder(), slots=2, slot_size=LARGE_SLOT).save(large_sample(0))
+
+    context = multiprocessing.get_context('fork')
+    stop = context.Event()
+    process = context.Process(target=_write_forever, args=(path, stop))
+    process.start()
+
+    reader = SharedMemory(path, BinaryDataEncoder())
+    reads = 0
+    triggers = set()
+    try:
+        end = time.time() + 1.0
+        while time.time() < end:
+            try:
+                data = reader.load()
+            except RuntimeError:
+                # gave up after READ_RETRIES concurrent rewrites instead of returning a torn record
+                continue
+
+            assert consistent(data) and data.exception == large_sample(data.trigger).exception, data[:6]
+            triggers.add(data.trigger)
+            reads += 1
+    finally:
+        stop.set()
+        process.join()
+
+    assert reads > 0
+    assert len(triggers) > 1
@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip('e21_util')
+
+from encoder.simulation import SimulatedDevice, SimulatedEncoderFactory
+
+
+def test_without_hardware_library():
+    # importing heidenhain fails in the child, as on a machine without the hardware library
+    code = ("import sys; sys.modules['heidenhain'] = None\n"
+            "from encoder.simulation import SimulatedEncoderFactory\n"
+            "factory = SimulatedEncoderFactory(rate=1000.0)\n"
+            "factory.initialize()\n"
+            "factory.get_encoder().read()\n"
+            "factory.get_theta().get_angle()\n")
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([root] + [p for p in sys.path if p])
+
+    subprocess.check_call([sys.executable, '-c', code], env=env)
+
+
+def test_read_consumes_queued_entries():
+    device = SimulatedDevice(rate=1000.0)
+    device.connect()
+
+    assert not device.read()
+
+    time.sleep(0.02)
+    count = 0
+    while device.read():
+        count += 1
+
+    assert 15 <= count <= 40
+    assert not device.read()
+
+
+def test_entries_are_timestamped_in_microseconds():
+    device = SimulatedDevice(rate=1000.0)
+    device.connect()
+    time.sleep(0.01)
+
+    device.read()
+    first = device.getThetaData().getData().timestamp
+    device.read()
+    second = device.getThetaData().getData().timestamp
+
+    assert second - first == 1000
+
+
+def test_reference_search():
+    factory = SimulatedEncoderFactory(rate=1000.0, referenced=False)
+    factory.initialize()
+    theta = factory.get_theta()
+
+    assert not theta.has_reference()
+
+    theta.start_reference()
+    time.sleep(0.6)
+    # the reference shows up in entries taken after the search finished
+    factory.get_encoder().clear_buffer()
+    time.sleep(0.01)
+    factory.get_encoder().read()
+
+    assert theta.has_reference()
+    assert theta.received_reference()
+
+
+def test_error_rate():
+    device = SimulatedDevice(rate=10000.0, error_rate=1.0)
+    device.connect()
+    time.sleep(0.01)
+
+    with pytest.raises(RuntimeError):
+        device.read()
+
+    assert device.hasError()
+    device.clearStatus()
+    assert not device.hasError()
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('e21_util')
+
+from encoder.DataEncoder import BinaryDataEncoder, Sample
+from encoder.Socket import SocketClient, SocketServer
+
+
+def sample(t):
+    return Sample(int(t), t * 0.5, None, t * 2.0, None, float(t))
+
+
+@pytest.fixture
+def server(tmpdir):
+    server = SocketServer(str(tmpdir.join('socket')), BinaryDataEncoder())
+    server.start()
+    yield server
+    server.close()
+
+
+def _client(tmpdir):
+    return SocketClient(str(tmpdir.join('socket')), BinaryDataEncoder())
+
+
+def _wait_for(condition, timeout=1.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.001)
+
+
+class Publisher(object):
+    # publishes until stopped, a streaming client subscribes at some point in between
+    def __init__(self, server):
+        self._server = server
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+
+    def _run(self):
+        t = 1
+        while not self._stop.is_set():
+            self._server.save(sample(t))
+            t += 1
+            time.sleep(0.002)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+
+
+def test_request_round_trip(server, tmpdir):
+    client = _client(tmpdir)
+
+    with pytest.raises(RuntimeError):
+        client.load()
+
+    server.save(sample(1))
+    assert client.load() == sample(1)
+
+    server.save_batch([sample(2), sample(3)])
+    assert client.load() == sample(3)
+    client.close()
+
+
+@pytest.mark.parametrize('delta', [False, True])
+def test_stream(server, tmpdir, delta):
+    client = _client(tmpdir)
+
+    received = []
+    with Publisher(server):
+        for data in client.stream(delta=delta):
+            received.append(data)
+            if len(received) == 5:
+                break
+    client.close()
+
+    # every published sample arrives, in order
+    triggers = [data.trigger for data in received]
+    assert triggers == list(range(triggers[0], triggers[0] + 5))
+
+    for data in received:
+        expected = sample(data.trigger)
+        assert data.theta == pytest.approx(expected.theta, abs=1e-6)
+        assert data.z == pytest.approx(expected.z, abs=1e-6)
+        assert data.time == pytest.approx(expected.time, abs=1e-6)
+
+
+def test_client_reconnects(server, tmpdir):
+    server.save(sample(1))
+
+    client = _client(tmpdir)
+    assert client.load() == sample(1)
+    _wait_for(lambda: server.get_client_count() == 1)
+
+    client.close()
+    _wait_for(lambda: server.get_client_count() == 0)
+
+    server.save(sample(2))
+    assert client.load() == sample(2)
+    client.close()
+
+
+def test_stopped_server(server, tmpdir):
+    server.save(sample(1))
+    client = _client(tmpdir)
+    assert client.load() == sample(1)
+
+    server.close()
+
+    with pytest.raises(RuntimeError):
+        client.load()
+
+    with pytest.raises(RuntimeError):
+        _client(tmpdir).load()
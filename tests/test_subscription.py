@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('e21_util')
+
+from encoder.DataEncoder import BinaryDataEncoder, Sample
+from encoder.File import File
+from encoder.subscription import Notifier, Subscription
+
+
+@pytest.fixture
+def notifier(tmpdir):
+    notifier = Notifier(str(tmpdir.join('notify')))
+    yield notifier
+    notifier.close()
+
+
+def _subscription(tmpdir, **options):
+    comm = File(str(tmpdir.join('encoder')), BinaryDataEncoder())
+    return comm, Subscription(comm, str(tmpdir.join('notify')), **options)
+
+
+def test_wait_returns_published_sample(tmpdir, notifier):
+    comm, subscription = _subscription(tmpdir)
+    subscription.connect()
+
+    comm.save(Sample(1, 1.0))
+    notifier.notify()
+
+    assert subscription.wait(1.0).get_position_theta() == 1.0
+    subscription.close()
+
+
+def test_filtered_notifications_do_not_extend_timeout(tmpdir, notifier):
+    comm, subscription = _subscription(tmpdir, decimation=1000000)
+    subscription.connect()
+    comm.save(Sample(1, 1.0))
+
+    stop = threading.Event()
+
+    def publish():
+        while not stop.is_set():
+            notifier.notify()
+            time.sleep(0.005)
+
+    thread = threading.Thread(target=publish)
+    thread.start()
+    try:
+        start = time.time()
+        assert subscription.wait(0.1) is None
+        assert time.time() - start < 0.5
+    finally:
+        stop.set()
+        thread.join()
+        subscription.close()
+
+
+def test_second_notifier_does_not_take_over(tmpdir, notifier):
+    path = str(tmpdir.join('notify'))
+
+    with pytest.raises(RuntimeError):
+        Notifier(path)
+
+    comm, subscription = _subscription(tmpdir)
+    subscription.connect()
+    comm.save(Sample(1, 1.0))
+    notifier.notify()
+
+    assert not subscription.wait(1.0) is None
+    subscription.close()
+
+
+def test_stale_socket_is_replaced(tmpdir):
+    path = str(tmpdir.join('notify'))
+
+    # a notifier that went away without close() leaves its socket file behind
+    stale = Notifier(path)
+    stale._server.close()
+    assert os.path.exists(path)
+
+    notifier = Notifier(path)
+    notifier.close()
+
+    assert not os.path.exists(path)
@@ -0,0 +1,151 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('e21_util')
+
+import encoder.parameters
+from encoder.DataEncoder import BinaryDataEncoder
+from encoder.File import File
+from encoder.Watchdog import PositionWatchdog
+from encoder.heidenhain_encoder import EncoderFactory, HeidenhainEncoder
+from encoder.simulation import SimulatedDevice, SimulatedEncoderFactory
+
+
+class FailedDevice(SimulatedDevice):
+    # stopped delivering entries and reports why
+    def read(self):
+        return False
+
+    def hasError(self):
+        return True
+
+
+class RecordingFile(File):
+    def __init__(self, path):
+        super(RecordingFile, self).__init__(path, BinaryDataEncoder())
+        self.published = []
+
+    def save(self, data):
+        self.published.append([data])
+        super(RecordingFile, self).save(data)
+
+    def save_batch(self, samples):
+        self.published.append(list(samples))
+        # File only keeps the last sample of a batch
+        super(RecordingFile, self).save(samples[-1])
+
+    def errors(self):
+        return [samples[0] for samples in self.published if samples[0].error]
+
+
+def _watchdog(tmpdir, batch_size=1, **options):
+    comm = RecordingFile(str(tmpdir.join('encoder')))
+    factory = SimulatedEncoderFactory(**options)
+    watchdog = PositionWatchdog(comm, factory, batch_size=batch_size)
+    watchdog.initialize()
+    return watchdog, comm, factory
+
+
+def test_tick_drains_device_queue(tmpdir):
+    # the device produces entries faster than the watchdog ticks, the published sample must not lag behind
+    watchdog, comm, factory = _watchdog(tmpdir, rate=2000.0)
+
+    ages = []
+    for _ in range(40):
+        time.sleep(0.01)
+        data = watchdog.tick()
+        assert not data is None
+        ages.append(time.time() - data.time)
+
+    assert max(ages) < 0.05 < encoder.parameters.TIME_DIFF
+    assert all(len(samples) == 1 for samples in comm.published)
+
+
+def test_tick_publishes_last_batch(tmpdir):
+    watchdog, comm, factory = _watchdog(tmpdir, batch_size=4, rate=2000.0)
+
+    time.sleep(0.02)
+    data = watchdog.tick()
+
+    assert len(comm.published) == 1
+    assert len(comm.published[0]) == 4
+    assert comm.published[0][-1] == data
+    assert time.time() - data.time < 0.01
+
+
+def test_device_error_is_published(tmpdir, monkeypatch):
+    monkeypatch.setattr(PositionWatchdog, 'HEALTH_CHECK_INTERVAL', 0.0)
+
+    comm = RecordingFile(str(tmpdir.join('encoder')))
+    watchdog = PositionWatchdog(comm, EncoderFactory(FailedDevice, threading.Lock()))
+    watchdog.initialize()
+
+    assert watchdog.tick() is None
+    data = comm.load()
+    assert data.error
+    assert data.exception == HeidenhainEncoder.DEVICE_ERROR
+
+    for _ in range(HeidenhainEncoder.MAX_READ_FAILURES - 1):
+        watchdog.tick()
+
+    # repeated errors drop the connection, so it gets reconnected
+    assert not watchdog.get_encoder().is_connected()
+
+
+def test_unchanged_error_is_republished_after_interval(tmpdir, monkeypatch):
+    monkeypatch.setattr(PositionWatchdog, 'ERROR_REPUBLISH_INTERVAL', 0.05)
+
+    comm = RecordingFile(str(tmpdir.join('encoder')))
+    # never connected, every tick fails with the same error
+    watchdog = PositionWatchdog(comm, SimulatedEncoderFactory(rate=1000.0))
+
+    watchdog.tick()
+    watchdog.tick()
+    assert len(comm.errors()) == 1
+
+    time.sleep(0.06)
+    watchdog.tick()
+    assert len(comm.errors()) == 2
+    assert comm.load().exception == HeidenhainEncoder.RECONNECTING
+
+
+def test_changed_error_is_published_at_once(tmpdir):
+    comm = RecordingFile(str(tmpdir.join('encoder')))
+    watchdog = PositionWatchdog(comm, SimulatedEncoderFactory(rate=1000.0))
+
+    watchdog.tick()
+    watchdog._publish_error(RuntimeError("other"))
+    watchdog.tick()
+
+    assert [data.exception for data in comm.errors()] == [HeidenhainEncoder.RECONNECTING, "other",
+                                                          HeidenhainEncoder.RECONNECTING]
+
+
+def test_error_after_sample_is_published_at_once(tmpdir):
+    watchdog, comm, factory = _watchdog(tmpdir, rate=1000.0)
+
+    watchdog._publish_error(RuntimeError("failed"))
+    time.sleep(0.005)
+    assert not watchdog.tick() is None
+    watchdog._publish_error(RuntimeError("failed"))
+
+    assert comm.load().exception == "failed"
+    assert len(comm.errors()) == 2
+
+
+def test_exceptions_of_both_axes_are_combined(tmpdir):
+    watchdog, comm, factory = _watchdog(tmpdir, rate=1000.0, referenced=False)
+
+    time.sleep(0.005)
+    first = watchdog.tick()
+    time.sleep(0.005)
+    second = watchdog.tick()
+
+    theta_exception = factory.get_theta().snapshot()[4]
+    z_exception = factory.get_z().snapshot()[2]
+
+    assert first.exception == theta_exception + ";" + z_exception
+    # the joined message is built once and reused
+    assert second.exception is first.exception